@@ -0,0 +1,159 @@
+# admission.py - Token-bucket rate limits per sid and per IP, and a cap on in-flight match requests
+
+import time
+
+
+class TokenBucket:
+    """`burst` tokens refilled at `rate` per second, refilled lazily when looked at."""
+
+    __slots__ = ('tokens', 'stamp')
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.stamp = now
+
+    def refill(self, rate, burst, now):
+        if now > self.stamp:
+            self.tokens = min(burst, self.tokens + (now - self.stamp) * rate)
+            self.stamp = now
+        return self.tokens
+
+
+class Rejection:
+    """Why an event was turned away and when to try again. `notify` is False while the sid's last retry-after is still pending."""
+
+    __slots__ = ('event', 'reason', 'retry_after', 'notify')
+
+    def __init__(self, event, reason, retry_after, notify=True):
+        self.event = event
+        self.reason = reason
+        self.retry_after = retry_after
+        self.notify = notify
+
+    def to_dict(self):
+        return {'event': self.event, 'reason': self.reason, 'retry_after': round(self.retry_after, 3)}
+
+
+class AdmissionController:
+    """
+    Decides whether a socket event runs. `limits` maps an event to its buckets,
+    {'sid': (rate, burst), 'ip': (rate, burst)}, either optional; an event has to
+    have a token in both to be admitted, and only then are they spent. Buckets are
+    created on first use, so each check is a couple of dict lookups. A sid's
+    buckets go with forget(); IP buckets outlive their sockets (reconnecting must
+    not refill them) and are dropped by sweep() once idle long enough to be full.
+
+    A rejected sid is told when to retry once; further rejections are silent until
+    that time has come, so spamming doesn't amplify replies but a sid retrying as
+    told (even into an IP bucket other sids drained meanwhile) hears back again.
+
+    shed() turns work away while backlog() (e.g. the matchmaking command queue) is
+    at max_backlog. on_reject(rejection) is called for every event turned away,
+    for metrics.
+    """
+
+    def __init__(self, limits, backlog=None, max_backlog=None, shed_retry_seconds=1.0, on_reject=None, clock=time.monotonic):
+        self.limits = {event: (spec.get('sid'), spec.get('ip')) for event, spec in limits.items()}
+        self.backlog = backlog
+        self.max_backlog = max_backlog
+        self.shed_retry_seconds = shed_retry_seconds
+        self.on_reject = on_reject
+        self._clock = clock
+        self._sid_buckets = {}  # (sid, event) -> TokenBucket
+        self._ip_buckets = {}   # (ip, event) -> TokenBucket
+        self._ips = {}          # sid -> ip
+        self._notices = {}      # (sid, event) -> when the retry-after last sent to sid said to retry
+        self.admitted = 0
+        self.rejected = 0
+
+    def register(self, sid, ip):
+        self._ips[sid] = ip
+
+    def forget(self, sid):
+        self._ips.pop(sid, None)
+        for event in self.limits:
+            self._sid_buckets.pop((sid, event), None)
+            self._notices.pop((sid, event), None)
+
+    def ip_of(self, sid):
+        return self._ips.get(sid)
+
+    def check(self, event, sid, ip=None):
+        """None if the event may run (its tokens are spent), else a Rejection."""
+        limits = self.limits.get(event)
+        if limits is None:
+            return None
+        sid_limit, ip_limit = limits
+        now = self._clock()
+        if ip is None:
+            ip = self._ips.get(sid)
+
+        sid_bucket = ip_bucket = None
+        if sid_limit is not None:
+            sid_bucket = self._bucket(self._sid_buckets, (sid, event), sid_limit, now)
+            if sid_bucket.tokens < 1:
+                return self._reject(event, sid, 'sid', sid_bucket, sid_limit, now)
+        if ip_limit is not None and ip is not None:
+            ip_bucket = self._bucket(self._ip_buckets, (ip, event), ip_limit, now)
+            if ip_bucket.tokens < 1:
+                return self._reject(event, sid, 'ip', ip_bucket, ip_limit, now)
+
+        for bucket in (sid_bucket, ip_bucket):
+            if bucket is not None:
+                bucket.tokens -= 1
+        if self._notices:
+            self._notices.pop((sid, event), None)
+        self.admitted += 1
+        return None
+
+    def _bucket(self, buckets, key, limit, now):
+        rate, burst = limit
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(burst, now)
+        else:
+            bucket.refill(rate, burst, now)
+        return bucket
+
+    def _reject(self, event, sid, reason, bucket, limit, now):
+        retry_after = (1 - bucket.tokens) / limit[0]
+        # The notice is per sid: IP buckets are shared, and every sid behind the IP needs its own
+        retry_at = self._notices.get((sid, event))
+        notify = retry_at is None or now >= retry_at
+        if notify:
+            self._notices[(sid, event)] = now + retry_after
+        return self._rejected(Rejection(event, reason, retry_after, notify=notify))
+
+    def _rejected(self, rejection):
+        self.rejected += 1
+        if self.on_reject is not None:
+            self.on_reject(rejection)
+        return rejection
+
+    def shed(self, event):
+        """None if there is room for more work, else a Rejection (always notified) because the backlog is full."""
+        if self.max_backlog is None or self.backlog is None or self.backlog() < self.max_backlog:
+            return None
+        return self._rejected(Rejection(event, 'overload', self.shed_retry_seconds))
+
+    def sweep(self):
+        """Drops IP buckets that have refilled completely, i.e. are the same as new ones. Returns how many."""
+        now = self._clock()
+        stale = []
+        for key, bucket in self._ip_buckets.items():
+            rate, burst = self.limits[key[1]][1]
+            if bucket.refill(rate, burst, now) >= burst:
+                stale.append(key)
+        for key in stale:
+            del self._ip_buckets[key]
+        return len(stale)
+
+    def stats(self):
+        return {
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'backlog': self.backlog() if self.backlog is not None else None,
+            'max_backlog': self.max_backlog,
+            'sid_buckets': len(self._sid_buckets),
+            'ip_buckets': len(self._ip_buckets),
+        }
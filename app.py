@@ -3,15 +3,13 @@
 import eventlet
 eventlet.monkey_patch()
 
-from flask import Flask, render_template, request, session, redirect, url_for, jsonify, send_from_directory
+from flask import Flask, render_template, request, session, redirect, url_for, jsonify, send_from_directory, send_file, Response
 import os
 from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
-from better_profanity import profanity
 from datetime import datetime, timedelta, timezone
 import secrets
 import mysql.connector
 from mysql.connector import errorcode
-from mysql.connector import pooling
 import hashlib
 from functools import wraps
 import threading
@@ -20,27 +18,52 @@ import logging
 import re
 import json
 import base64 
-from PIL import Image 
+from PIL import Image, UnidentifiedImageError
 from io import BytesIO 
 
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from log_pipeline import setup_logging
+from matchmaking import InterestRegistry, WaitingPool
+from records import MatchProfile, UserSession, WaitingEntry
+from matchmaker import MatchmakingActor, MatchmakingCore, SocketIOOutbox
+from sessions import AuthSessionStore
+from ban_cache import BanCache
+from prompt_index import PromptIndex
+from count_publisher import CountPublisher
+from signaling import IceCandidateBatcher
+from state_backend import LocalStateBackend, RedisStateBackend
+from timer_wheel import TimerWheel
+from image_pipeline import ImagePipeline, read_capped
+from photo_store import LocalPhotoStore, ObjectStorePhotoStore, is_valid_key
+from static_assets import AssetPipeline
+from db_pool import ConnectionPool, PoolTimeout
+from moderation import ProfanityFilter, DEFAULT_WORDLIST
+from metrics import MetricsRegistry, HandlerProfiler
+from wire_format import socketio_options as wire_format_options
+from admission import AdmissionController
+from startup import StartupOrchestrator
+
+# Logs go through a queue to a JSON writer on a background thread. Records tagged with
+# extra={'event': ...} can be sampled (fraction kept) or rate limited (records/second);
+# warnings and errors are never dropped. Log those events with %-style arguments, not
+# f-strings, so a dropped record is never formatted.
+LOG_SAMPLE_RATES = {'signaling': 0.05}
+LOG_RATE_LIMITS = {'waiting': 50, 'connect': 100, 'disconnect': 100, 'db': 20}
+setup_logging(level=logging.INFO, sample_rates=LOG_SAMPLE_RATES, rate_limits=LOG_RATE_LIMITS)
 logger = logging.getLogger(__name__)
 
-active_users_lock = threading.Lock()
-video_state_lock = threading.Lock()
+# Firebase Admin SDK Setup (run as a startup step, see "Startup" below)
+firestore_db = None
 
-# Firebase Admin SDK Setup
-try:
+def init_firebase():
+    global firestore_db
     cred = credentials.Certificate("hushh-63300-firebase-adminsdk-fbsvc-199e052150.json") 
     if not firebase_admin._apps:
         firebase_admin.initialize_app(cred)
     firestore_db = firestore.client()
     logger.info("Firebase Admin SDK initialized successfully.")
-except Exception as e:
-    logger.error(f"FATAL: Failed to initialize Firebase Admin SDK: {e}")
 
 # Flask & SocketIO Setup
 # ----------------------------------------------------
@@ -55,6 +78,28 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'verifi
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 logger.info(f"Verification upload folder created at: {UPLOAD_FOLDER}")
+
+# Uploaded photos are capped at PHOTO_UPLOAD_MAX_BYTES; base64 JSON bodies are ~4/3 of that
+app.config['PHOTO_UPLOAD_MAX_BYTES'] = 8 * 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = 12 * 1024 * 1024
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+photo_pipeline = ImagePipeline(workers=2, max_side=1280, thumb_side=256, quality=85)
+
+# Processed photos are stored by content hash. 'local' shards them under UPLOAD_FOLDER;
+# 's3' puts them in PHOTO_STORE_BUCKET (and serves from PHOTO_STORE_PUBLIC_URL if set).
+app.config['PHOTO_STORE_BACKEND'] = 'local'
+app.config['PHOTO_STORE_BUCKET'] = None
+app.config['PHOTO_STORE_PUBLIC_URL'] = None
+PHOTO_CACHE_MAX_AGE = 31536000  # one year; a key's content never changes
+
+def create_photo_store():
+    if app.config['PHOTO_STORE_BACKEND'] == 's3':
+        import boto3
+        return ObjectStorePhotoStore(boto3.client('s3'), app.config['PHOTO_STORE_BUCKET'],
+                                     public_base_url=app.config['PHOTO_STORE_PUBLIC_URL'])
+    return LocalPhotoStore(UPLOAD_FOLDER)
+
+photo_store = create_photo_store()
 # -------------------------------
 
 
@@ -70,8 +115,35 @@ app.config['MYSQL_USER'] = db_config['user']
 app.config['MYSQL_PASSWORD'] = db_config['password']
 app.config['MYSQL_DB'] = db_config['database']
 
+# DB pool: up to DB_POOL_SIZE connections opened on demand. Callers queue in arrival order and
+# get None (their fallback path) after DB_POOL_TIMEOUT_SECONDS instead of the pool being rebuilt.
+# Idle connections are pinged every DB_POOL_HEALTH_CHECK_SECONDS.
+app.config['DB_POOL_SIZE'] = 25
+app.config['DB_POOL_TIMEOUT_SECONDS'] = 2
+app.config['DB_POOL_MIN_IDLE'] = 2
+app.config['DB_POOL_HEALTH_CHECK_SECONDS'] = 30
+
+# State backend: 'local' keeps users, the waiting pool and rooms in this process (one worker).
+# 'redis' shares them through STATE_REDIS_URL so several workers (one per core, behind a
+# sticky load balancer) match users globally; Socket.IO events fan out over the same Redis.
+# For local multi-worker runs, `python state_backend.py 6379` serves an in-memory stand-in.
+app.config['STATE_BACKEND'] = 'local'
+app.config['STATE_REDIS_URL'] = 'redis://localhost:6379/0'
+SHARED_STATE = app.config['STATE_BACKEND'] == 'redis'
+
+# Wire format: with SOCKETIO_MSGPACK on, clients that connect with ?serializer=msgpack exchange
+# binary MessagePack frames (smaller SDP, ICE and match payloads, cheaper to encode); all others
+# keep JSON text, and each emit is encoded once per format in use. The browser client opts in
+# when SOCKETIO_MSGPACK_PARSER_URL points at a build of socket.io-msgpack-parser that sets
+# window.msgpackParser. Pays off over WebSocket; long-polling carries binary frames base64-encoded,
+# which makes them larger than JSON (benchmarks/serializer_bench.py). Needs the msgpack package.
+app.config['SOCKETIO_MSGPACK'] = False
+app.config['SOCKETIO_MSGPACK_PARSER_URL'] = None
+
 socketio = SocketIO(
     app,
+    message_queue=app.config['STATE_REDIS_URL'] if SHARED_STATE else None,
+    **wire_format_options(app.config['SOCKETIO_MSGPACK'], app.config['STATE_REDIS_URL'] if SHARED_STATE else None),
     cors_allowed_origins="*",
     logger=False,
     engineio_logger=False,
@@ -80,6 +152,44 @@ socketio = SocketIO(
     ping_interval=25
 )
 
+# Metrics: Prometheus text at /metrics. Gauges are read at scrape time; the histograms
+# time the hot paths (matchmaker queue wait and run time, DB checkout, Firebase calls and
+# every socket handler). Handler profiling (the slowest calls with their sid) is toggled
+# at runtime through /metrics/profiling. With METRICS_TOKEN set both endpoints require it
+# in the X-Metrics-Token header; without one /metrics is open and /metrics/profiling,
+# which adds overhead and exposes sids, doesn't exist.
+app.config['METRICS_TOKEN'] = None
+app.config['PROFILING_KEEP_SLOWEST'] = 50
+metrics = MetricsRegistry(prefix='hushh_')
+metrics.gauge('connected_users', 'Users connected (across workers with shared state)', fn=lambda: state.user_count())
+metrics.gauge('waiting_users', 'Users in the matchmaking waiting pool', fn=lambda: len(video_waiting_users))
+metrics.gauge('active_rooms', 'Video rooms currently open', fn=lambda: len(video_active_rooms))
+metrics.gauge('matchmaker_queue_depth', 'Commands waiting for the matchmaking actor', fn=lambda: matchmaker.queue_depth())
+metrics.gauge('db_pool_in_use', 'DB connections checked out', fn=lambda: db_pool.stats()['in_use'])
+metrics.gauge('db_pool_idle', 'DB connections idle in the pool', fn=lambda: db_pool.stats()['idle'])
+metrics.gauge('db_pool_waiters', 'Callers queued for a DB connection', fn=lambda: db_pool.stats()['waiters'])
+metrics.gauge('auth_sessions', 'Verified auth sessions held in memory', fn=lambda: len(auth_sessions))
+metrics.gauge('ready', 'Whether this worker passes /readyz (1) or not (0)', fn=lambda: int(startup.ready(READY_STEPS)))
+matchmaker_queue_wait = metrics.histogram('matchmaker_queue_wait_seconds', 'Time a command waited for the matchmaking actor', ['command'])
+matchmaker_command_time = metrics.histogram('matchmaker_command_seconds', 'Time the matchmaking actor spent applying a command', ['command'])
+db_checkout_time = metrics.histogram('db_checkout_seconds', 'Time to check a connection out of the DB pool')
+db_checkout_failures = metrics.counter('db_checkout_failures', 'DB pool checkouts that failed, by reason (timeout or error)', ['reason'])
+firebase_call_time = metrics.histogram('firebase_call_seconds', 'Firebase Admin API call latency', ['call'])
+firebase_call_errors = metrics.counter('firebase_call_errors', 'Firebase Admin API calls that raised', ['call'])
+admission_rejected = metrics.counter('admission_rejected', 'Socket events turned away by admission control, by reason (sid, ip or overload)', ['event', 'reason'])
+handler_profiler = HandlerProfiler(
+    metrics.histogram('socket_handler_seconds', 'Socket.IO event handler run time', ['event']),
+    keep=app.config['PROFILING_KEEP_SLOWEST']
+)
+
+def observe_matchmaker_command(command, queued_seconds, run_seconds):
+    matchmaker_queue_wait.labels(command).observe(queued_seconds)
+    matchmaker_command_time.labels(command).observe(run_seconds)
+
+def profiled(event):
+    """Times a socket handler under `event`; the sid is recorded while profiling is on."""
+    return handler_profiler.wrap(event, sid_fn=lambda: request.sid)
+
 # Prompt Data Structure and Loading
 PROMPT_FILE = 'prompts.json'
 # ... (load_prompts_from_json, Utility Functions, Database Setup, etc. remain unchanged) ...
@@ -112,9 +222,36 @@ def get_client_fingerprint(request):
     fingerprint_data = f"{user_agent}|{accept_language}|{accept_encoding}"
     return hashlib.md5(fingerprint_data.encode()).hexdigest()
 
+# Moderation: the censor list (MODERATION_WORDLIST, by default better_profanity's, plus
+# MODERATION_EXTRA_WORDS) is compiled once and recompiled when the file changes, checked
+# every MODERATION_RELOAD_SECONDS. Batches larger than MODERATION_INLINE_BATCH are screened
+# on MODERATION_WORKERS native threads so the event loop keeps serving sockets.
+app.config['MODERATION_WORDLIST'] = DEFAULT_WORDLIST
+app.config['MODERATION_EXTRA_WORDS'] = []
+app.config['MODERATION_RELOAD_SECONDS'] = 60
+app.config['MODERATION_WORKERS'] = 2
+app.config['MODERATION_INLINE_BATCH'] = 32
+profanity_filter = ProfanityFilter(
+    app.config['MODERATION_WORDLIST'], extra_words=app.config['MODERATION_EXTRA_WORDS'],
+    workers=app.config['MODERATION_WORKERS'], inline_batch=app.config['MODERATION_INLINE_BATCH']
+)
+
 def check_message(message):
-    profanity.load_censor_words()
-    return profanity.contains_profanity(message)
+    return profanity_filter.check_message(message)
+
+def check_messages(messages):
+    """check_message for many messages (chat backlog, display names, profile fields) at once."""
+    return profanity_filter.check_messages(messages)
+
+def reload_censor_words_forever():
+    while True:
+        socketio.sleep(app.config['MODERATION_RELOAD_SECONDS'])
+        try:
+            profanity_filter.reload_if_changed()
+        except Exception as e:
+            logger.error(f"Censor word reload error: {e}", exc_info=True)
+
+socketio.start_background_task(reload_censor_words_forever)
 
 def get_current_time():
     return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
@@ -123,88 +260,115 @@ def create_video_room():
     room_id = f"hushh-video-{secrets.token_hex(8)}"
     return room_id
 
-def calculate_interest_match(interests1, interests2):
-    if not isinstance(interests1, set) or not isinstance(interests2, set): return 0.0
-    if not interests1 or not interests2: return 0.0
-    try:
-        intersection = len(interests1.intersection(interests2))
-        union = len(interests1.union(interests2))
-        similarity = float(intersection) / union if union > 0 else 0.0
-        return similarity
-    except Exception:
-        return 0.0
+# Online user count: connects/disconnects only mark it dirty and it is flushed at most every
+# USER_COUNT_INTERVAL_SECONDS. With USER_COUNT_ROOM set, only sockets that sent
+# 'subscribe_user_count' receive it instead of every connected client.
+app.config['USER_COUNT_INTERVAL_SECONDS'] = 2
+app.config['USER_COUNT_ROOM'] = None
+
+def current_user_count():
+    return state.user_count()
+
+# With shared state the count is global, so only the matchmaking leader publishes it
+user_count_publisher = CountPublisher(
+    socketio, 'updateUserCount', current_user_count,
+    interval=app.config['USER_COUNT_INTERVAL_SECONDS'], room=app.config['USER_COUNT_ROOM'],
+    active_fn=(lambda: state.is_leader()) if SHARED_STATE else None
+)
+socketio.start_background_task(user_count_publisher.run)
 
 def broadcast_user_count():
-    count = 0
-    with active_users_lock:
-        count = len(active_users)
-    socketio.emit('updateUserCount', count)
+    user_count_publisher.mark_dirty()
 
-def check_dating_compatibility(user1_profile, user2_profile):
-    """
-    Check if two users are compatible based on dating preferences.
-    Returns True if they should be matched, False otherwise.
-    """
-    user1_gender = user1_profile.get('gender', '').lower()
-    user1_pref = user1_profile.get('datingPreference', '').lower()
-    user2_gender = user2_profile.get('gender', '').lower()
-    user2_pref = user2_profile.get('datingPreference', '').lower()
-    
-    # Bisexual matches with everyone
-    if user1_pref == 'bisexual' or user2_pref == 'bisexual':
+# Database Setup
+db_pool = ConnectionPool(
+    lambda: mysql.connector.connect(**db_config),
+    size=app.config['DB_POOL_SIZE'], timeout=app.config['DB_POOL_TIMEOUT_SECONDS'],
+    min_idle=app.config['DB_POOL_MIN_IDLE'], validate_idle_seconds=app.config['DB_POOL_HEALTH_CHECK_SECONDS']
+)
+
+def create_database():
+    """Creates MYSQL_DB over a connection that selects no database (pool connections need it to exist)."""
+    conn = mysql.connector.connect(host=app.config['MYSQL_HOST'], user=app.config['MYSQL_USER'], password=app.config['MYSQL_PASSWORD'])
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"CREATE DATABASE {app.config['MYSQL_DB']} DEFAULT CHARACTER SET 'utf8mb4'")
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_DB_CREATE_EXISTS: raise err
+    finally:
+        cursor.close()
+        conn.close()
+
+# Bump whenever init_db's DDL changes; startup skips the schema work while the stored version matches
+SCHEMA_VERSION = 2
+
+def stored_schema_version():
+    """The version init_db last recorded, or None for a missing database or an older schema."""
+    try:
+        conn = db_pool.connection()
+    except mysql.connector.Error as err:
+        if err.errno == errorcode.ER_BAD_DB_ERROR: return None
+        raise err
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT version FROM schema_version WHERE id = 1")
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except mysql.connector.Error as err:
+        if err.errno == errorcode.ER_NO_SUCH_TABLE: return None
+        raise err
+    finally:
+        cursor.close()
+        conn.close()
+
+def ensure_schema():
+    version = stored_schema_version()
+    if version == SCHEMA_VERSION:
+        logger.info(f"Database schema is at version {version}; skipping schema setup")
         return True
-    
-    # Straight: male wants female, female wants male
-    if user1_pref == 'straight':
-        if user1_gender == 'male' and user2_gender != 'female':
-            return False
-        if user1_gender == 'female' and user2_gender != 'male':
-            return False
-    
-    if user2_pref == 'straight':
-        if user2_gender == 'male' and user1_gender != 'female':
-            return False
-        if user2_gender == 'female' and user1_gender != 'male':
-            return False
-    
-    # Gay: male wants male
-    if user1_pref == 'gay' and (user1_gender != 'male' or user2_gender != 'male'):
-        return False
-    if user2_pref == 'gay' and (user2_gender != 'male' or user1_gender != 'male'):
-        return False
-    
-    # Lesbian: female wants female
-    if user1_pref == 'lesbian' and (user1_gender != 'female' or user2_gender != 'female'):
-        return False
-    if user2_pref == 'lesbian' and (user2_gender != 'female' or user1_gender != 'female'):
-        return False
-    
+    logger.info(f"Database schema is at version {version}; migrating to {SCHEMA_VERSION}")
+    init_db()
     return True
 
-# Database Setup
-db_pool = None
-
 def init_db():
-    db_name = app.config['MYSQL_DB']
     conn = None
     cursor = None
     try:
-        conn = mysql.connector.connect(host=app.config['MYSQL_HOST'], user=app.config['MYSQL_USER'], password=app.config['MYSQL_PASSWORD'])
-        cursor = conn.cursor()
         try:
-            cursor.execute(f"CREATE DATABASE {db_name} DEFAULT CHARACTER SET 'utf8mb4'")
+            conn = db_pool.connection()
         except mysql.connector.Error as err:
-            if err.errno != errorcode.ER_DB_CREATE_EXISTS: raise err
-        cursor.execute(f"USE {db_name}")
+            if err.errno != errorcode.ER_BAD_DB_ERROR: raise err
+            create_database()
+            conn = db_pool.connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                id TINYINT PRIMARY KEY, version INT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        ''')
         
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS banned_ips (
                 id INT PRIMARY KEY AUTO_INCREMENT, ip_address VARCHAR(45) NOT NULL, browser_fingerprint VARCHAR(32) NOT NULL,
                 ban_reason TEXT, ban_expires TIMESTAMP NULL DEFAULT NULL, ads_watched INT DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, UNIQUE KEY ip_fingerprint (ip_address, browser_fingerprint)
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                UNIQUE KEY ip_fingerprint (ip_address, browser_fingerprint), KEY idx_updated_at (updated_at)
             )
         ''')
         
+        # Older databases predate updated_at, which the ban cache uses for incremental refreshes
+        try:
+            cursor.execute('''
+                ALTER TABLE banned_ips
+                ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                ADD KEY idx_updated_at (updated_at)
+            ''')
+        except mysql.connector.Error as err:
+            if err.errno != errorcode.ER_DUP_FIELDNAME: raise err
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS reports (
                 id INT PRIMARY KEY AUTO_INCREMENT, reporter_ip VARCHAR(45), reported_ip VARCHAR(45),
@@ -234,6 +398,7 @@ def init_db():
             else:
                 logger.warning("No prompts loaded from JSON to seed the database.")
         
+        cursor.execute("REPLACE INTO schema_version (id, version) VALUES (1, %s)", (SCHEMA_VERSION,))
         conn.commit()
     except mysql.connector.Error as err:
         logger.error(f"Database initialization failed: {err}")
@@ -244,29 +409,33 @@ def init_db():
         if conn: conn.close()
 
 def init_db_pool():
-    global db_pool
-    if db_pool is not None: return True
-    try:
-        db_pool = mysql.connector.pooling.MySQLConnectionPool(pool_name="hushh_pool", pool_size=25, pool_reset_session=True, **db_config)
-        conn = db_pool.get_connection()
-        conn.close()
-        return True
-    except mysql.connector.Error as err:
-        db_pool = None
-        return False
-    
+    """Opens DB_POOL_MIN_IDLE connections up front so the first requests don't pay for connecting."""
+    db_pool.warm(app.config['DB_POOL_MIN_IDLE'])
+
 def get_db_connection():
-    global db_pool
-    if db_pool is None:
-        if not init_db_pool(): return None
     try:
-        conn = db_pool.get_connection()
-        return conn
+        with db_checkout_time.time():
+            return db_pool.connection()
+    except PoolTimeout as e:
+        db_checkout_failures.labels('timeout').inc()
+        logger.info("DB checkout timed out: %s", e, extra={'event': 'db'})
+        return None
     except mysql.connector.Error as err:
-        db_pool = None
+        db_checkout_failures.labels('error').inc()
+        logger.info("DB connection failed: %s", err, extra={'event': 'db'})
         return None
 
-def check_ip_ban(ip_address, browser_fingerprint):
+def check_db_pool_forever():
+    while True:
+        socketio.sleep(app.config['DB_POOL_HEALTH_CHECK_SECONDS'])
+        try:
+            closed = db_pool.check_idle()
+            if closed:
+                logger.info(f"Closed {closed} idle DB connections")
+        except Exception as e:
+            logger.error(f"DB pool health check error: {e}", exc_info=True)
+
+def check_ip_ban_db(ip_address, browser_fingerprint):
     conn = get_db_connection()
     if not conn: return False, 0, "DB Error", 0
     cursor = conn.cursor()
@@ -274,6 +443,9 @@ def check_ip_ban(ip_address, browser_fingerprint):
     try:
         cursor.execute('''SELECT ban_expires, ban_reason, ads_watched FROM banned_ips WHERE ip_address = %s AND browser_fingerprint = %s''', (ip_address, browser_fingerprint))
         result = cursor.fetchone()
+    except (mysql.connector.OperationalError, mysql.connector.InterfaceError):
+        conn.discard()  # lost connection: don't hand it to the next caller
+        return False, 0, "DB Error", 0
     except mysql.connector.Error:
         return False, 0, "DB Error", 0
     finally:
@@ -294,89 +466,367 @@ def check_ip_ban(ip_address, browser_fingerprint):
     remaining_minutes = max(0, int(remaining_delta.total_seconds() / 60))
     return True, remaining_minutes, ban_reason, ads_watched
 
+# Ban lookups are served from memory once the cache has loaded; the DB query is only a fallback
+app.config['BAN_CACHE_REFRESH_SECONDS'] = 15
+ban_cache = BanCache(get_db_connection)
+
+def check_ip_ban(ip_address, browser_fingerprint):
+    if ban_cache.loaded:
+        return ban_cache.check(ip_address, browser_fingerprint)
+    return check_ip_ban_db(ip_address, browser_fingerprint)
+
+def refresh_ban_cache_forever():
+    while True:
+        socketio.sleep(app.config['BAN_CACHE_REFRESH_SECONDS'])
+        try:
+            ban_cache.refresh()
+        except Exception as e:
+            logger.error(f"Ban cache refresher error: {e}", exc_info=True)
+
+# Match prompts are served from memory; the table is polled for changes every PROMPT_INDEX_REFRESH_SECONDS
+app.config['PROMPT_INDEX_REFRESH_SECONDS'] = 60
+prompt_index = PromptIndex()
+
 def get_random_match_prompt(user_region=None):
-    """Fetches a random prompt, prioritizing global and user's region."""
-    conn = get_db_connection()
-    if not conn: return "What's your biggest guilty pleasure?"
-    cursor = conn.cursor(dictionary=True)
-    prompt = "What's your biggest guilty pleasure?"
-    
-    try:
-        if user_region and user_region != 'global':
-            cursor.execute("SELECT prompt FROM match_prompts WHERE region IN ('global', %s) ORDER BY RAND() LIMIT 1", (user_region,))
-        else:
-            cursor.execute("SELECT prompt FROM match_prompts WHERE region = 'global' ORDER BY RAND() LIMIT 1")
-        
-        result = cursor.fetchone()
-        if result: prompt = result['prompt']
+    """Picks a random prompt, prioritizing global and user's region."""
+    return prompt_index.random_prompt(user_region)
 
-    except mysql.connector.Error as err:
-        logger.error(f"Error fetching match prompt: {err}")
-    finally:
-        cursor.close()
-        conn.close()
-    return prompt
+def load_prompt_file():
+    """Serves prompts from PROMPT_FILE until the table has been read (unless it already has)."""
+    if not len(prompt_index):
+        prompt_index.load(load_prompts_from_json())
+    return len(prompt_index) > 0
 
-# Run DB Init
-logger.info("Attempting initial database check...")
-try:
-    init_db()
-except Exception as e:
-    logger.error(f"FATAL: Database initialization failed at startup: {e}")
-logger.info("Initial database check complete.")
+def load_prompt_index():
+    return prompt_index.reload_from_db(get_db_connection, force=True)
 
-if not init_db_pool():
-    logger.error("FATAL: Could not initialize database pool at startup")
+def refresh_prompt_index_forever():
+    while True:
+        socketio.sleep(app.config['PROMPT_INDEX_REFRESH_SECONDS'])
+        try:
+            prompt_index.reload_from_db(get_db_connection)
+        except Exception as e:
+            logger.error(f"Prompt index refresher error: {e}", exc_info=True)
+
+# Startup: Firebase, the schema check, pool warm-up, the ban cache and prompts run as background
+# steps, concurrently where they don't depend on each other, so the worker serves straight away
+# and a slow or missing database no longer holds up the process. Failed steps are retried every
+# STARTUP_RETRY_SECONDS, backing off to STARTUP_MAX_RETRY_SECONDS. /healthz answers once the
+# process is up; /readyz only once READY_STEPS are (until then ban checks fall back to
+# per-request queries and prompts come from PROMPT_FILE).
+app.config['STARTUP_RETRY_SECONDS'] = 1
+app.config['STARTUP_MAX_RETRY_SECONDS'] = 30
+READY_STEPS = ('firebase', 'bans', 'prompts')
+startup = StartupOrchestrator(
+    socketio, retry_seconds=app.config['STARTUP_RETRY_SECONDS'], max_retry_seconds=app.config['STARTUP_MAX_RETRY_SECONDS']
+)
+startup.step('firebase', init_firebase)
+startup.step('prompts', load_prompt_file)
+startup.step('schema', ensure_schema)
+startup.step('db_pool', init_db_pool, requires=['schema'])
+startup.step('bans', lambda: ban_cache.refresh(full=True), requires=['schema'])
+startup.step('prompts_db', load_prompt_index, requires=['schema'])
+startup.start()
+
+socketio.start_background_task(check_db_pool_forever)
+socketio.start_background_task(refresh_ban_cache_forever)
+socketio.start_background_task(refresh_prompt_index_forever)
 
 def check_user_ban(uid, ip_address, browser_fingerprint):
     return check_ip_ban(ip_address, browser_fingerprint)
 
 # Active User and Waiting List Structure
-active_users = {}
-video_waiting_users = []
+interest_registry = InterestRegistry()
+
+# Candidate priority = interest score + MATCH_AGING_PER_SECOND * seconds waited (capped), so rare
+# profiles don't wait forever; only the top MATCH_SEARCH_TOP_K of each compatible bucket are checked
+app.config['MATCH_AGING_PER_SECOND'] = 0.01
+app.config['MATCH_AGING_CAP_SECONDS'] = 120
+app.config['MATCH_SEARCH_TOP_K'] = 16
+video_waiting_users = WaitingPool(
+    interest_registry,
+    aging_per_second=app.config['MATCH_AGING_PER_SECOND'],
+    aging_cap_seconds=app.config['MATCH_AGING_CAP_SECONDS'],
+    search_top_k=app.config['MATCH_SEARCH_TOP_K']
+)
 video_active_rooms = {}
 
+# Batch matching: instead of greedy per-request matches, pair the whole pool every
+# MATCH_BATCH_INTERVAL_MS or as soon as MATCH_BATCH_SIZE users are waiting
+app.config['MATCH_BATCH_MODE'] = False
+app.config['MATCH_BATCH_INTERVAL_MS'] = 500
+app.config['MATCH_BATCH_SIZE'] = 200
+app.config['MATCH_BATCH_TOP_K'] = 8
+
+# Reaper: timeouts run off one timer wheel on the matchmaking actor, advanced every
+# REAPER_TICK_SECONDS. Timed dates start TIMED_DATE_START_DELAY_SECONDS after the match and
+# are ended if no decision arrived TIMED_DATE_DEADLINE_SECONDS after it (3s lead-in + 90s
+# date + decision time). Waiting users are checked for a live socket every
+# WAITING_CHECK_SECONDS and re-queued by the client after MATCH_MAX_WAIT_SECONDS; rooms
+# are swept for departed users ROOM_SWEEP_BATCH at a time every ROOM_SWEEP_SECONDS.
+app.config['REAPER_TICK_SECONDS'] = 0.5
+app.config['TIMED_DATE_START_DELAY_SECONDS'] = 3
+app.config['TIMED_DATE_DEADLINE_SECONDS'] = 180
+app.config['WAITING_CHECK_SECONDS'] = 30
+app.config['MATCH_MAX_WAIT_SECONDS'] = 600
+app.config['ROOM_SWEEP_SECONDS'] = 30
+app.config['ROOM_SWEEP_BATCH'] = 200
+# Sockets idle this long are checked against the Socket.IO server and dropped if gone
+app.config['USER_SWEEP_SECONDS'] = 60
+
+# Matchmaking state above is owned by a single actor green thread; handlers only submit commands to it
+matchmaker = MatchmakingActor(MatchmakingCore(
+    video_waiting_users, video_active_rooms, SocketIOOutbox(socketio),
+    prompt_picker=get_random_match_prompt, room_id_factory=create_video_room,
+    batch_mode=app.config['MATCH_BATCH_MODE'], batch_size=app.config['MATCH_BATCH_SIZE'],
+    batch_top_k=app.config['MATCH_BATCH_TOP_K'],
+    timers=TimerWheel(tick=app.config['REAPER_TICK_SECONDS']),
+    is_connected=lambda sid: state.is_connected(sid),
+    timed_date_delay=app.config['TIMED_DATE_START_DELAY_SECONDS'],
+    timed_date_deadline=app.config['TIMED_DATE_DEADLINE_SECONDS'],
+    wait_check_interval=app.config['WAITING_CHECK_SECONDS'],
+    max_wait=app.config['MATCH_MAX_WAIT_SECONDS'],
+    room_sweep_interval=app.config['ROOM_SWEEP_SECONDS'],
+    room_sweep_batch=app.config['ROOM_SWEEP_BATCH']
+), observe=observe_matchmaker_command)
+
+if SHARED_STATE:
+    state = RedisStateBackend.from_url(app.config['STATE_REDIS_URL'], matchmaker)
+else:
+    state = LocalStateBackend(matchmaker)
+state.start(socketio)
+
+# Users connected to this worker; the backend may wrap the pool and rooms to mirror them
+active_users = state.users
+video_waiting_users = matchmaker.core.pool
+video_active_rooms = matchmaker.core.rooms
+
+def run_match_rounds_forever():
+    while True:
+        socketio.sleep(app.config['MATCH_BATCH_INTERVAL_MS'] / 1000)
+        if len(video_waiting_users) >= 2:
+            state.submit('round')
+
+if app.config['MATCH_BATCH_MODE']:
+    socketio.start_background_task(run_match_rounds_forever)
+
+def socket_is_live(sid):
+    return socketio.server.manager.is_connected(sid, '/')
+
+def release_user(user_sid):
+    """Forgets a socket everywhere and takes it out of matchmaking."""
+    auth_sessions.drop(user_sid)
+    ice_batcher.forget(user_sid)
+    admission.forget(user_sid)
+    state.unregister_user(user_sid)
+    state.submit('leave', user_sid)
+
+def run_reaper_forever():
+    last_user_sweep = time.monotonic()
+    while True:
+        socketio.sleep(app.config['REAPER_TICK_SECONDS'])
+        try:
+            if state.is_leader():
+                matchmaker.submit('tick')
+
+            if time.monotonic() - last_user_sweep >= app.config['USER_SWEEP_SECONDS']:
+                last_user_sweep = time.monotonic()
+                gone = state.sweep_users(socket_is_live, app.config['USER_SWEEP_SECONDS'])
+                admission.sweep()
+                for user_sid in gone:
+                    release_user(user_sid)
+                if gone:
+                    logger.info(f"Reclaimed {len(gone)} users whose sockets are gone")
+                    broadcast_user_count()
+        except Exception as e:
+            logger.error(f"Reaper error: {e}", exc_info=True)
+
+socketio.start_background_task(run_reaper_forever)
+
+# ICE candidates are coalesced per (room, sender) for ICE_BATCH_WINDOW_MS and sent as one
+# 'ice-candidates' message to clients that connect with ice_batch=1; 0 disables batching
+app.config['ICE_BATCH_WINDOW_MS'] = 25
+ice_batcher = IceCandidateBatcher(socketio, window=app.config['ICE_BATCH_WINDOW_MS'] / 1000)
+
+# Admission control: token buckets per sid and per IP on the hot events, as (tokens per second,
+# burst). An event is dropped unless both buckets have a token, and the client gets one
+# 'retry-after' event ({event, reason, retry_after}) per run of rejections. While
+# MATCH_MAX_BACKLOG matchmaking commands are waiting for the actor, find-video-match is shed
+# with a retry-after of ADMISSION_SHED_RETRY_SECONDS. Per-IP limits allow for users sharing a NAT.
+app.config['ADMISSION_LIMITS'] = {
+    'find-video-match': {'sid': (0.5, 3), 'ip': (5, 30)},
+    'match_decision': {'sid': (2, 6), 'ip': (20, 60)},
+    'ice-candidate': {'sid': (20, 60), 'ip': (200, 600)},
+}
+app.config['MATCH_MAX_BACKLOG'] = 500
+app.config['ADMISSION_SHED_RETRY_SECONDS'] = 1.0
+
+def count_rejection(rejection):
+    admission_rejected.labels(rejection.event, rejection.reason).inc()
+
+admission = AdmissionController(
+    app.config['ADMISSION_LIMITS'], backlog=state.command_backlog, max_backlog=app.config['MATCH_MAX_BACKLOG'],
+    shed_retry_seconds=app.config['ADMISSION_SHED_RETRY_SECONDS'], on_reject=count_rejection
+)
+
+def admitted(event, shed=False):
+    """
+    Runs the handler only if admission control lets `event` through, otherwise answers
+    'retry-after'. With shed the event is also turned away while the matchmaking backlog is full.
+    """
+    def decorator(f):
+        @wraps(f)
+        def gated(*args, **kwargs):
+            sid = request.sid
+            rejection = admission.check(event, sid, admission.ip_of(sid) or get_client_ip(request))
+            if rejection is None and shed:
+                rejection = admission.shed(event)
+            if rejection is not None:
+                if rejection.notify:
+                    emit('retry-after', rejection.to_dict())
+                return
+            return f(*args, **kwargs)
+        return gated
+    return decorator
+
+# Auth sessions: verified once on connect, re-checked against Firebase every AUTH_SESSION_TTL seconds (0 = never)
+app.config['AUTH_SESSION_TTL'] = 300
+auth_sessions = AuthSessionStore(ttl=app.config['AUTH_SESSION_TTL'])
+
+def firebase_get_user(uid, call):
+    """auth.get_user, timed and counted under `call`."""
+    try:
+        with firebase_call_time.labels(call).time():
+            return auth.get_user(uid)
+    except Exception:
+        firebase_call_errors.labels(call).inc()
+        raise
+
+def authenticate_connection():
+    """Verifies the UID and profile from the connect query string and binds them to the sid."""
+    uid = request.args.get('firebase_uid')
+    profile_json = request.args.get('profile')
+    
+    if not uid or not profile_json:
+         return None
+    
+    try:
+        user = firebase_get_user(uid, 'connect')
+        if getattr(user, 'disabled', False):
+            logger.warning(f"Disabled Firebase account {uid} rejected for SID {request.sid}", extra={'event': 'auth', 'sid': request.sid, 'uid': uid})
+            return None
+
+        profile_data = json.loads(profile_json)
+        
+        if not all(k in profile_data for k in ['name', 'age', 'gender', 'interests']):
+             return None
+
+        return auth_sessions.bind(request.sid, uid, profile_data)
+
+    except (firebase_admin.exceptions.FirebaseError, json.JSONDecodeError, KeyError, ValueError) as e:
+        # ValueError also covers "The default Firebase app does not exist"
+        logger.warning(f"Invalid Firebase UID or Profile data for SID {request.sid}: {e}", extra={'event': 'auth', 'sid': request.sid, 'uid': uid})
+        return None
+
+def reverify_session(auth_session):
+    """
+    Re-checks a stale session's UID with Firebase so revocations take effect within the TTL.
+    False only for a deleted or disabled account; when Firebase can't be reached the session
+    is kept and checked again after another TTL.
+    """
+    try:
+        user = firebase_get_user(auth_session.uid, 'reverify')
+        if getattr(user, 'disabled', False):
+            return False
+    except auth.UserNotFoundError:
+        return False
+    except firebase_admin.exceptions.FirebaseError as e:
+        logger.warning(f"Could not re-verify {auth_session.uid} (SID {auth_session.sid}), keeping the session: {e}", extra={'event': 'auth', 'sid': auth_session.sid, 'uid': auth_session.uid})
+    auth_sessions.mark_verified(auth_session.uid)
+    return True
+
 # Decorator
 def firebase_authenticated(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        uid = request.args.get('firebase_uid')
-        profile_json = request.args.get('profile')
-        
-        if not uid or not profile_json:
-             disconnect(request.sid, silent=True)
-             return False
+        auth_session = auth_sessions.get(request.sid)
         
-        try:
-            auth.get_user(uid) 
-            profile_data = json.loads(profile_json)
-            
-            if not all(k in profile_data for k in ['name', 'age', 'gender', 'interests']):
-                 disconnect(request.sid, silent=True)
-                 return False
-
-            request.uid = uid
-            request.profile_data = profile_data
-            
-            return f(*args, **kwargs)
-
-        except (firebase_admin.exceptions.FirebaseError, json.JSONDecodeError, KeyError) as e:
-            logger.warning(f"Invalid Firebase UID or Profile data for SID {request.sid}: {e}")
+        if auth_session is None:
+            # Until the Admin SDK is initialized there is nothing to verify the UID against
+            if startup.ready(['firebase']):
+                auth_session = authenticate_connection()
+            else:
+                logger.info(f"Rejecting SID {request.sid} until Firebase is initialized", extra={'event': 'auth', 'sid': request.sid})
+        elif auth_sessions.is_stale(auth_session) and not reverify_session(auth_session):
+            logger.warning(f"Firebase account {auth_session.uid} was deleted or disabled; disconnecting its sessions", extra={'event': 'auth', 'sid': request.sid, 'uid': auth_session.uid})
+            # Every socket of the uid goes, not just the one that noticed
+            for sid in auth_sessions.revoke(auth_session.uid):
+                if sid != request.sid:
+                    disconnect(sid, silent=True)
+            auth_session = None
+
+        if auth_session is None:
             disconnect(request.sid, silent=True)
             return False
+
+        request.uid = auth_session.uid
+        request.profile_data = auth_session.profile
+
+        user_data = active_users.get(request.sid)
+        if user_data is not None:
+            user_data.last_activity = time.time()
+        
+        return f(*args, **kwargs)
             
     return decorated_function
 
 # Routes
 
 # NEW: Route to serve uploaded verification photos
+# Legacy <uidhash>_<ms>.jpg uploads from before the content-addressed store
 @app.route('/verification_uploads/<filename>')
 def serve_verification_photo(filename):
     # This route serves files saved by the upload_verification_photo endpoint
     # Security note: In production, these should be stored in a secured cloud bucket/CDN.
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
+# Content-addressed photos: the key is the sha256 of the file, so it doubles as a strong
+# ETag and the response can be cached forever. send_file handles If-None-Match and Range.
+@app.route('/photos/<key>.jpg')
+def serve_photo(key):
+    if not is_valid_key(key):
+        return jsonify({"error": "Not found"}), 404
+
+    public_url = photo_store.public_url(key)
+    if public_url:
+        return redirect(public_url, code=301)
+
+    path = photo_store.local_path(key)
+    try:
+        source = path or photo_store.open(key)
+    except KeyError:
+        return jsonify({"error": "Not found"}), 404
+
+    response = send_file(source, mimetype=photo_store.content_type, etag=key, conditional=True, max_age=PHOTO_CACHE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def save_verification_photo(uid, image_bytes):
+    """Runs the image pipeline off the event loop and stores the photo plus a thumbnail. Returns their URLs."""
+    photo_bytes, thumbnail_bytes = photo_pipeline.process(image_bytes)
+
+    # Identical photos hash to the same key, so re-uploads are stored once
+    photo_key = photo_store.put(photo_bytes)
+    thumbnail_key = photo_store.put(thumbnail_bytes)
+
+    photo_url = url_for('serve_photo', key=photo_key, _external=True)
+    thumbnail_url = url_for('serve_photo', key=thumbnail_key, _external=True)
+    logger.info(f"Photo uploaded for {uid}. URL: {photo_url}", extra={'event': 'upload', 'uid': uid})
+    return photo_url, thumbnail_url
+
 # NEW: API Endpoint for Server-Side Photo Upload (Saves image locally)
+# Kept for older clients; new clients post the raw image to /upload_verification_photo/binary
 @app.route('/upload_verification_photo', methods=['POST'])
 def upload_verification_photo():
     data = request.get_json()
@@ -394,59 +844,155 @@ def upload_verification_photo():
 
         encoded = image_data_base64.split(',', 1)[1]
         image_bytes = base64.b64decode(encoded)
+        if len(image_bytes) > app.config['PHOTO_UPLOAD_MAX_BYTES']:
+            return jsonify({"error": "Photo is too large."}), 413
         
-        # 2. Process and save the image using PIL
-        image = Image.open(BytesIO(image_bytes))
+        # 2. Process and save the image off the event loop
+        photo_url, thumbnail_url = save_verification_photo(uid, image_bytes)
         
-        # Generate unique filename: UID_TIMESTAMP.jpg
-        uid_hash = hashlib.sha256(uid.encode()).hexdigest()[:16] 
-        filename = f"{uid_hash}_{int(time.time() * 1000)}.jpg"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        # Save the image
-        # You may want to resize/optimize the image here before saving
-        image.save(file_path, 'jpeg')
-        
-        # 3. Construct the server URL/path to be stored
-        photo_url = url_for('serve_verification_photo', filename=filename, _external=True)
-        
-        logger.info(f"Photo uploaded for {uid}. URL: {photo_url}")
-        
-        # 4. Return the URL to the client
-        return jsonify({"message": "Upload successful", "photo_url": photo_url}), 200
+        # 3. Return the URLs to the client
+        return jsonify({"message": "Upload successful", "photo_url": photo_url, "thumbnail_url": thumbnail_url}), 200
 
-    except ValueError as e:
-        logger.error(f"Base64 error for {uid}: {e}")
+    except (ValueError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.error(f"Base64 error for {uid}: {e}", extra={'event': 'upload', 'uid': uid})
         return jsonify({"error": "Invalid image data format. Ensure JPEG Base64 is correct."}), 400
     except Exception as e:
-        logger.error(f"Error processing image upload for {uid}: {e}")
+        logger.error(f"Error processing image upload for {uid}: {e}", extra={'event': 'upload', 'uid': uid})
         return jsonify({"error": f"Internal server error during image processing: {e}"}), 500
 
+# Raw or multipart photo upload: the body is read in chunks and rejected once it passes
+# PHOTO_UPLOAD_MAX_BYTES, and decoding/resizing runs off the event loop.
+#   POST /upload_verification_photo/binary?uid=<uid>   (Content-Type: image/*, body = image bytes)
+#   POST /upload_verification_photo/binary             (multipart/form-data with 'uid' and 'photo')
+@app.route('/upload_verification_photo/binary', methods=['POST'])
+def upload_verification_photo_binary():
+    max_bytes = app.config['PHOTO_UPLOAD_MAX_BYTES']
+    if request.content_length is not None and request.content_length > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        return jsonify({"error": "Photo is too large."}), 413
+
+    if request.mimetype == 'multipart/form-data':
+        uid = request.form.get('uid')
+        photo = request.files.get('photo')
+        image_bytes = read_capped(photo.stream, max_bytes) if photo else b''
+    else:
+        uid = request.args.get('uid')
+        image_bytes = read_capped(request.stream, max_bytes)
+
+    if image_bytes is None:
+        return jsonify({"error": "Photo is too large."}), 413
+    if not uid or not image_bytes:
+        return jsonify({"error": "Missing UID or image data"}), 400
+
+    try:
+        photo_url, thumbnail_url = save_verification_photo(uid, image_bytes)
+        return jsonify({"message": "Upload successful", "photo_url": photo_url, "thumbnail_url": thumbnail_url}), 200
+
+    except (ValueError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.error(f"Invalid photo upload for {uid}: {e}", extra={'event': 'upload', 'uid': uid})
+        return jsonify({"error": "Invalid image data. Upload a JPEG or PNG photo."}), 400
+    except Exception as e:
+        logger.error(f"Error processing image upload for {uid}: {e}", extra={'event': 'upload', 'uid': uid})
+        return jsonify({"error": f"Internal server error during image processing: {e}"}), 500
+
+
+@app.route('/stats/matchmaking')
+def matchmaking_stats():
+    # Queue depth, command latency and p50/p95/p99 queue wait for tuning aging and batch settings
+    return jsonify(state.stats())
+
+@app.route('/stats/db')
+def db_stats():
+    return jsonify(db_pool.stats())
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    ready = startup.ready(READY_STEPS)
+    return jsonify({'ready': ready, 'steps': startup.status()}), 200 if ready else 503
+
+@app.route('/stats/admission')
+def admission_stats():
+    return jsonify(admission.stats())
+
+def metrics_authorized(required=False):
+    token = app.config['METRICS_TOKEN']
+    if not token: return not required
+    return secrets.compare_digest(request.headers.get('X-Metrics-Token', ''), token)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    return Response(metrics.render(), content_type=MetricsRegistry.CONTENT_TYPE)
+
+@app.route('/metrics/profiling', methods=['GET', 'POST'])
+def metrics_profiling():
+    # POST {"enabled": true, "keep": 50} to start collecting the slowest handler calls
+    if not app.config['METRICS_TOKEN']:
+        return jsonify({"error": "Not found"}), 404
+    if not metrics_authorized(required=True):
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        keep = data.get('keep')
+        if keep is not None and (not isinstance(keep, int) or keep < 1):
+            return jsonify({"error": "keep must be a positive integer"}), 400
+        handler_profiler.set_enabled(bool(data.get('enabled')), keep)
+        logger.info(f"Handler profiling {'enabled' if handler_profiler.enabled else 'disabled'}")
+    return jsonify({'enabled': handler_profiler.enabled, 'keep': handler_profiler.keep, 'slowest': handler_profiler.slowest()})
+
+# Static files served from the app directory are fingerprinted and precompressed once at startup
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_ASSET_FILES = ['video-chat-logic.js', 'firebase-auth.js', 'manifest.json', 'hushh-ico.png', 'service-worker.js']
+static_assets = AssetPipeline().build(APP_ROOT, STATIC_ASSET_FILES)
+# Rendered pages, keyed by template name; the templates take no per-request context
+page_cache = AssetPipeline()
+
+@app.context_processor
+def inject_asset_url():
+    return {'asset_url': static_assets.url,
+            'msgpack_parser_url': app.config['SOCKETIO_MSGPACK_PARSER_URL'] if app.config['SOCKETIO_MSGPACK'] else None}
+
+def render_cached(template_name):
+    page = page_cache.get(template_name)
+    if page is None or app.debug:
+        html = render_template(template_name)
+        page = page_cache.add(template_name, html.encode('utf-8'), 'text/html')
+    return page_cache.respond(page, request)
 
 @app.route('/')
 def chat():
-    return render_template('index.html')
+    return render_cached('index.html')
 
 @app.route('/video-chat')
 def video_chat():
-    return render_template('video_chat.html')
+    return render_cached('video_chat.html')
 
 @app.route('/profile-setup')
 def profile_setup():
-    return render_template('profile-setup.html')
+    return render_cached('profile-setup.html')
 
 @app.route('/<filename>')
 def serve_static(filename):
-    return send_from_directory(os.path.dirname(os.path.abspath(__file__)), filename)
+    asset, fingerprinted = static_assets.lookup(filename)
+    if asset is not None:
+        # Versioned URLs never change content; plain ones revalidate against the ETag
+        return static_assets.respond(asset, request, immutable=fingerprinted)
+    return send_from_directory(APP_ROOT, filename)
 
 @app.route('/service-worker.js')
 def service_worker():
-    return send_from_directory(os.path.dirname(os.path.abspath(__file__)), 'service-worker.js')
+    # Never fingerprinted: browsers look the service worker up by its fixed URL
+    return static_assets.respond(static_assets.get('service-worker.js'), request)
 
 # SOCKETIO HANDLERS
 @socketio.on('connect')
+@profiled('connect')
 @firebase_authenticated
-def handle_connect():
+def handle_connect(auth=None):
     client_ip = get_client_ip(request)
     browser_fingerprint = get_client_fingerprint(request)
     session_id = request.sid
@@ -457,24 +1003,27 @@ def handle_connect():
         is_banned, remaining_minutes, ban_reason, ads_watched = check_user_ban(uid, client_ip, browser_fingerprint)
         if is_banned:
             emit('banned', {'message': f'You are banned. Reason: {ban_reason}', 'duration': remaining_minutes, 'ads_watched': ads_watched, 'timestamp': get_current_time()})
+            auth_sessions.drop(session_id)
             return False
 
-        with active_users_lock:
-            active_users[session_id] = {
-                'uid': uid, 'ip': client_ip, 'fingerprint': browser_fingerprint,
-                'room': None, 'last_activity': time.time(), 'profile': profile_data
-            }
+        match_profile = MatchProfile(profile_data, interest_registry.intern(profile_data.get('interests', [])))
+        state.register_user(session_id, UserSession(uid, client_ip, browser_fingerprint, time.time(), match_profile))
+        ice_batcher.register(session_id, request.args.get('ice_batch') == '1')
+        admission.register(session_id, client_ip)
 
         broadcast_user_count()
         emit('connected', {'user_id': session_id, 'username': profile_data.get('name', 'Hushh User')})
-        logger.info(f"User connected: {session_id} ({profile_data.get('name')})")
+        logger.info("User connected: %s (%s)", session_id, profile_data.get('name'), extra={'event': 'connect', 'sid': session_id, 'uid': uid})
 
     except Exception as e:
-        logger.error(f"Error during connect for SID {session_id}: {e}", exc_info=True)
+        logger.error(f"Error during connect for SID {session_id}: {e}", exc_info=True, extra={'event': 'connect', 'sid': session_id, 'uid': uid})
+        auth_sessions.drop(session_id)
         disconnect(session_id, silent=True)
         return False
 
 @socketio.on('find-video-match')
+@profiled('find-video-match')
+@admitted('find-video-match', shed=True)
 @firebase_authenticated
 def handle_find_video_match(data=None):
     user_sid = request.sid
@@ -482,174 +1031,87 @@ def handle_find_video_match(data=None):
     uid = request.uid
 
     try:
-        user_data = active_users.get(user_sid)
+        user_data = state.get_user(user_sid)
         if not user_data: return
 
-        current_user_profile = user_data['profile']
-        current_user_interests = set(current_user_profile.get('interests', []))
-        user_region = current_user_profile.get('region', 'global')
-        user_date_scope = current_user_profile.get('dateScope', 'global')
-        user_verified = current_user_profile.get('photo_verified', False)
-
-        is_banned, rem_mins, ban_reason, ads_w = check_user_ban(uid, client_ip, user_data['fingerprint'])
+        is_banned, rem_mins, ban_reason, ads_w = check_user_ban(uid, client_ip, user_data.fingerprint)
         if is_banned:
             emit('banned', {'message': f'Banned: {ban_reason}', 'duration': rem_mins, 'ads_watched': ads_w, 'timestamp': get_current_time()})
             return
 
-        current_user_data = {
-            'sid': user_sid, 'uid': uid, 'ip': client_ip, 'fingerprint': user_data['fingerprint'],
-            'profile': current_user_profile, 'joined': time.time()
-        }
-
-        matched_user_data = None
-        room_id = None
-        shared_interests_str = ""
-        
-        with video_state_lock:
-            video_waiting_users[:] = [u for u in video_waiting_users if u['sid'] != user_sid]
-
-            best_match_partner = None
-            best_match_score = -1.0 
-            best_match_index = -1
-
-            for i in range(len(video_waiting_users) - 1, -1, -1):
-                potential_partner = video_waiting_users[i]
-                
-                # Skip same IP/UID
-                if potential_partner['ip'] == client_ip or potential_partner['uid'] == uid: 
-                    continue
-
-                partner_profile = potential_partner['profile']
-                
-                # Check dating compatibility
-                if not check_dating_compatibility(current_user_profile, partner_profile):
-                    continue
-                
-                # Check location compatibility
-                if user_date_scope == 'local':
-                    partner_date_scope = partner_profile.get('dateScope', 'global')
-                    partner_region = partner_profile.get('region', 'global')
-                    
-                    # Both must be local and from same region
-                    if partner_date_scope != 'local' or partner_region != user_region:
-                        continue
-
-                partner_interests = set(partner_profile.get('interests', []))
-                match_score = calculate_interest_match(current_user_interests, partner_interests)
-                
-                if match_score > best_match_score:
-                    best_match_score = match_score
-                    best_match_partner = potential_partner
-                    best_match_index = i
-
-            if best_match_partner is not None and best_match_index != -1:
-                matched_user_data = video_waiting_users.pop(best_match_index)
-                
-                initiator_profile = current_user_data['profile']
-                receiver_profile = matched_user_data['profile']
-                
-                receiver_verified = receiver_profile.get('photo_verified', False) 
-                initiator_verified = initiator_profile.get('photo_verified', False)
-
-                shared_interests = current_user_interests.intersection(set(receiver_profile.get('interests', [])))
-                shared_interests_str = ", ".join(sorted(list(shared_interests)))
-                
-                room_id = create_video_room()
-                prompt = get_random_match_prompt(user_region if user_date_scope == 'local' else None)
-                
-                video_active_rooms[room_id] = {
-                    "users": [current_user_data, matched_user_data], 
-                    "created": time.time(),
-                    "status": "timed_date", 
-                    "prompt": prompt, 
-                    "match_decision": {}
-                 }
-
-        if matched_user_data and room_id:
-            try:
-                join_room(room_id, sid=user_sid)
-                join_room(room_id, sid=matched_user_data['sid'])
-
-                match_data_initiator = {
-                    'room': room_id, 
-                    'initiator': True, 
-                    'shared_interests': shared_interests_str,
-                    'remote_name': receiver_profile.get('name', 'Stranger'),
-                    'remote_photo': receiver_profile.get('photoURL'),
-                    'remote_verified': receiver_verified
-                }
-                match_data_receiver = {
-                    'room': room_id, 
-                    'initiator': False, 
-                    'shared_interests': shared_interests_str,
-                    'remote_name': initiator_profile.get('name', 'Stranger'),
-                    'remote_photo': initiator_profile.get('photoURL'),
-                    'remote_verified': initiator_verified
-                }
-
-                emit('video-matched', match_data_initiator, room=user_sid)
-                emit('video-matched', match_data_receiver, room=matched_user_data['sid'])
-
-                logger.info(f"Match created: {room_id} - {initiator_profile.get('name')} <-> {receiver_profile.get('name')}")
-
-                def send_timed_date_start(room_id, prompt):
-                    socketio.sleep(3) 
-                    socketio.emit('start_timed_date', {'prompt': prompt}, room=room_id)
-                    logger.info(f"Timed date started in room {room_id}")
-                    
-                socketio.start_background_task(send_timed_date_start, room_id, prompt)
-
-            except Exception as e:
-                logger.error(f"Error joining/emitting for video pair {room_id}: {e}", exc_info=True)
-        elif not matched_user_data:
-            with video_state_lock:
-                 if not any(u['sid'] == current_user_data['sid'] for u in video_waiting_users):
-                     video_waiting_users.append(current_user_data)
-            emit('video-waiting')
-            logger.info(f"User {user_sid} added to waiting queue")
+        state.submit('join', WaitingEntry(user_sid, uid, client_ip, user_data.fingerprint, time.time(), user_data.match))
 
     except Exception as e:
-        logger.error(f"Find video match fatal error for {user_sid}: {e}", exc_info=True)
+        logger.error(f"Find video match fatal error for {user_sid}: {e}", exc_info=True, extra={'event': 'match', 'sid': user_sid, 'uid': uid})
         emit('error', {'message': 'An internal error occurred finding a match.'})
 
+@socketio.on('subscribe_user_count')
+@profiled('subscribe_user_count')
+@firebase_authenticated
+def handle_subscribe_user_count(data=None):
+    if user_count_publisher.room:
+        join_room(user_count_publisher.room)
+    emit('updateUserCount', current_user_count())
+
 # WebRTC Signaling Handlers
+# These run on every offer/answer/candidate, so they skip the auth decorator: a sid only
+# appears in the matchmaker's room index after an authenticated find-video-match, and the
+# client-supplied room must match it before anything is relayed to the partner.
+def signaling_partner(room_id):
+    """The partner to relay to, or None if the sender is not in room_id."""
+    return state.partner_in_room(request.sid, room_id)
+
 @socketio.on('video-offer')
-@firebase_authenticated
+@profiled('video-offer')
 def handle_video_offer(data):
     room_id = data.get('room')
     offer = data.get('offer')
     
-    if not room_id or not offer:
+    if not offer:
         return
     
-    logger.info(f"Relaying offer in room {room_id}")
-    emit('video-offer', {'offer': offer}, room=room_id, skip_sid=request.sid)
+    partner_sid = signaling_partner(room_id)
+    if not partner_sid:
+        return
+
+    logger.info("Relaying offer in room %s", room_id, extra={'event': 'signaling', 'sid': request.sid, 'room': room_id})
+    emit('video-offer', {'offer': offer}, to=partner_sid)
 
 @socketio.on('video-answer')
-@firebase_authenticated
+@profiled('video-answer')
 def handle_video_answer(data):
     room_id = data.get('room')
     answer = data.get('answer')
     
-    if not room_id or not answer:
+    if not answer:
         return
     
-    logger.info(f"Relaying answer in room {room_id}")
-    emit('video-answer', {'answer': answer}, room=room_id, skip_sid=request.sid)
+    partner_sid = signaling_partner(room_id)
+    if not partner_sid:
+        return
+
+    logger.info("Relaying answer in room %s", room_id, extra={'event': 'signaling', 'sid': request.sid, 'room': room_id})
+    emit('video-answer', {'answer': answer}, to=partner_sid)
 
 @socketio.on('ice-candidate')
-@firebase_authenticated
+@profiled('ice-candidate')
+@admitted('ice-candidate')
 def handle_ice_candidate(data):
     room_id = data.get('room')
     candidate = data.get('candidate')
     
-    if not room_id or not candidate:
+    if not candidate:
         return
     
-    logger.info(f"Relaying ICE candidate in room {room_id}")
-    emit('ice-candidate', {'candidate': candidate}, room=room_id, skip_sid=request.sid)
+    partner_sid = signaling_partner(room_id)
+    if not partner_sid:
+        return
+
+    ice_batcher.relay(room_id, request.sid, partner_sid, candidate)
 
 @socketio.on('match_decision')
+@profiled('match_decision')
+@admitted('match_decision')
 @firebase_authenticated
 def handle_match_decision(data):
     user_sid = request.sid
@@ -658,83 +1120,17 @@ def handle_match_decision(data):
 
     if action not in ['continue', 'end'] or not room_id: return
 
-    partner_sid = None
-    
-    with video_state_lock:
-        if room_id not in video_active_rooms: return
-        
-        room_data = video_active_rooms[room_id]
-        room_data['match_decision'][user_sid] = action
-        
-        for user in room_data['users']:
-            if user['sid'] != user_sid:
-                partner_sid = user['sid']
-                break
-        
-        partner_action = room_data['match_decision'].get(partner_sid)
-        
-        if action == 'end' or partner_action == 'end':
-            leave_room(room_id, sid=user_sid)
-            leave_room(room_id, sid=partner_sid)
-
-            if room_id in video_active_rooms: 
-                del video_active_rooms[room_id]
-                
-            emit('video-user-disconnected', room=user_sid)
-            emit('video-user-disconnected', room=partner_sid)
-            logger.info(f"Date ended in room {room_id}")
-            return
-
-        elif action == 'continue' and partner_action == 'continue':
-            room_data['status'] = 'matched'
-            emit('paired_match', room=room_id)
-            logger.info(f"Successful match in room {room_id}")
-            return
-            
-        elif action == 'continue' and not partner_action:
-            emit('match_decision_received', {'action': 'continue'}, room=partner_sid)
+    state.submit('decision', user_sid, room_id, action)
 
 @socketio.on('disconnect')
-def handle_disconnect():
+@profiled('disconnect')
+def handle_disconnect(reason=None):
     user_sid = request.sid
     if not user_sid: return
     
-    logger.info(f"User disconnecting: {user_sid}")
-    
-    with active_users_lock:
-        if user_sid in active_users: 
-            del active_users[user_sid]
-
-    partner_sid_to_notify = None
-    room_id_to_delete = None
+    logger.info("User disconnecting: %s", user_sid, extra={'event': 'disconnect', 'sid': user_sid})
     
-    with video_state_lock:
-        video_waiting_users[:] = [u for u in video_waiting_users if u['sid'] != user_sid]
-
-        for room_id, room_data in list(video_active_rooms.items()):
-            users_in_room = room_data.get('users', [])
-            user_index = -1
-            
-            for i, user in enumerate(users_in_room):
-                if user.get('sid') == user_sid: 
-                    user_index = i
-                elif user.get('sid') != user_sid: 
-                    partner_sid_to_notify = user.get('sid')
-
-            if user_index != -1: 
-                users_in_room.pop(user_index)
-                if not users_in_room: 
-                    room_id_to_delete = room_id
-                break 
-
-        if room_id_to_delete and room_id_to_delete in video_active_rooms: 
-            del video_active_rooms[room_id_to_delete]
-            logger.info(f"Room {room_id_to_delete} deleted")
-
-    if partner_sid_to_notify:
-        leave_room(room_id_to_delete, sid=user_sid)
-        emit('video-user-disconnected', room=partner_sid_to_notify)
-        logger.info(f"Notified partner {partner_sid_to_notify} of disconnection")
+    release_user(user_sid)
 
     broadcast_user_count()
 
@@ -0,0 +1,179 @@
+# ban_cache.py - In-memory view of active rows in banned_ips
+
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+BAN_COLUMNS = "ip_address, browser_fingerprint, ban_expires, ban_reason, ads_watched"
+
+
+class BanCache:
+    """
+    Keeps active bans keyed by (ip, fingerprint) so the connect and matchmaking
+    paths answer "not banned" with a single dict miss. Rows are pulled
+    incrementally by updated_at, expired bans are pruned through a heap on
+    ban_expires, and a periodic full reload picks up rows deleted behind our back.
+    Writes made through ban()/unban() update the cache immediately.
+    """
+
+    def __init__(self, connection_factory, full_reload_seconds=300):
+        self._connect = connection_factory
+        self.full_reload_seconds = full_reload_seconds
+        self._bans = {}         # (ip, fingerprint) -> (ban_expires or None, ban_reason, ads_watched)
+        self._expiry = []       # heap of (ban_expires, key)
+        self._watermark = None  # DB NOW() at the start of the last successful refresh
+        self._last_full_reload = 0
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._bans)
+
+    # Lookups
+
+    def check(self, ip_address, browser_fingerprint):
+        """Same contract as check_ip_ban: (is_banned, remaining_minutes, ban_reason, ads_watched)."""
+        ban = self._bans.get((ip_address, browser_fingerprint))
+        if ban is None: return False, 0, None, 0
+        ban_expires, ban_reason, ads_watched = ban
+
+        if ban_expires is None: return True, 999999, ban_reason, ads_watched
+
+        now_utc = datetime.now(timezone.utc)
+        if now_utc > ban_expires: return False, 0, None, 0
+
+        remaining_minutes = max(0, int((ban_expires - now_utc).total_seconds() / 60))
+        return True, remaining_minutes, ban_reason, ads_watched
+
+    # Cache maintenance
+
+    def _store_locked(self, bans, expiry, ip_address, browser_fingerprint, ban_expires_db, ban_reason, ads_watched):
+        """Applies one row to bans/expiry: the live ones, or a set being built for a full reload."""
+        key = (ip_address, browser_fingerprint)
+        ban_expires = ban_expires_db.replace(tzinfo=timezone.utc) if ban_expires_db is not None else None
+
+        if ban_expires is not None and ban_expires <= datetime.now(timezone.utc):
+            bans.pop(key, None)
+            return
+
+        bans[key] = (ban_expires, ban_reason, ads_watched)
+        if ban_expires is not None:
+            heapq.heappush(expiry, (ban_expires, key))
+
+    def _prune_expired_locked(self):
+        now_utc = datetime.now(timezone.utc)
+        while self._expiry and self._expiry[0][0] <= now_utc:
+            ban_expires, key = heapq.heappop(self._expiry)
+            ban = self._bans.get(key)
+            # The heap can hold stale entries for bans that were since extended
+            if ban is not None and ban[0] == ban_expires:
+                del self._bans[key]
+
+    def refresh(self, full=False):
+        """Pulls rows changed since the last refresh (or every active ban when full)."""
+        full = full or not self.loaded or time.monotonic() - self._last_full_reload > self.full_reload_seconds
+        conn = self._connect()
+        if not conn: return False
+        cursor = conn.cursor()
+        try:
+            # updated_at is compared in the session time zone, so the watermark comes from NOW()
+            cursor.execute("SELECT NOW()")
+            db_now = cursor.fetchone()[0]
+            if full:
+                cursor.execute(f"SELECT {BAN_COLUMNS} FROM banned_ips WHERE ban_expires IS NULL OR ban_expires > UTC_TIMESTAMP()")
+            else:
+                cursor.execute(f"SELECT {BAN_COLUMNS} FROM banned_ips WHERE updated_at >= %s", (self._watermark,))
+            rows = cursor.fetchall()
+        except (mysql.connector.OperationalError, mysql.connector.InterfaceError) as err:
+            conn.discard()  # lost connection: don't hand it to the next caller
+            logger.error(f"Ban cache refresh failed: {err}")
+            return False
+        except mysql.connector.Error as err:
+            logger.error(f"Ban cache refresh failed: {err}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+        with self._lock:
+            # check() reads without the lock, so a full reload is built aside and swapped in whole
+            bans, expiry = ({}, []) if full else (self._bans, self._expiry)
+            for row in rows:
+                self._store_locked(bans, expiry, *row)
+            if full:
+                self._bans, self._expiry = bans, expiry
+                self._last_full_reload = time.monotonic()
+            self._prune_expired_locked()
+            # Re-read the last second next time so rows committed alongside this refresh aren't missed
+            self._watermark = db_now - timedelta(seconds=1)
+            self.loaded = True
+
+        if full:
+            logger.info(f"Ban cache loaded {len(self._bans)} active bans")
+        return True
+
+    # Write-through
+
+    def ban(self, ip_address, browser_fingerprint, ban_reason, duration_minutes=None):
+        """Writes a ban (permanent when duration_minutes is None) and applies it to the cache."""
+        ban_expires = None
+        if duration_minutes is not None:
+            ban_expires = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0) + timedelta(minutes=duration_minutes)
+
+        conn = self._connect()
+        if not conn: return False
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO banned_ips (ip_address, browser_fingerprint, ban_reason, ban_expires) VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE ban_reason = VALUES(ban_reason), ban_expires = VALUES(ban_expires)
+            ''', (ip_address, browser_fingerprint, ban_reason, ban_expires))
+            conn.commit()
+            cursor.execute("SELECT ads_watched FROM banned_ips WHERE ip_address = %s AND browser_fingerprint = %s", (ip_address, browser_fingerprint))
+            row = cursor.fetchone()
+        except (mysql.connector.OperationalError, mysql.connector.InterfaceError) as err:
+            conn.discard()
+            logger.error(f"Failed to write ban for {ip_address}: {err}")
+            return False
+        except mysql.connector.Error as err:
+            logger.error(f"Failed to write ban for {ip_address}: {err}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+        with self._lock:
+            self._store_locked(self._bans, self._expiry, ip_address, browser_fingerprint, ban_expires, ban_reason, row[0] if row else 0)
+        return True
+
+    def unban(self, ip_address, browser_fingerprint):
+        """Deletes a ban row and drops it from the cache."""
+        conn = self._connect()
+        if not conn: return False
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM banned_ips WHERE ip_address = %s AND browser_fingerprint = %s", (ip_address, browser_fingerprint))
+            conn.commit()
+        except (mysql.connector.OperationalError, mysql.connector.InterfaceError) as err:
+            conn.discard()
+            logger.error(f"Failed to lift ban for {ip_address}: {err}")
+            return False
+        except mysql.connector.Error as err:
+            logger.error(f"Failed to lift ban for {ip_address}: {err}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+        self.invalidate(ip_address, browser_fingerprint)
+        return True
+
+    def invalidate(self, ip_address, browser_fingerprint):
+        with self._lock:
+            self._bans.pop((ip_address, browser_fingerprint), None)
@@ -0,0 +1,86 @@
+# cold_start.py - Time from importing the app to serving and to being ready
+#
+#   python benchmarks/cold_start.py --db-latency-ms 20 --firebase-init-ms 400 --output cold_start.json
+#   python benchmarks/cold_start.py --schema-current   # a restart against an up-to-date schema
+#
+# Firebase Admin setup and MySQL are replaced by the stand-ins in stand_ins.py, each
+# statement against the stand-in database costing --db-latency-ms. "serving" is when
+# importing app.py returns (the worker can accept sockets); "ready" is when /readyz
+# first answers 200. Trees without the startup orchestrator are ready when serving.
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from stand_ins import FirebaseAdminStandIn, FirebaseAuthStandIn, MySQLStandIn
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time from importing the app to serving and to being ready')
+    parser.add_argument('--db-latency-ms', type=float, default=20.0, help='cost of each statement')
+    parser.add_argument('--firebase-init-ms', type=float, default=400.0, help='cost of initializing the Admin SDK')
+    parser.add_argument('--schema-current', action='store_true', help='the database already records the current schema version')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+
+    mysql = MySQLStandIn(latency=args.db_latency_ms / 1000).install()
+    FirebaseAdminStandIn(latency=args.firebase_init_ms / 1000).install()
+    import firebase_admin.auth
+    firebase_admin.auth.get_user = FirebaseAuthStandIn().get_user
+    if args.schema_current:
+        # Seeded as init_db would have left it
+        with open(os.path.join(REPO_ROOT, 'prompts.json'), encoding='utf-8') as f:
+            mysql.prompts = [(p['prompt'], p['category'], p.get('region', 'global')) for p in json.load(f)]
+        with open(os.path.join(REPO_ROOT, 'app.py'), encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('SCHEMA_VERSION = '):
+                    mysql.schema_version = int(line.split('=')[1])
+
+    os.chdir(REPO_ROOT)
+    started = time.perf_counter()
+    import app as app_module
+    serving = time.perf_counter() - started
+    queries_at_serving = mysql.queries
+    logging.getLogger().setLevel(logging.WARNING)
+
+    client = app_module.app.test_client()
+    if hasattr(app_module, 'startup'):
+        deadline = started + args.timeout
+        while client.get('/readyz').status_code != 200:
+            if time.perf_counter() > deadline:
+                sys.exit(f"Not ready after {args.timeout}s: {app_module.startup.status()}")
+            eventlet.sleep(0.005)
+        ready = time.perf_counter() - started
+        app_module.startup.wait(timeout=args.timeout)
+        steps = {name: step['seconds'] for name, step in app_module.startup.status().items()}
+    else:
+        ready, steps = serving, None
+
+    results = {
+        'serving_s': serving,
+        'ready_s': ready,
+        'db_queries_before_serving': queries_at_serving,
+        'db_queries': mysql.queries,
+        'steps_s': steps,
+        'config': vars(args),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
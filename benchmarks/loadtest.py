@@ -0,0 +1,385 @@
+# loadtest.py - Simulated Socket.IO load on the connect / match / signaling / disconnect flow
+#
+#   python benchmarks/loadtest.py --users 2000 --arrival-rate 400 --output loadtest.json
+#   python benchmarks/loadtest.py --users 2000 --compare loadtest.json
+#
+# The app runs in-process with Firebase auth and MySQL replaced by the stand-ins in
+# stand_ins.py, and is driven by Flask-SocketIO test clients, one green thread each.
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from stand_ins import FirebaseAdminStandIn, FirebaseAuthStandIn, MySQLStandIn
+
+# Rough shape of the real user base
+GENDERS = [('male', 0.55), ('female', 0.43), ('non-binary', 0.02)]
+PREFERENCES = {
+    'male': [('straight', 0.80), ('gay', 0.08), ('bisexual', 0.12)],
+    'female': [('straight', 0.78), ('lesbian', 0.08), ('bisexual', 0.14)],
+    'non-binary': [('bisexual', 1.0)],
+}
+DATE_SCOPES = [('global', 0.7), ('local', 0.3)]
+REGIONS = [('India-Bengaluru', 0.25), ('India-Mumbai', 0.2), ('India-Delhi', 0.2), ('India-Hyderabad', 0.12),
+           ('India-Chennai', 0.1), ('India-Kolkata', 0.08), ('India-Kerala', 0.05)]
+INTERESTS = ['music', 'travel', 'movies', 'gaming', 'cooking', 'fitness', 'reading', 'coding', 'photography', 'art',
+             'dancing', 'cricket', 'football', 'anime', 'hiking', 'coffee', 'fashion', 'yoga', 'writing', 'startups',
+             'pets', 'food', 'netflix', 'poetry', 'singing', 'cycling', 'memes', 'tech', 'history', 'science',
+             'astrology', 'chess', 'design', 'kpop', 'bollywood', 'meditation', 'running', 'podcasts', 'theatre', 'cars']
+INTEREST_WEIGHTS = [1 / (rank + 1) for rank in range(len(INTERESTS))]  # Zipf-like popularity
+
+SDP = 'v=0\r\no=- 0 0 IN IP4 127.0.0.1\r\ns=-\r\nt=0 0\r\n' + 'a=candidate:0 1 UDP 2122252543 10.0.0.1 50000 typ host\r\n' * 20
+LOCKS = {
+    'auth_sessions': ('auth_sessions', '_lock'),
+    'users': ('state', '_users_lock'),
+    'interest_registry': ('interest_registry', '_lock'),
+    'ban_cache': ('ban_cache', '_lock'),
+    'prompt_index': ('prompt_index', '_lock'),
+}
+
+
+def pick(rng, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+def make_profile(rng, i):
+    gender = pick(rng, GENDERS)
+    date_scope = pick(rng, DATE_SCOPES)
+    return {
+        'name': f'Bench User {i}',
+        'age': rng.randint(18, 40),
+        'gender': gender,
+        'datingPreference': pick(rng, PREFERENCES[gender]),
+        'dateScope': date_scope,
+        'region': pick(rng, REGIONS) if date_scope == 'local' else 'global',
+        'interests': sorted(set(rng.choices(INTERESTS, INTEREST_WEIGHTS, k=rng.randint(3, 8)))),
+        'photo_verified': rng.random() < 0.4,
+    }
+
+def percentiles(values, scale=1000.0):
+    """Summary of a list of seconds, in milliseconds by default."""
+    if not values:
+        return {'count': 0}
+    arr = np.asarray(values, dtype=np.float64) * scale
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {'count': len(values), 'mean': float(arr.mean()), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(arr.max())}
+
+
+class TimedLock:
+    """Wraps a lock and records how long callers waited for it and held it."""
+
+    def __init__(self, lock):
+        self._lock = lock
+        self.waits = []
+        self.holds = []
+        self._acquired_at = None
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = time.perf_counter()
+            self.waits.append(self._acquired_at - started)
+        return acquired
+
+    def release(self):
+        self.holds.append(time.perf_counter() - self._acquired_at)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class LoadTest:
+    def __init__(self, app_module, args):
+        self.A = app_module
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.match_waiters = {}  # sid -> eventlet Event
+        self.matched_at = {}     # sid -> perf_counter time 'video-matched' was emitted
+        self.rooms_opened = 0
+        self.first_find = None
+        self.last_match = None
+        self.samples = {name: [] for name in ('connect', 'find_match', 'time_to_match', 'signaling', 'disconnect')}
+        self.failed_connects = 0
+        self.unmatched = 0
+        self.ice_candidates = 0
+        self.loop_lag = []
+        self._stop = False
+
+        outbox = self.A.matchmaker.core.outbox
+        original_emit = outbox.emit
+
+        def emit(event, data=None, to=None):
+            if event == 'video-matched':
+                now = time.perf_counter()
+                self.matched_at[to] = now
+                self.last_match = now
+                if data.get('initiator'):
+                    self.rooms_opened += 1
+                waiter = self.match_waiters.get(to)
+                if waiter is not None and not waiter.ready():
+                    waiter.send(data)
+            original_emit(event, data, to)
+
+        outbox.emit = emit
+
+        self.locks = {}
+        for name, (owner, attr) in LOCKS.items():
+            obj = getattr(self.A, owner, None)
+            if obj is not None and hasattr(obj, attr):
+                self.locks[name] = TimedLock(getattr(obj, attr))
+                setattr(obj, attr, self.locks[name])
+
+    def connect(self, i):
+        query = {'firebase_uid': f'bench-{i}', 'profile': json.dumps(make_profile(self.rng, i))}
+        if self.args.ice_batch:
+            query['ice_batch'] = 1
+        headers = {'X-Forwarded-For': f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}', 'User-Agent': f'loadtest/{i}'}
+        started = time.perf_counter()
+        client = self.A.socketio.test_client(self.A.app, query_string=urlencode(query), headers=headers)
+        elapsed = time.perf_counter() - started
+        if not client.is_connected():
+            return None, None, elapsed
+        connected = [m for m in client.get_received() if m['name'] == 'connected']
+        sid = connected[0]['args'][0]['user_id'] if connected else None
+        return client, sid, elapsed
+
+    def timed_emit(self, client, event, data):
+        started = time.perf_counter()
+        client.emit(event, data)
+        self.samples['signaling'].append(time.perf_counter() - started)
+
+    def run_client(self, i):
+        client, sid, elapsed = self.connect(i)
+        self.samples['connect'].append(elapsed)
+        if client is None or sid is None:
+            self.failed_connects += 1
+            return
+
+        waiter = self.match_waiters[sid] = eventlet.event.Event()
+        started = time.perf_counter()
+        if self.first_find is None:
+            self.first_find = started
+        client.emit('find-video-match')
+        self.samples['find_match'].append(time.perf_counter() - started)
+
+        match = None
+        with eventlet.Timeout(self.args.match_timeout, False):
+            match = waiter.wait()
+        self.match_waiters.pop(sid, None)
+
+        if match is None:
+            self.unmatched += 1
+        else:
+            self.samples['time_to_match'].append(self.matched_at.pop(sid) - started)
+            room = match['room']
+            if match['initiator']:
+                self.timed_emit(client, 'video-offer', {'room': room, 'offer': {'type': 'offer', 'sdp': SDP}})
+            else:
+                self.timed_emit(client, 'video-answer', {'room': room, 'answer': {'type': 'answer', 'sdp': SDP}})
+            for n in range(self.rng.randint(self.args.ice_burst // 2, self.args.ice_burst)):
+                candidate = {'candidate': f'candidate:{n} 1 UDP 2122252543 10.0.{n}.1 5{n:04d} typ host', 'sdpMid': '0', 'sdpMLineIndex': 0}
+                self.timed_emit(client, 'ice-candidate', {'room': room, 'candidate': candidate})
+                self.ice_candidates += 1
+            eventlet.sleep(self.rng.uniform(0.5, 1.5) * self.args.hold)
+
+        client.get_received()
+        started = time.perf_counter()
+        client.disconnect()
+        self.samples['disconnect'].append(time.perf_counter() - started)
+
+    def watch_loop_lag(self, interval=0.01):
+        while not self._stop:
+            started = time.perf_counter()
+            eventlet.sleep(interval)
+            self.loop_lag.append(max(0.0, time.perf_counter() - started - interval))
+
+    def measure_memory(self, users):
+        """
+        Traced allocations per connected user, then per user once they have all asked
+        for a match (waiting entries and rooms), test-client bookkeeping excluded.
+        """
+        excluded = [tracemalloc.Filter(False, '*/flask_socketio/test_client.py'), tracemalloc.Filter(False, __file__),
+                    tracemalloc.Filter(False, tracemalloc.__file__)]
+        grown = lambda after, before: sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+
+        def snapshot():
+            eventlet.sleep(0.5)  # let the log writer drain queued records first
+            gc.collect()
+            return tracemalloc.take_snapshot().filter_traces(excluded)
+
+        tracemalloc.start()
+        before = snapshot()
+        clients = [client for client in (self.connect(1_000_000 + i)[0] for i in range(users)) if client is not None]
+        for client in clients:
+            client.get_received()
+        connected = snapshot()
+        for client in clients:
+            client.emit('find-video-match')
+        self.A.matchmaker.drain()
+        for client in clients:
+            client.get_received()
+        matching = snapshot()
+        tracemalloc.stop()
+
+        for client in clients:
+            client.disconnect()
+        self.A.matchmaker.drain()
+        # The rooms opened here are not part of the timed run
+        self.rooms_opened = 0
+        self.last_match = None
+        self.matched_at.clear()
+        return {
+            'users': users,
+            'bytes_per_user': grown(connected, before) / users if users else 0.0,
+            'bytes_per_user_matching': grown(matching, before) / users if users else 0.0,
+        }
+
+    def run(self):
+        memory = self.measure_memory(self.args.memory_users) if self.args.memory_users else None
+
+        watcher = eventlet.spawn(self.watch_loop_lag)
+        pool = eventlet.GreenPool(self.args.users)
+        started = time.perf_counter()
+        batch = max(1, int(self.args.arrival_rate / 100))
+        for i in range(self.args.users):
+            pool.spawn(self.run_client, i)
+            if (i + 1) % batch == 0:
+                eventlet.sleep(batch / self.args.arrival_rate)
+        pool.waitall()
+        duration = time.perf_counter() - started
+        self._stop = True
+        watcher.wait()
+
+        matching_window = (self.last_match - self.first_find) if self.last_match and self.first_find else 0.0
+        return {
+            'connect_ms': percentiles(self.samples['connect']),
+            'find_match_handler_ms': percentiles(self.samples['find_match']),
+            'time_to_match_ms': percentiles(self.samples['time_to_match']),
+            'signaling_handler_ms': percentiles(self.samples['signaling']),
+            'disconnect_ms': percentiles(self.samples['disconnect']),
+            'event_loop_lag_ms': percentiles(self.loop_lag),
+            'locks': {name: {'wait_ms': percentiles(lock.waits), 'hold_ms': percentiles(lock.holds)} for name, lock in self.locks.items()},
+            'matches': self.rooms_opened,
+            'matches_per_sec': self.rooms_opened / matching_window if matching_window else 0.0,
+            'unmatched_users': self.unmatched,
+            'failed_connects': self.failed_connects,
+            'ice_candidates_sent': self.ice_candidates,
+            'memory': memory,
+            'matchmaker': self.A.matchmaker.stats(),
+            'duration_s': duration,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+# (section, metric, higher_is_better) pairs checked by --compare
+COMPARED_METRICS = [
+    ('connect_ms', 'p95', False), ('find_match_handler_ms', 'p95', False), ('time_to_match_ms', 'p95', False),
+    ('signaling_handler_ms', 'p95', False), ('disconnect_ms', 'p95', False), ('event_loop_lag_ms', 'p99', False),
+    ('matches_per_sec', None, True), ('memory', 'bytes_per_user', False),
+]
+
+def compare(results, baseline, tolerance):
+    """Prints each tracked metric next to the baseline; returns the ones that regressed beyond tolerance."""
+    regressions = []
+    for section, metric, higher_is_better in COMPARED_METRICS:
+        new, old = results.get(section), baseline.get(section)
+        if metric is not None:
+            new = (new or {}).get(metric)
+            old = (old or {}).get(metric)
+        if not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        name = f"{section}.{metric}" if metric else section
+        flag = '  REGRESSION' if worse > tolerance else ''
+        print(f"{name:32} {old:12.3f} -> {new:12.3f} ({change:+.1%}){flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated Socket.IO load on the matchmaking flow')
+    parser.add_argument('--users', type=int, default=2000, help='simulated clients')
+    parser.add_argument('--arrival-rate', type=float, default=400, help='new clients per second')
+    parser.add_argument('--ice-burst', type=int, default=16, help='max ICE candidates each side sends after matching')
+    parser.add_argument('--ice-batch', action='store_true', help='clients advertise batched ICE delivery')
+    parser.add_argument('--hold', type=float, default=1.0, help='mean seconds a matched pair stays connected')
+    parser.add_argument('--match-timeout', type=float, default=10.0, help='seconds a client waits for a match')
+    parser.add_argument('--firebase-latency-ms', type=float, default=20.0)
+    parser.add_argument('--db-latency-ms', type=float, default=1.0)
+    parser.add_argument('--memory-users', type=int, default=500, help='users connected for the memory measurement (0 to skip)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='relative change counted as a regression')
+    args = parser.parse_args()
+
+    firebase = FirebaseAuthStandIn(latency=args.firebase_latency_ms / 1000)
+    mysql = MySQLStandIn(latency=args.db_latency_ms / 1000).install()
+    FirebaseAdminStandIn().install()
+    import firebase_admin.auth
+    firebase_admin.auth.get_user = firebase.get_user
+
+    os.chdir(REPO_ROOT)
+    import app as app_module
+    logging.getLogger().setLevel(logging.WARNING)
+    app_module.startup.wait(timeout=30)
+
+    results = LoadTest(app_module, args).run()
+    results['stand_ins'] = {'firebase_calls': firebase.calls, 'db_queries': mysql.queries}
+    results['meta'] = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+    }
+
+    print(json.dumps({key: results[key] for key in ('time_to_match_ms', 'matches', 'matches_per_sec', 'event_loop_lag_ms', 'memory')}, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# serializer_bench.py - JSON vs MessagePack Socket.IO frames for the signaling messages
+#
+#   python benchmarks/serializer_bench.py --iterations 20000 --output serializer.json
+#
+# For each message the server relays, times what the server does with it in each format:
+# decode the sender's frame into a packet, then encode the packet the recipient gets
+# (video-matched is server-originated, so encode only). Sizes are the Engine.IO payload
+# plus WebSocket framing as the recipient sees it, and the long-polling payload (where
+# binary frames travel base64-encoded).
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from engineio import packet as eio_packet
+from socketio import packet
+
+from wire_format import NegotiatedPacket, encode_msgpack, msgpack
+
+ROOM = 'hushh-video-3f9c2a7b1d4e8f60'
+
+# A typical browser offer: audio + video with a handful of host/srflx candidates inline
+SDP_OFFER = (
+    'v=0\r\no=- 4611731400430051336 2 IN IP4 127.0.0.1\r\ns=-\r\nt=0 0\r\n'
+    'a=group:BUNDLE 0 1\r\na=extmap-allow-mixed\r\na=msid-semantic: WMS stream\r\n'
+    'm=audio 9 UDP/TLS/RTP/SAVPF 111 63 9 0 8 13 110 126\r\nc=IN IP4 0.0.0.0\r\na=rtcp:9 IN IP4 0.0.0.0\r\n'
+    'a=ice-ufrag:8hhY\r\na=ice-pwd:asd88fgpdd777uzjYhagZg\r\na=ice-options:trickle\r\n'
+    'a=fingerprint:sha-256 D2:FA:0E:C3:22:59:5E:14:95:69:92:3D:13:B4:84:24:2C:C2:A2:C0:3E:FD:34:8E:5E:EA:6F:AF:52:CE:E6:0F\r\n'
+    'a=setup:actpass\r\na=mid:0\r\na=sendrecv\r\na=rtcp-mux\r\na=rtpmap:111 opus/48000/2\r\na=rtcp-fb:111 transport-cc\r\n'
+    'a=fmtp:111 minptime=10;useinbandfec=1\r\n'
+    'm=video 9 UDP/TLS/RTP/SAVPF 96 97 102 103 104 105 106 107 108 109 127 125 39 40 45 46 98 99 100 101 112 113 116 117 118\r\n'
+    'c=IN IP4 0.0.0.0\r\na=rtcp:9 IN IP4 0.0.0.0\r\na=ice-ufrag:8hhY\r\na=ice-pwd:asd88fgpdd777uzjYhagZg\r\n'
+    + ''.join(f'a=rtpmap:{pt} VP8/90000\r\na=rtcp-fb:{pt} goog-remb\r\na=rtcp-fb:{pt} transport-cc\r\n'
+              f'a=rtcp-fb:{pt} ccm fir\r\na=rtcp-fb:{pt} nack\r\na=rtcp-fb:{pt} nack pli\r\n' for pt in range(96, 110))
+    + ''.join(f'a=candidate:{n} 1 udp 2122260223 192.168.1.{n + 10} 5{n}123 typ host generation 0 network-id 1\r\n'
+              for n in range(6))
+)
+SDP_ANSWER = SDP_OFFER.replace('a=setup:actpass', 'a=setup:active')
+
+CANDIDATE = {
+    'candidate': 'candidate:842163049 1 udp 1677729535 203.0.113.24 61871 typ srflx raddr 192.168.1.12 rport 61871 '
+                 'generation 0 ufrag 8hhY network-cost 999',
+    'sdpMid': '0', 'sdpMLineIndex': 0, 'usernameFragment': '8hhY',
+}
+
+
+def _partner(name, uid):
+    return {
+        'name': name, 'age': 24, 'uid': uid,
+        'photoURL': f'https://storage.googleapis.com/hushh-63300.appspot.com/profile_photos/{uid}/avatar-480.webp',
+        'interests': ['music', 'travel', 'photography', 'coffee', 'startups', 'hiking'],
+        'gender': 'female', 'region': 'India-Bengaluru', 'verified': True,
+    }
+
+
+# (event, payload the client sends, payload the recipient gets); a None client payload means server-originated
+MESSAGES = [
+    ('video-offer', {'room': ROOM, 'offer': {'type': 'offer', 'sdp': SDP_OFFER}},
+     {'offer': {'type': 'offer', 'sdp': SDP_OFFER}}),
+    ('video-answer', {'room': ROOM, 'answer': {'type': 'answer', 'sdp': SDP_ANSWER}},
+     {'answer': {'type': 'answer', 'sdp': SDP_ANSWER}}),
+    ('ice-candidate', {'room': ROOM, 'candidate': CANDIDATE}, {'candidate': CANDIDATE}),
+    ('ice-candidates', {'room': ROOM, 'candidate': CANDIDATE}, {'candidates': [CANDIDATE] * 6}),
+    ('video-matched', None,
+     {'room': ROOM, 'partner': _partner('Ananya', 'q2Xc9LkPz0bV7wHf1RtY3mNaE4s2'), 'sharedInterests': ['music', 'travel', 'coffee'],
+      'prompt': 'What’s the biggest risk you’ve taken, and did it pay off?', 'duration': 180}),
+]
+
+
+def ws_frame_size(payload_len, masked):
+    """WebSocket frame length for a payload (client frames carry a 4-byte mask)."""
+    header = 2 if payload_len < 126 else 4 if payload_len < 65536 else 10
+    return header + (4 if masked else 0) + payload_len
+
+
+def json_frames(event, data):
+    frames = packet.Packet(packet.EVENT, data=[event, data], namespace='/').encode()
+    return frames if isinstance(frames, list) else [frames]
+
+
+def msgpack_frames(event, data):
+    return [encode_msgpack(packet.Packet(packet.EVENT, data=[event, data], namespace='/'))]
+
+
+def relay_json(incoming, event, data):
+    pkt = NegotiatedPacket(encoded_packet=incoming)
+    out = NegotiatedPacket(packet.EVENT, namespace=pkt.namespace, data=[event, data]).encode()
+    return eio_packet.Packet(eio_packet.MESSAGE, out).encode()
+
+
+def relay_msgpack(incoming, event, data):
+    pkt = NegotiatedPacket(encoded_packet=incoming)
+    out = encode_msgpack(NegotiatedPacket(packet.EVENT, namespace=pkt.namespace, data=[event, data]))
+    return eio_packet.Packet(eio_packet.MESSAGE, out).encode()
+
+
+def sizes(frames):
+    """Bytes on the wire for one message: WebSocket (to the recipient) and one long-polling payload."""
+    ws = polling = 0
+    for frame in frames:
+        eio = eio_packet.Packet(eio_packet.MESSAGE, frame).encode()
+        ws += ws_frame_size(len(eio) if isinstance(eio, bytes) else len(eio.encode('utf-8')), masked=False)
+        encoded = eio_packet.Packet(eio_packet.MESSAGE, frame).encode(b64=True)
+        polling += len(encoded.encode('utf-8') if isinstance(encoded, str) else encoded)
+    return ws, polling
+
+
+def time_per_call(fn, args, iterations):
+    for _ in range(min(iterations, 1000)):
+        fn(*args)
+    started = time.process_time()
+    for _ in range(iterations):
+        fn(*args)
+    return (time.process_time() - started) / iterations
+
+
+def run(iterations):
+    results = []
+    for event, sent, received in MESSAGES:
+        row = {'event': event}
+        for name, frames_fn, relay in (('json', json_frames, relay_json), ('msgpack', msgpack_frames, relay_msgpack)):
+            if sent is None:
+                cpu = time_per_call(frames_fn, (event, received), iterations)
+            else:
+                incoming = frames_fn(event, sent)[0]
+                cpu = time_per_call(relay, (incoming, event, received), iterations)
+            ws, polling = sizes(frames_fn(event, received))
+            row[name] = {'cpu_us': cpu * 1e6, 'ws_bytes': ws, 'polling_bytes': polling}
+        results.append(row)
+    return results
+
+
+def print_table(results):
+    print(f"{'message':<16} {'json µs':>9} {'msgpack µs':>11} {'cpu':>7}   {'json ws B':>10} {'msgpack ws B':>13} {'bytes':>7}"
+          f"   {'json poll B':>12} {'msgpack poll B':>15}")
+    for row in results:
+        j, m = row['json'], row['msgpack']
+        print(f"{row['event']:<16} {j['cpu_us']:>9.2f} {m['cpu_us']:>11.2f} {m['cpu_us'] / j['cpu_us'] - 1:>+7.0%}"
+              f"   {j['ws_bytes']:>10} {m['ws_bytes']:>13} {m['ws_bytes'] / j['ws_bytes'] - 1:>+7.0%}"
+              f"   {j['polling_bytes']:>12} {m['polling_bytes']:>15}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON vs MessagePack Socket.IO frames for signaling messages')
+    parser.add_argument('--iterations', type=int, default=20000, help='relays timed per message and format')
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+    if msgpack is None:
+        sys.exit('msgpack is not installed')
+
+    results = run(args.iterations)
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'started': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'msgpack': '.'.join(map(str, msgpack.version)),
+                'iterations': args.iterations,
+                'messages': results,
+            }, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
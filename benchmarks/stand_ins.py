@@ -0,0 +1,134 @@
+# stand_ins.py - Local stand-ins for Firebase auth and MySQL used by the benchmarks
+
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+
+class FirebaseAuthStandIn:
+    """Replaces firebase_admin.auth.get_user: every uid exists, after `latency` seconds."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def get_user(self, uid):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(uid=uid, disabled=False)
+
+
+class FirebaseAdminStandIn:
+    """
+    Replaces the Admin SDK setup calls (credentials.Certificate, initialize_app and
+    firestore.client); initializing takes `latency` seconds.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def initialize_app(self, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(name='[DEFAULT]')
+
+    def install(self):
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+        credentials.Certificate = lambda path: SimpleNamespace(path=path)
+        firebase_admin.initialize_app = self.initialize_app
+        firestore.client = lambda *args, **kwargs: SimpleNamespace()
+        return self
+
+
+class _Cursor:
+    def __init__(self, db, dictionary=False):
+        self.db = db
+        self.dictionary = dictionary
+        self._rows = []
+
+    def execute(self, query, params=None):
+        self.db.queries += 1
+        if self.db.latency:
+            time.sleep(self.db.latency)
+        sql = ' '.join(query.split()).upper()
+
+        if sql.startswith('SELECT NOW()'):
+            self._rows = [(datetime.utcnow(),)]
+        elif sql.startswith('SELECT COUNT(*) AS TOTAL'):
+            self._rows = [{'total': len(self.db.prompts), 'max_id': len(self.db.prompts) or None}]
+        elif sql.startswith('SELECT COUNT(*) FROM MATCH_PROMPTS'):
+            self._rows = [(len(self.db.prompts),)]
+        elif sql.startswith('SELECT PROMPT, CATEGORY, REGION FROM MATCH_PROMPTS'):
+            self._rows = [dict(zip(('prompt', 'category', 'region'), row)) if self.dictionary else row for row in self.db.prompts]
+        elif sql.startswith('SELECT VERSION FROM SCHEMA_VERSION'):
+            self._rows = [(self.db.schema_version,)] if self.db.schema_version is not None else []
+        elif sql.startswith('REPLACE INTO SCHEMA_VERSION'):
+            self.db.schema_version = params[0]
+            self._rows = []
+        else:
+            # Bans, reports, DDL: nobody is banned and writes are accepted
+            self._rows = []
+
+    def executemany(self, query, rows):
+        if 'MATCH_PROMPTS' in query.upper():
+            self.db.prompts.extend(rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+
+class _Connection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False, **kwargs):
+        return _Cursor(self.db, dictionary)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def reset_session(self, *args, **kwargs):
+        pass
+
+    def close(self):
+        pass
+
+
+class MySQLStandIn:
+    """
+    In-memory answers to the queries the app makes: an empty ban table, a prompt
+    table seeded by init_db and the schema version it records. Each statement
+    costs `latency` seconds.
+    install() patches mysql.connector.connect, which the app's pool opens connections with.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.queries = 0
+        self.prompts = []
+        self.schema_version = None
+
+    def connect(self, **kwargs):
+        return _Connection(self)
+
+    def install(self):
+        import mysql.connector
+        mysql.connector.connect = self.connect
+        return self
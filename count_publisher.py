@@ -0,0 +1,53 @@
+# count_publisher.py - Coalesced, rate-limited broadcast of a changing value
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CountPublisher:
+    """
+    Connects and disconnects only mark the count dirty; a background loop
+    flushes at most once per interval and skips the emit when the value is
+    the same as the last one sent. With a room set, only sockets that
+    subscribed to that room receive it instead of every connected client.
+    When several workers share one value, active_fn picks the single worker
+    that publishes; it compares the value every interval, since the change
+    may have happened on another worker.
+    """
+
+    def __init__(self, socketio, event, value_fn, interval=2.0, room=None, active_fn=None):
+        self.socketio = socketio
+        self.event = event
+        self.value_fn = value_fn
+        self.interval = interval
+        self.room = room
+        self.active_fn = active_fn
+        self.dirty = False
+        self.last_value = None
+        self.flushes = 0
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def flush(self):
+        """Emits the current value if something changed since the last flush."""
+        if self.active_fn is not None:
+            if not self.active_fn(): return False
+        elif not self.dirty: return False
+        self.dirty = False
+        value = self.value_fn()
+        if value == self.last_value: return False
+        self.last_value = value
+        self.socketio.emit(self.event, value, to=self.room)
+        self.flushes += 1
+        return True
+
+    def run(self):
+        """Flush loop; start once with socketio.start_background_task."""
+        while True:
+            self.socketio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error publishing {self.event}: {e}", exc_info=True)
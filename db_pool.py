@@ -0,0 +1,261 @@
+# db_pool.py - MySQL connection pool for green threads: fair bounded waits, lazy reset, liveness checks
+
+import logging
+import threading
+import time
+from collections import deque
+
+from matchmaking import RollingPercentiles
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """No connection came free within the checkout timeout."""
+
+
+_OPEN_SLOT = object()  # handed to a waiter instead of a connection: "a slot is free, open one"
+
+
+class _Waiter:
+    __slots__ = ('event', 'conn')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.conn = None
+
+
+class PooledConnection:
+    """
+    What connection() hands out. Behaves like the raw connection, but close()
+    returns it to the pool; discard() closes it for real (after an error that
+    may have left it broken).
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._checkin(raw)
+
+    def discard(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._drop(raw)
+
+
+class ConnectionPool:
+    """
+    Up to `size` connections made by connect(), opened on demand. A checkout takes
+    an idle connection (the most recently used, so the warm ones stay warm), opens a
+    new one while under `size`, or queues; queued callers are served strictly in
+    arrival order, a returned connection going straight to the oldest of them, and
+    give up with PoolTimeout after `timeout` seconds. Exhaustion never tears the
+    pool down.
+
+    Sessions are not reset on every checkout: a connection is only rolled back when
+    it comes back with a transaction open, and one idle for longer than
+    `validate_idle_seconds` is pinged before it is handed out. check_idle(), run
+    periodically, closes dead idle connections and ones idle past `max_idle_seconds`
+    beyond `min_idle`.
+
+    Uses threading primitives, so under eventlet monkey patching waiting blocks only
+    the calling green thread.
+    """
+
+    def __init__(self, connect, size=25, timeout=2.0, min_idle=2, validate_idle_seconds=30,
+                 max_idle_seconds=300, clock=time.monotonic):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.min_idle = min_idle
+        self.validate_idle_seconds = validate_idle_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._idle = []         # stack of (raw, idle_since)
+        self._waiters = deque()
+        self._open = 0          # connections open or being opened, idle or not
+        self.checkouts = 0
+        self.timeouts = 0
+        self.created = 0
+        self.dropped = 0
+        self.rollbacks = 0
+        self.waits = RollingPercentiles()
+
+    # Checkout
+
+    def connection(self, timeout=None):
+        """A PooledConnection; raises PoolTimeout, or the driver's error if connecting fails."""
+        timeout = self.timeout if timeout is None else timeout
+        started = self._clock()
+        waiter = None
+        raw = idle_since = None
+        with self._lock:
+            if self._waiters:
+                waiter = self._queue_locked()
+            elif self._idle:
+                raw, idle_since = self._idle.pop()
+            elif self._open < self.size:
+                self._open += 1
+                raw = _OPEN_SLOT
+            else:
+                waiter = self._queue_locked()
+
+        if waiter is not None:
+            raw = self._wait(waiter, timeout)
+        self.waits.add(self._clock() - started)
+
+        if raw is _OPEN_SLOT:
+            raw = self._open_connection()
+        elif idle_since is not None and self._clock() - idle_since > self.validate_idle_seconds and not self._alive(raw):
+            self._close_raw(raw)
+            self.dropped += 1
+            raw = self._open_connection()
+        self.checkouts += 1
+        return PooledConnection(self, raw)
+
+    def _queue_locked(self):
+        waiter = _Waiter()
+        self._waiters.append(waiter)
+        return waiter
+
+    def _wait(self, waiter, timeout):
+        waiter.event.wait(timeout)
+        with self._lock:
+            if waiter.conn is None:
+                # Timed out before anything was handed over
+                self._waiters.remove(waiter)
+                self.timeouts += 1
+                raise PoolTimeout(f"No database connection free within {timeout}s ({self.size} in use)")
+        return waiter.conn
+
+    def _open_connection(self):
+        """Opens a connection for a slot the caller already holds; gives the slot back on failure."""
+        try:
+            raw = self._connect()
+        except Exception:
+            self._release_slot()
+            raise
+        self.created += 1
+        return raw
+
+    # Checkin
+
+    def _checkin(self, raw):
+        if getattr(raw, 'in_transaction', False):
+            try:
+                raw.rollback()
+                self.rollbacks += 1
+            except Exception as e:
+                logger.warning(f"Dropping DB connection that failed to roll back: {e}")
+                self._drop(raw)
+                return
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.conn = raw
+                waiter.event.set()
+            else:
+                self._idle.append((raw, self._clock()))
+
+    def _drop(self, raw):
+        self._close_raw(raw)
+        self.dropped += 1
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._lock:
+            if self._waiters:
+                # The slot passes to the oldest waiter, who opens its own connection
+                waiter = self._waiters.popleft()
+                waiter.conn = _OPEN_SLOT
+                waiter.event.set()
+            else:
+                self._open -= 1
+
+    # Liveness
+
+    def _alive(self, raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def check_idle(self):
+        """Pings idle connections, closing dead ones and those idle past max_idle_seconds. Returns how many closed."""
+        now = self._clock()
+        with self._lock:
+            candidates, self._idle = self._idle, []
+        keep, closed = [], 0
+        # Oldest first, so the ones over max_idle_seconds beyond min_idle are the stalest
+        for position, (raw, idle_since) in enumerate(candidates):
+            surplus = len(candidates) - position > self.min_idle
+            if (surplus and now - idle_since > self.max_idle_seconds) or not self._alive(raw):
+                self._close_raw(raw)
+                closed += 1
+            else:
+                keep.append((raw, idle_since))
+        with self._lock:
+            while keep and self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.conn = keep.pop()[0]
+                waiter.event.set()
+            # Anything checked in meanwhile is more recent, so the survivors go underneath it
+            self._idle[:0] = keep
+        self.dropped += closed
+        for _ in range(closed):
+            self._release_slot()
+        return closed
+
+    def warm(self, count):
+        """Opens connections until `count` are idle (bounded by size). Raises the driver's error on failure."""
+        opened = []
+        try:
+            while len(opened) < count:
+                with self._lock:
+                    if self._open >= self.size: break
+                    self._open += 1
+                opened.append(self._open_connection())
+        finally:
+            for raw in opened:
+                self._checkin(raw)
+        return len(opened)
+
+    def stats(self):
+        waits = self.waits.summary(scale=1000)
+        idle = len(self._idle)
+        return {
+            'size': self.size,
+            'open': self._open,
+            'idle': idle,
+            'in_use': self._open - idle,
+            'waiters': len(self._waiters),
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'created': self.created,
+            'dropped': self.dropped,
+            'rollbacks': self.rollbacks,
+            'wait_p50_ms': waits['p50'],
+            'wait_p95_ms': waits['p95'],
+            'wait_p99_ms': waits['p99'],
+        }
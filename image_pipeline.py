@@ -0,0 +1,76 @@
+# image_pipeline.py - Off-hub decode, orientation, downscale and re-encode for uploaded photos
+
+import threading
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# PIL releases the GIL while decoding, resampling and encoding, so running it on
+# eventlet's native thread pool keeps the hub (and every socket) responsive.
+try:
+    from eventlet import tpool
+except ImportError:
+    tpool = None
+
+
+def _encode_jpeg(image, quality):
+    out = BytesIO()
+    image.save(out, 'jpeg', quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+def process_photo(image_bytes, max_side=1280, thumb_side=256, quality=85):
+    """
+    Decodes an uploaded image, applies its EXIF orientation, shrinks it to fit
+    max_side and re-encodes it as JPEG. Returns (photo_bytes, thumbnail_bytes).
+    Raises PIL.UnidentifiedImageError / ValueError for data that isn't an image.
+    """
+    image = Image.open(BytesIO(image_bytes))
+    if image.format == 'JPEG':
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full resolution
+        image.draft('RGB', (max_side, max_side))
+
+    try:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+    except OSError as e:
+        # Truncated or corrupt image data surfaces here, when the pixels are first read
+        raise ValueError(f"Could not decode image: {e}") from e
+
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    photo_bytes = _encode_jpeg(image, quality)
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail((thumb_side, thumb_side), Image.LANCZOS)
+    thumbnail_bytes = _encode_jpeg(thumbnail, quality)
+
+    return photo_bytes, thumbnail_bytes
+
+
+class ImagePipeline:
+    """Runs process_photo off the event loop, at most `workers` images at a time."""
+
+    def __init__(self, workers=2, max_side=1280, thumb_side=256, quality=85):
+        self.max_side = max_side
+        self.thumb_side = thumb_side
+        self.quality = quality
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def process(self, image_bytes):
+        with self._slots:
+            if tpool is not None:
+                return tpool.execute(process_photo, image_bytes, self.max_side, self.thumb_side, self.quality)
+            return process_photo(image_bytes, self.max_side, self.thumb_side, self.quality)
+
+
+def read_capped(stream, max_bytes, chunk_size=64 * 1024):
+    """Reads a request stream in chunks; returns None as soon as it exceeds max_bytes."""
+    chunks = []
+    total = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk: break
+        total += len(chunk)
+        if total > max_bytes: return None
+        chunks.append(chunk)
+    return b''.join(chunks)
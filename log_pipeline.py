@@ -0,0 +1,157 @@
+# log_pipeline.py - Non-blocking, structured logging with hot-path sampling
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import random
+import sys
+import time
+
+# Under eventlet the stdlib threading/queue are monkey-patched into green versions;
+# the writer must be a real OS thread so slow log I/O never blocks the hub.
+try:
+    from eventlet.patcher import original
+    _threading = original('threading')
+    _queue = original('queue')
+except ImportError:
+    import threading as _threading
+    import queue as _queue
+
+# Fields callers can attach with extra={...}
+STRUCTURED_FIELDS = ('event', 'sid', 'room', 'uid')
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the standard fields plus any event/sid/room/uid extras."""
+
+    def format(self, record):
+        payload = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        # Records from the queue carry the traceback already formatted, in exc_text
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        elif record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Downsamples chatty event types before they are queued. sample_rates maps an
+    event to the fraction of records kept; rate_limits maps an event to a
+    records-per-second cap. Warnings and errors, and records without an event,
+    always pass.
+    """
+
+    def __init__(self, sample_rates=None, rate_limits=None):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limits = rate_limits or {}
+        self._windows = {}  # event -> [window start second, records in window]
+        self.dropped = 0
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        if event is None or record.levelno >= logging.WARNING:
+            return True
+
+        rate = self.sample_rates.get(event)
+        if rate is not None and random.random() >= rate:
+            self.dropped += 1
+            return False
+
+        limit = self.rate_limits.get(event)
+        if limit is not None:
+            now = int(time.monotonic())
+            window = self._windows.get(event)
+            if window is None or window[0] != now:
+                window = self._windows[event] = [now, 0]
+            if window[1] >= limit:
+                self.dropped += 1
+                return False
+            window[1] += 1
+
+        return True
+
+
+_traceback_formatter = logging.Formatter()
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Drops (and counts) records instead of blocking when the writer falls behind."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.overflowed = 0
+
+    def prepare(self, record):
+        # The stock prepare() folds the traceback into msg; keep it in exc_text instead so
+        # the formatter can emit it as its own field. exc_info itself can't cross threads
+        # safely (it pins frames), so only the formatted text is queued.
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = _traceback_formatter.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except _queue.Full:
+            self.overflowed += 1
+
+
+class _OSThreadQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose writer is always a real OS thread, even after monkey-patching."""
+
+    def start(self):
+        self._thread = _threading.Thread(target=self._monitor, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # Also registered with atexit, so it may run again after an explicit stop()
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(level=logging.INFO, sample_rates=None, rate_limits=None, stream=None, max_queue=10000):
+    """
+    Routes the root logger through a bounded queue to a JSON stream handler on a
+    background OS thread. Returns (queue_handler, listener).
+    """
+    log_queue = _queue.Queue(maxsize=max_queue)
+
+    stream_handler = logging.StreamHandler(stream or sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+    # Only the writer thread touches this handler; give it a native lock, not a green one
+    stream_handler.lock = _threading.RLock()
+
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rates, rate_limits))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = _OSThreadQueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    return queue_handler, listener
@@ -0,0 +1,397 @@
+# matchmaker.py - Single-writer matchmaking actor for the video chat
+
+import logging
+import queue
+import time
+
+from matchmaking import RollingPercentiles
+from records import Room, Scope
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+
+class SocketIOOutbox:
+    """Delivers matchmaking results to sockets from outside a request context."""
+
+    def __init__(self, socketio, namespace='/'):
+        self.socketio = socketio
+        self.namespace = namespace
+
+    def emit(self, event, data=None, to=None):
+        self.socketio.emit(event, data, to=to, namespace=self.namespace)
+
+    def join_room(self, room_id, sid):
+        self.socketio.server.enter_room(sid, room_id, namespace=self.namespace)
+
+    def leave_room(self, room_id, sid):
+        self.socketio.server.leave_room(sid, room_id, namespace=self.namespace)
+
+
+class MatchmakingCore:
+    """
+    The matching state machine: waiting pool, active rooms and the join/leave/decision
+    transitions between them. It is only ever driven by one thread (the actor), so it
+    takes no locks; everything it wants sent to clients goes through the outbox.
+
+    Timeouts live on one timer wheel advanced by tick(): the delayed timed-date start,
+    the timed-date decision deadline, periodic liveness checks of waiting users, and
+    a recurring sweep that closes rooms whose users are gone, a batch at a time.
+    """
+
+    def __init__(self, pool, rooms, outbox, prompt_picker, room_id_factory,
+                 batch_mode=False, batch_size=200, batch_top_k=8,
+                 timers=None, is_connected=None, timed_date_delay=3, timed_date_deadline=180,
+                 wait_check_interval=30, max_wait=600, room_sweep_interval=30, room_sweep_batch=200):
+        self.pool = pool
+        self.rooms = rooms
+        self.outbox = outbox
+        self.pick_prompt = prompt_picker
+        self.create_room_id = room_id_factory
+        self.room_of = {}   # sid -> room_id, so disconnects and membership checks skip the room scan
+        # Batch mode: joins only queue the user; pairs are made by round()
+        self.batch_mode = batch_mode
+        self.batch_size = batch_size
+        self.batch_top_k = batch_top_k
+        # Reaper: is_connected(sid) tells live sockets from ghosts left by missed disconnects
+        self.timers = timers if timers is not None else TimerWheel()
+        self.is_connected = is_connected or (lambda sid: True)
+        self.timed_date_delay = timed_date_delay
+        self.timed_date_deadline = timed_date_deadline  # seconds after the room opens
+        self.wait_check_interval = wait_check_interval
+        self.max_wait = max_wait
+        self.room_sweep_interval = room_sweep_interval
+        self.room_sweep_batch = room_sweep_batch
+        self._sweep_backlog = []
+        self.reclaimed = {'waiting': 0, 'expired_waits': 0, 'timed_dates': 0, 'rooms': 0}
+        if room_sweep_interval:
+            self.timers.schedule(('sweep_rooms',), room_sweep_interval)
+
+    def join(self, entry):
+        """A user asked for a match (a WaitingEntry): pair them with the best waiting partner or queue them."""
+        user_sid = entry.sid
+        self.pool.remove(user_sid)
+        # Skipping out of a call asks for a new match without ending the old room first
+        self._vacate(user_sid)
+
+        if self.batch_mode:
+            self._add_waiting(entry)
+            self.outbox.emit('video-waiting', to=user_sid)
+            if len(self.pool) >= self.batch_size:
+                self.round()
+            return None
+
+        # Only buckets compatible on dating preference and location are searched
+        matched_user_data = self.pool.pop_best(entry)
+
+        if matched_user_data is None:
+            self._add_waiting(entry)
+            self.outbox.emit('video-waiting', to=user_sid)
+            logger.info("User %s added to waiting queue", user_sid, extra={'event': 'waiting', 'sid': user_sid, 'uid': entry.uid})
+            return None
+
+        return self._open_room(entry, matched_user_data)
+
+    def _add_waiting(self, entry):
+        self.pool.add(entry)
+        if self.wait_check_interval:
+            self.timers.schedule(('wait', entry.sid), self.wait_check_interval, self.pool.seq(entry.sid))
+
+    def round(self):
+        """Batch mode: pair up the whole waiting pool at once and open every room."""
+        if len(self.pool) < 2: return 0
+        started = time.perf_counter()
+        pool_size = len(self.pool)
+
+        pairs = self.pool.pairing(self.batch_top_k)
+        for initiator, receiver in pairs:
+            self.pool.take(initiator.sid)
+            self.pool.take(receiver.sid)
+            self._open_room(initiator, receiver)
+
+        logger.info(f"Matching round paired {len(pairs) * 2}/{pool_size} waiting users in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return len(pairs)
+
+    def _open_room(self, entry, matched_user_data):
+        """Creates the room for a pair and tells both sides; entry is the initiator."""
+        user_sid = entry.sid
+        partner_sid = matched_user_data.sid
+        initiator_profile = entry.match.profile
+        receiver_profile = matched_user_data.match.profile
+
+        receiver_verified = receiver_profile.get('photo_verified', False)
+        initiator_verified = initiator_profile.get('photo_verified', False)
+
+        shared_interests = set(initiator_profile.get('interests', [])).intersection(set(receiver_profile.get('interests', [])))
+        shared_interests_str = ", ".join(sorted(list(shared_interests)))
+
+        room_id = self.create_room_id()
+        prompt = self.pick_prompt(entry.match.region if entry.match.scope == Scope.LOCAL else None)
+
+        self.rooms[room_id] = Room((user_sid, partner_sid), time.time(), 'timed_date', prompt)
+        self.room_of[user_sid] = room_id
+        self.room_of[partner_sid] = room_id
+
+        try:
+            self.outbox.join_room(room_id, user_sid)
+            self.outbox.join_room(room_id, partner_sid)
+
+            match_data_initiator = {
+                'room': room_id,
+                'initiator': True,
+                'shared_interests': shared_interests_str,
+                'remote_name': receiver_profile.get('name', 'Stranger'),
+                'remote_photo': receiver_profile.get('photoURL'),
+                'remote_verified': receiver_verified
+            }
+            match_data_receiver = {
+                'room': room_id,
+                'initiator': False,
+                'shared_interests': shared_interests_str,
+                'remote_name': initiator_profile.get('name', 'Stranger'),
+                'remote_photo': initiator_profile.get('photoURL'),
+                'remote_verified': initiator_verified
+            }
+
+            self.outbox.emit('video-matched', match_data_initiator, to=user_sid)
+            self.outbox.emit('video-matched', match_data_receiver, to=partner_sid)
+
+            logger.info(f"Match created: {room_id} - {initiator_profile.get('name')} <-> {receiver_profile.get('name')}",
+                        extra={'event': 'match', 'sid': user_sid, 'room': room_id, 'uid': entry.uid})
+
+            self._arm_room_timers(room_id, self.timed_date_delay, self.timed_date_deadline or None)
+
+        except Exception as e:
+            logger.error(f"Error joining/emitting for video pair {room_id}: {e}", exc_info=True, extra={'event': 'match', 'room': room_id})
+
+        return room_id
+
+    def partner_of(self, user_sid):
+        """The other sid in user_sid's room, or None."""
+        room_id = self.room_of.get(user_sid)
+        if room_id is None: return None
+        return self.rooms[room_id].partner_of(user_sid)
+
+    def _arm_room_timers(self, room_id, start_delay, deadline):
+        if start_delay is not None:
+            self.timers.schedule(('date_start', room_id), start_delay)
+        if deadline is not None:
+            self.timers.schedule(('date_deadline', room_id), deadline)
+
+    def _close_room(self, room_id):
+        room_data = self.rooms.pop(room_id, None)
+        if room_data is None: return
+        self.timers.cancel(('date_start', room_id))
+        self.timers.cancel(('date_deadline', room_id))
+        for sid in room_data.sids:
+            if self.room_of.get(sid) == room_id:
+                del self.room_of[sid]
+
+    def _vacate(self, user_sid):
+        """Takes user_sid out of their room (if any), closing it and telling the partner."""
+        room_id = self.room_of.get(user_sid)
+        if room_id is None: return
+
+        partner_sid = self.partner_of(user_sid)
+        self._close_room(room_id)
+        logger.info("Room %s deleted", room_id, extra={'event': 'disconnect', 'sid': user_sid, 'room': room_id})
+
+        if partner_sid:
+            self.outbox.leave_room(room_id, partner_sid)
+            self.outbox.emit('video-user-disconnected', to=partner_sid)
+            logger.info("Notified partner %s of disconnection", partner_sid, extra={'event': 'disconnect', 'sid': partner_sid, 'room': room_id})
+
+    def decision(self, user_sid, room_id, action):
+        """A user voted 'continue' or 'end' at the end of a timed date."""
+        # The room comes from the client; only accept it for the room the sid is actually in
+        if self.room_of.get(user_sid) != room_id: return
+
+        room_data = self.rooms[room_id]
+        room_data.decisions[user_sid] = action
+
+        partner_sid = room_data.partner_of(user_sid)
+        partner_action = room_data.decisions.get(partner_sid)
+
+        if action == 'end' or partner_action == 'end':
+            self._end_date(room_id)
+            logger.info(f"Date ended in room {room_id}", extra={'event': 'match', 'sid': user_sid, 'room': room_id})
+
+        elif action == 'continue' and partner_action == 'continue':
+            room_data.status = 'matched'
+            self.rooms[room_id] = room_data  # write back so a mirrored rooms dict sees the new status
+            self.timers.cancel(('date_deadline', room_id))
+            self.outbox.emit('paired_match', to=room_id)
+            logger.info(f"Successful match in room {room_id}", extra={'event': 'match', 'sid': user_sid, 'room': room_id})
+
+        elif action == 'continue' and not partner_action:
+            self.outbox.emit('match_decision_received', {'action': 'continue'}, to=partner_sid)
+
+    def _end_date(self, room_id):
+        """Closes a room and sends both users back to the lobby."""
+        sids = self.rooms[room_id].sids
+        for sid in sids:
+            self.outbox.leave_room(room_id, sid)
+        self._close_room(room_id)
+        for sid in sids:
+            self.outbox.emit('video-user-disconnected', to=sid)
+
+    def leave(self, user_sid):
+        """A user disconnected: drop them from the pool and tell any partner."""
+        self.pool.remove(user_sid)
+        self._vacate(user_sid)
+
+    def tick(self):
+        """Advances the timer wheel and handles whatever came due."""
+        for key, payload in self.timers.advance():
+            kind = key[0]
+            if kind == 'wait':
+                self._check_waiting(key[1], payload)
+            elif kind == 'date_start':
+                self._start_timed_date(key[1])
+            elif kind == 'date_deadline':
+                self._expire_timed_date(key[1])
+            elif kind == 'sweep_rooms':
+                self._sweep_rooms()
+
+    def _check_waiting(self, user_sid, seq):
+        # Matched, left or re-queued since this check was scheduled
+        if user_sid not in self.pool or self.pool.seq(user_sid) != seq: return
+
+        if not self.is_connected(user_sid):
+            self.pool.remove(user_sid)
+            self.reclaimed['waiting'] += 1
+            logger.info("Dropped ghost waiting entry %s", user_sid, extra={'event': 'waiting', 'sid': user_sid})
+            return
+
+        waited = time.time() - (self.pool.get(user_sid).joined or time.time())
+        if self.max_wait and waited >= self.max_wait:
+            self.pool.remove(user_sid)
+            self.reclaimed['expired_waits'] += 1
+            self.outbox.emit('video-wait-expired', to=user_sid)
+            return
+
+        self.timers.schedule(('wait', user_sid), self.wait_check_interval, seq)
+
+    def _start_timed_date(self, room_id):
+        room_data = self.rooms.get(room_id)
+        if room_data is None: return
+        self.outbox.emit('start_timed_date', {'prompt': room_data.prompt}, to=room_id)
+        logger.info(f"Timed date started in room {room_id}", extra={'event': 'match', 'room': room_id})
+
+    def _expire_timed_date(self, room_id):
+        """Nobody ended the date in time: a missing decision counts as 'end'."""
+        room_data = self.rooms.get(room_id)
+        if room_data is None or room_data.status != 'timed_date': return
+        self._end_date(room_id)
+        self.reclaimed['timed_dates'] += 1
+        logger.info(f"Timed date in room {room_id} expired without decisions", extra={'event': 'match', 'room': room_id})
+
+    def _sweep_rooms(self):
+        """Checks the next batch of rooms and closes those with a user whose socket is gone."""
+        if not self._sweep_backlog:
+            self._sweep_backlog = list(self.rooms)
+        batch = self._sweep_backlog[-self.room_sweep_batch:]
+        del self._sweep_backlog[-self.room_sweep_batch:]
+
+        for room_id in batch:
+            room_data = self.rooms.get(room_id)
+            if room_data is None: continue
+            gone = [sid for sid in room_data.sids if not self.is_connected(sid)]
+            if not gone: continue
+            for user_sid in gone:
+                self._vacate(user_sid)
+            self.reclaimed['rooms'] += 1
+            logger.info("Closed orphaned room %s", room_id, extra={'event': 'disconnect', 'room': room_id})
+
+        self.timers.schedule(('sweep_rooms',), self.room_sweep_interval)
+
+    def reaper_stats(self):
+        stats = {f'reclaimed_{kind}': count for kind, count in self.reclaimed.items()}
+        stats['timers_pending'] = len(self.timers)
+        return stats
+
+    def restore(self, waiting, rooms):
+        """Replaces the pool and rooms with a snapshot, e.g. when taking over shared state from another worker."""
+        for entry in list(self.pool):
+            self.pool.remove(entry.sid)
+        for room_id in list(self.rooms):
+            self._close_room(room_id)
+
+        for entry in waiting:
+            self._add_waiting(entry)
+        for room_id, room_data in rooms.items():
+            self.rooms[room_id] = room_data
+            for sid in room_data.sids:
+                self.room_of[sid] = room_id
+            if room_data.status == 'timed_date' and self.timed_date_deadline:
+                remaining = room_data.created + self.timed_date_deadline - time.time()
+                self._arm_room_timers(room_id, None, max(remaining, 0))
+
+
+class MatchmakingActor:
+    """
+    Owns a MatchmakingCore and applies join/leave/decision/round/restore/tick commands to it one at a
+    time from a queue, so socket handlers never contend on matchmaking state and
+    commands take effect in arrival order. Tracks queue depth and command latency;
+    observe(command, queued_seconds, run_seconds), if given, is called after each command.
+    """
+
+    COMMANDS = ('join', 'leave', 'decision', 'round', 'restore', 'tick')
+
+    def __init__(self, core, latency_window=2048, observe=None):
+        self.core = core
+        self.observe = observe
+        self._queue = queue.Queue()
+        self.latencies = RollingPercentiles(latency_window)
+        self.processed = 0
+        self.failed = 0
+
+    def submit(self, command, *args):
+        if command not in self.COMMANDS:
+            raise ValueError(f"Unknown matchmaking command: {command}")
+        self._queue.put((command, args, time.perf_counter()))
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def run(self):
+        """Actor loop; start once with socketio.start_background_task."""
+        while True:
+            self._apply(self._queue.get())
+
+    def drain(self):
+        """Applies every queued command synchronously (benchmarks and scripts)."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._apply(item)
+
+    def _apply(self, item):
+        command, args, enqueued_at = item
+        started = time.perf_counter()
+        try:
+            getattr(self.core, command)(*args)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Matchmaking command {command} failed: {e}", exc_info=True, extra={'event': 'match'})
+        self.processed += 1
+        finished = time.perf_counter()
+        self.latencies.add(finished - enqueued_at)
+        if self.observe is not None:
+            self.observe(command, started - enqueued_at, finished - started)
+
+    def stats(self):
+        latencies = self.latencies.summary(scale=1000)
+        stats = {
+            'queue_depth': self.queue_depth(),
+            'processed': self.processed,
+            'failed': self.failed,
+            'latency_p50_ms': latencies['p50'],
+            'latency_p95_ms': latencies['p95'],
+            'latency_p99_ms': latencies['p99'],
+        }
+        stats.update(self.core.pool.stats())
+        stats.update(self.core.reaper_stats())
+        return stats
@@ -0,0 +1,490 @@
+# matchmaking.py - Bucketed waiting pool for video matchmaking
+
+import itertools
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+
+from records import Gender, Preference, Scope, parse_gender, parse_preference
+
+
+def calculate_interest_match(interests1, interests2):
+    if not isinstance(interests1, set) or not isinstance(interests2, set): return 0.0
+    if not interests1 or not interests2: return 0.0
+    try:
+        intersection = len(interests1.intersection(interests2))
+        union = len(interests1.union(interests2))
+        similarity = float(intersection) / union if union > 0 else 0.0
+        return similarity
+    except Exception:
+        return 0.0
+
+def dating_compatible(user1_gender, user1_pref, user2_gender, user2_pref):
+    """Whether two users' genders and dating preferences (Gender/Preference values) allow a match."""
+    # Bisexual matches with everyone
+    if user1_pref == Preference.BISEXUAL or user2_pref == Preference.BISEXUAL:
+        return True
+
+    # Straight: male wants female, female wants male
+    if user1_pref == Preference.STRAIGHT:
+        if user1_gender == Gender.MALE and user2_gender != Gender.FEMALE:
+            return False
+        if user1_gender == Gender.FEMALE and user2_gender != Gender.MALE:
+            return False
+
+    if user2_pref == Preference.STRAIGHT:
+        if user2_gender == Gender.MALE and user1_gender != Gender.FEMALE:
+            return False
+        if user2_gender == Gender.FEMALE and user1_gender != Gender.MALE:
+            return False
+
+    # Gay: male wants male
+    if user1_pref == Preference.GAY and (user1_gender != Gender.MALE or user2_gender != Gender.MALE):
+        return False
+    if user2_pref == Preference.GAY and (user2_gender != Gender.MALE or user1_gender != Gender.MALE):
+        return False
+
+    # Lesbian: female wants female
+    if user1_pref == Preference.LESBIAN and (user1_gender != Gender.FEMALE or user2_gender != Gender.FEMALE):
+        return False
+    if user2_pref == Preference.LESBIAN and (user2_gender != Gender.FEMALE or user1_gender != Gender.FEMALE):
+        return False
+
+    return True
+
+def check_dating_compatibility(user1_profile, user2_profile):
+    """
+    Check if two users are compatible based on dating preferences.
+    Returns True if they should be matched, False otherwise.
+    """
+    return dating_compatible(
+        parse_gender(user1_profile.get('gender')), parse_preference(user1_profile.get('datingPreference')),
+        parse_gender(user2_profile.get('gender')), parse_preference(user2_profile.get('datingPreference')),
+    )
+
+@lru_cache(maxsize=4096)
+def buckets_compatible(seeker_key, partner_key):
+    """Bucket-level version of the dating and location checks; keys are MatchProfile.bucket_key."""
+    seeker_gender, seeker_pref, seeker_scope, seeker_region = seeker_key
+    partner_gender, partner_pref, partner_scope, partner_region = partner_key
+
+    if not dating_compatible(seeker_gender, seeker_pref, partner_gender, partner_pref):
+        return False
+
+    # Local seekers only see local partners from the same region
+    if seeker_scope == Scope.LOCAL:
+        if partner_scope != Scope.LOCAL or partner_region != seeker_region:
+            return False
+
+    return True
+
+
+class RollingPercentiles:
+    """Percentiles over the most recent samples (wait times, command latencies)."""
+
+    def __init__(self, size=2048):
+        self._samples = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, value):
+        self._samples.append(value)
+        self.count += 1
+
+    def summary(self, scale=1.0):
+        samples = sorted(self._samples)
+        if not samples: return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+        pick = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))] * scale
+        return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99)}
+
+
+class InterestRegistry:
+    """Interns interest strings to small integer ids, shared by every connection."""
+
+    def __init__(self):
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def intern(self, interests):
+        """Returns the sorted, de-duplicated interest ids for a profile's interest list."""
+        ids = set()
+        with self._lock:
+            for name in interests or ():
+                if not isinstance(name, str): continue
+                interest_id = self._ids.get(name)
+                if interest_id is None:
+                    interest_id = self._ids[name] = len(self._ids)
+                ids.add(interest_id)
+        return np.array(sorted(ids), dtype=np.int32)
+
+
+class _Bucket:
+    """
+    Column store for one bucket of waiting users. Rows are swap-removed so
+    insert and delete stay O(1); interest ids are a -1 padded int32 matrix.
+    """
+
+    INITIAL_CAPACITY = 16
+    INITIAL_WIDTH = 8
+
+    def __init__(self):
+        self.entries = []
+        self.row_of = {}
+        self.seqs = np.zeros(self.INITIAL_CAPACITY, dtype=np.int64)
+        self.joined = np.zeros(self.INITIAL_CAPACITY, dtype=np.float64)
+        self.counts = np.zeros(self.INITIAL_CAPACITY, dtype=np.int32)
+        self.ids = np.full((self.INITIAL_CAPACITY, self.INITIAL_WIDTH), -1, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _grow(self, min_width):
+        capacity, width = self.ids.shape
+        if len(self.entries) >= capacity:
+            capacity *= 2
+            self.seqs = np.resize(self.seqs, capacity)
+            self.joined = np.resize(self.joined, capacity)
+            self.counts = np.resize(self.counts, capacity)
+        if min_width > width:
+            width = max(min_width, width * 2)
+        if (capacity, width) != self.ids.shape:
+            ids = np.full((capacity, width), -1, dtype=np.int32)
+            ids[:len(self.entries), :self.ids.shape[1]] = self.ids[:len(self.entries)]
+            self.ids = ids
+
+    def add(self, seq, joined, entry, interest_ids):
+        self._grow(len(interest_ids))
+        row = len(self.entries)
+        self.entries.append(entry)
+        self.row_of[entry.sid] = row
+        self.seqs[row] = seq
+        self.joined[row] = joined
+        self.counts[row] = len(interest_ids)
+        self.ids[row].fill(-1)
+        self.ids[row, :len(interest_ids)] = interest_ids
+
+    def remove(self, sid):
+        row = self.row_of.pop(sid)
+        entry = self.entries[row]
+        last = len(self.entries) - 1
+        if row != last:
+            moved = self.entries[last]
+            self.entries[row] = moved
+            self.row_of[moved.sid] = row
+            self.seqs[row] = self.seqs[last]
+            self.joined[row] = self.joined[last]
+            self.counts[row] = self.counts[last]
+            self.ids[row] = self.ids[last]
+        self.entries.pop()
+        return entry
+
+    def scores(self, seeker_ids):
+        """Jaccard similarity of every row against the seeker, as one vectorized call."""
+        size = len(self.entries)
+        if size == 0 or len(seeker_ids) == 0:
+            return np.zeros(size, dtype=np.float64)
+        counts = self.counts[:size]
+        intersection = np.isin(self.ids[:size], seeker_ids).sum(axis=1)
+        union = counts + len(seeker_ids) - intersection
+        return np.divide(intersection, union, out=np.zeros(size, dtype=np.float64), where=counts > 0)
+
+    def _one_hot(self, vocab):
+        size = len(self.entries)
+        ids = self.ids[:size]
+        rows, cols = np.nonzero(ids >= 0)
+        one_hot = np.zeros((size, len(vocab)), dtype=np.float32)
+        one_hot[rows, np.searchsorted(vocab, ids[rows, cols])] = 1.0
+        return one_hot
+
+
+class _PairScorer:
+    """
+    Jaccard similarity of a bucket's rows against every row of another bucket, a
+    block of rows at a time. The one-hot matrices are built once per bucket pair;
+    each block costs one matrix product of (rows x vocabulary) by (vocabulary x other).
+    """
+
+    def __init__(self, bucket, other):
+        size, other_size = len(bucket), len(other)
+        ids, other_ids = bucket.ids[:size], other.ids[:other_size]
+        vocab = np.union1d(ids[ids >= 0], other_ids[other_ids >= 0])
+        self.counts = bucket.counts[:size]
+        self.other_counts = other.counts[:other_size]
+        self.one_hot = bucket._one_hot(vocab) if vocab.size else None
+        self.other_one_hot = other._one_hot(vocab).T if vocab.size else None
+
+    def scores(self, start, stop):
+        if self.one_hot is None:
+            return np.zeros((stop - start, len(self.other_counts)), dtype=np.float64)
+        intersection = (self.one_hot[start:stop] @ self.other_one_hot).astype(np.float64)
+        counts = self.counts[start:stop, None]
+        union = counts + self.other_counts[None, :] - intersection
+        both = (counts > 0) & (self.other_counts[None, :] > 0)
+        return np.divide(intersection, union, out=np.zeros_like(intersection), where=both)
+
+
+class WaitingPool:
+    """
+    WaitingEntry records bucketed by (gender, datingPreference, dateScope, region).
+    Insert and remove by sid are O(1); a match search only visits buckets
+    that are compatible with the seeker and scores each one in a single
+    vectorized pass over interned interest ids.
+
+    Candidates are ranked by priority = interest score + aging_per_second *
+    seconds waited (capped at aging_cap_seconds), so rare profiles are not
+    starved by fresher, better-scoring ones. With search_top_k set only the
+    top-k rows of each bucket go on to the per-candidate checks.
+    """
+
+    def __init__(self, interest_registry=None, aging_per_second=0.0, aging_cap_seconds=120,
+                 search_top_k=None, clock=time.time):
+        self.interest_registry = interest_registry if interest_registry is not None else InterestRegistry()
+        self.aging_per_second = aging_per_second
+        self.aging_cap_seconds = aging_cap_seconds
+        self.search_top_k = search_top_k
+        self._clock = clock
+        self._buckets = {}      # bucket key -> _Bucket
+        self._bucket_of = {}    # sid -> bucket key
+        self._sids_by_ip = {}   # ip -> {sid}, to mask a seeker's own IP/UID out before ranking
+        self._sids_by_uid = {}  # uid -> {sid}
+        self._seq = itertools.count()
+        self.waits = RollingPercentiles()   # seconds waited by users who got matched
+
+    def __len__(self):
+        return len(self._bucket_of)
+
+    def __contains__(self, sid):
+        return sid in self._bucket_of
+
+    def __iter__(self):
+        for bucket in self._buckets.values():
+            yield from list(bucket.entries)
+
+    def get(self, sid):
+        key = self._bucket_of.get(sid)
+        if key is None: return None
+        bucket = self._buckets[key]
+        return bucket.entries[bucket.row_of[sid]]
+
+    def add(self, entry):
+        sid = entry.sid
+        self.remove(sid)
+        key = entry.match.bucket_key
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket()
+        bucket.add(next(self._seq), entry.joined or self._clock(), entry, entry.match.interest_ids)
+        self._bucket_of[sid] = key
+        self._sids_by_ip.setdefault(entry.ip, set()).add(sid)
+        self._sids_by_uid.setdefault(entry.uid, set()).add(sid)
+
+    def remove(self, sid):
+        key = self._bucket_of.pop(sid, None)
+        if key is None: return None
+        bucket = self._buckets[key]
+        entry = bucket.remove(sid)
+        if not bucket:
+            del self._buckets[key]
+        for index, value in ((self._sids_by_ip, entry.ip), (self._sids_by_uid, entry.uid)):
+            sids = index[value]
+            sids.discard(sid)
+            if not sids:
+                del index[value]
+        return entry
+
+    def take(self, sid):
+        """Removes a user because they were matched, recording how long they waited."""
+        key = self._bucket_of.get(sid)
+        if key is None: return None
+        bucket = self._buckets[key]
+        self.waits.add(float(self._clock() - bucket.joined[bucket.row_of[sid]]))
+        return self.remove(sid)
+
+    def compatible_buckets(self, seeker_key):
+        return [bucket for key, bucket in self._buckets.items() if buckets_compatible(seeker_key, key)]
+
+    def seq(self, sid):
+        """Arrival order of a waiting sid; larger is more recent."""
+        bucket = self._buckets[self._bucket_of[sid]]
+        return int(bucket.seqs[bucket.row_of[sid]])
+
+    def _excluded_rows(self, seeker):
+        """{id(bucket): [row, ...]} of the waiting users the seeker can't be matched with (self, same IP/UID)."""
+        sids = self._sids_by_ip.get(seeker.ip, set()) | self._sids_by_uid.get(seeker.uid, set())
+        if seeker.sid in self._bucket_of:
+            sids.add(seeker.sid)
+        rows = {}
+        for sid in sids:
+            bucket = self._buckets[self._bucket_of[sid]]
+            rows.setdefault(id(bucket), []).append(bucket.row_of[sid])
+        return rows
+
+    def _aging(self, waited):
+        return self.aging_per_second * np.minimum(waited, self.aging_cap_seconds)
+
+    def _score_compatible(self, seeker):
+        """Priorities, arrival seqs and entries for the compatible waiting users worth checking."""
+        buckets = self.compatible_buckets(seeker.match.bucket_key)
+        if not buckets: return None
+
+        seeker_ids = seeker.match.interest_ids
+        now = self._clock()
+        limit = self.search_top_k
+        # Excluded users are masked before the top-k cut, so a crowd of them (a shared NAT, one
+        # uid on several tabs) can't push every valid partner out of the rows that are kept
+        excluded = self._excluded_rows(seeker)
+
+        priority_parts, seq_parts, entries = [], [], []
+        for bucket in buckets:
+            size = len(bucket)
+            priorities = bucket.scores(seeker_ids)
+            if self.aging_per_second:
+                priorities += self._aging(now - bucket.joined[:size])
+            rows = excluded.get(id(bucket))
+            if rows:
+                priorities[rows] = -np.inf
+            seqs = bucket.seqs[:size]
+
+            if limit and size > limit:
+                rows = np.argpartition(-priorities, limit - 1)[:limit]
+                priority_parts.append(priorities[rows])
+                seq_parts.append(seqs[rows])
+                entries.extend(bucket.entries[row] for row in rows)
+            else:
+                priority_parts.append(priorities)
+                seq_parts.append(seqs)
+                entries.extend(bucket.entries)
+
+        return np.concatenate(priority_parts), np.concatenate(seq_parts), entries
+
+    def find_best(self, seeker):
+        """
+        Returns the waiting entry with the highest priority for the seeker.
+        Ties go to the most recently queued user, as in the old newest-first scan.
+        """
+        scored = self._score_compatible(seeker)
+        if scored is None: return None
+        scores, seqs, entries = scored
+
+        # Excluded candidates were masked to -inf
+        top_score = scores.max()
+        if top_score == -np.inf: return None
+        tied = np.flatnonzero(scores == top_score)
+        return entries[tied[np.argmax(seqs[tied])]]
+
+    def top_candidates(self, seeker, k):
+        """Up to k (entry, priority) pairs for the seeker, best first, with the same tie-breaking as find_best."""
+        scored = self._score_compatible(seeker)
+        if scored is None or k <= 0: return []
+        scores, seqs, entries = scored
+
+        limit = min(len(entries), k)
+        if limit < len(entries):
+            indices = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            indices = np.arange(len(entries))
+        indices = indices[np.lexsort((-seqs[indices], -scores[indices]))]
+        # Excluded candidates were masked to -inf and sort last
+        return [(entries[index], float(scores[index])) for index in indices if scores[index] != -np.inf]
+
+    def pairing(self, k=8, chunk_rows=256):
+        """
+        Pairs up the whole pool for a batch round. Each user contributes edges to
+        their top-k compatible partners (scored a bucket pair at a time, with both
+        users' aging added); edges are then taken greedily by priority, newest
+        pairs first on ties, which is within a factor of two of the maximum-weight
+        pairing on that graph. Returns [(initiator, receiver), ...] with the more
+        recently queued user as initiator.
+
+        Seekers are scored chunk_rows at a time and only their top-k survive each
+        chunk, so a round holds chunk_rows x (compatible pool) scores at once
+        rather than a dense matrix per bucket, and at most k edges per user.
+        """
+        if k <= 0: return []
+        now = self._clock()
+        edges = {}
+        for seeker_key, seeker_bucket in self._buckets.items():
+            partner_buckets = [bucket for key, bucket in self._buckets.items() if buckets_compatible(seeker_key, key)]
+            if not partner_buckets: continue
+
+            scorers = [_PairScorer(seeker_bucket, bucket) for bucket in partner_buckets]
+            seqs = np.concatenate([bucket.seqs[:len(bucket)] for bucket in partner_buckets])
+            entries = [entry for bucket in partner_buckets for entry in bucket.entries]
+            if self.aging_per_second:
+                partner_aging = self._aging(now - np.concatenate([bucket.joined[:len(bucket)] for bucket in partner_buckets]))
+                seeker_aging = self._aging(now - seeker_bucket.joined[:len(seeker_bucket)])
+            offsets, start = {}, 0
+            for bucket in partner_buckets:
+                offsets[id(bucket)] = start
+                start += len(bucket)
+            limit = min(len(entries), k)
+
+            for chunk_start in range(0, len(seeker_bucket), chunk_rows):
+                chunk_stop = min(chunk_start + chunk_rows, len(seeker_bucket))
+                scores = np.hstack([scorer.scores(chunk_start, chunk_stop) for scorer in scorers])
+                if self.aging_per_second:
+                    scores += seeker_aging[chunk_start:chunk_stop, None] + partner_aging[None, :]
+
+                # Mask each seeker's excluded partners before the per-row top-k cut
+                for row in range(chunk_stop - chunk_start):
+                    for bucket_id, rows in self._excluded_rows(seeker_bucket.entries[chunk_start + row]).items():
+                        if bucket_id in offsets:
+                            scores[row, [offsets[bucket_id] + r for r in rows]] = -np.inf
+
+                # Exact (priority, seq) order per row
+                if limit < len(entries):
+                    columns = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+                else:
+                    columns = np.broadcast_to(np.arange(len(entries)), scores.shape)
+
+                for row in range(chunk_stop - chunk_start):
+                    seeker = seeker_bucket.entries[chunk_start + row]
+                    seeker_seq = int(seeker_bucket.seqs[chunk_start + row])
+                    row_columns = columns[row]
+                    row_columns = row_columns[np.lexsort((-seqs[row_columns], -scores[row, row_columns]))]
+                    for column in row_columns:
+                        if scores[row, column] == -np.inf: continue
+                        partner = entries[column]
+                        # (priority, newest seq, initiator, receiver): the more recently queued user initiates
+                        partner_seq = int(seqs[column])
+                        if seeker_seq > partner_seq:
+                            edge = (float(scores[row, column]), seeker_seq, seeker, partner)
+                        else:
+                            edge = (float(scores[row, column]), partner_seq, partner, seeker)
+                        pair = (edge[2].sid, edge[3].sid)
+                        if pair not in edges or edge[0] > edges[pair][0]:
+                            edges[pair] = edge
+
+        paired = set()
+        pairs = []
+        for _, _, initiator, receiver in sorted(edges.values(), key=lambda edge: (edge[0], edge[1]), reverse=True):
+            if initiator.sid in paired or receiver.sid in paired: continue
+            paired.add(initiator.sid)
+            paired.add(receiver.sid)
+            pairs.append((initiator, receiver))
+        return pairs
+
+    def pop_best(self, seeker):
+        best_entry = self.find_best(seeker)
+        if best_entry is not None:
+            self.take(best_entry.sid)
+        return best_entry
+
+    def stats(self):
+        """Pool size, oldest current wait and p50/p95/p99 wait of matched users, in seconds."""
+        now = self._clock()
+        oldest = min((float(bucket.joined[:len(bucket)].min()) for bucket in self._buckets.values()), default=now)
+        waits = self.waits.summary()
+        return {
+            'waiting': len(self),
+            'buckets': len(self._buckets),
+            'oldest_wait_s': now - oldest,
+            'wait_p50_s': waits['p50'],
+            'wait_p95_s': waits['p95'],
+            'wait_p99_s': waits['p99'],
+        }
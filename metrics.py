@@ -0,0 +1,268 @@
+# metrics.py - Counters, gauges and histograms with Prometheus text exposition
+
+import heapq
+import itertools
+import math
+import time
+from bisect import bisect_left
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf: return '+Inf'
+    if value == -math.inf: return '-Inf'
+    return repr(float(value))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels):
+    if not labels: return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+    def dec(self, amount=1.0):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('child', 'started')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class _Metric:
+    """
+    One metric family. With labelnames, call labels(*values) to get the child to
+    update (children are cached); without, the family forwards to its only child.
+    Updates take no lock: under eventlet green threads never preempt mid-update.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def samples(self):
+        """(suffix, labels, value) tuples for exposition."""
+        for values, child in list(self._children.items()):
+            yield from self._child_samples(list(zip(self.labelnames, values)), child)
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+    def _child_samples(self, labels, child):
+        yield '_total', labels, child.value
+
+
+class Gauge(_Metric):
+    """A gauge set by the code, or read from fn() at scrape time when fn is given."""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default.dec(amount)
+
+    def samples(self):
+        if self.fn is not None:
+            yield '', [], self.fn()
+            return
+        yield from super().samples()
+
+    def _child_samples(self, labels, child):
+        yield '', labels, child.value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _child_samples(self, labels, child):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), child.counts):
+            cumulative += count
+            yield '_bucket', labels + [('le', _format_value(bound))], cumulative
+        yield '_sum', labels, child.sum
+        yield '_count', labels, child.count
+
+
+class MetricsRegistry:
+    """Creates metrics and renders all of them in the Prometheus text format."""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self.prefix + name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), fn=None):
+        return self._register(Gauge(self.prefix + name, documentation, labelnames, fn))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self.prefix + name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            try:
+                for suffix, labels, value in metric.samples():
+                    lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+class HandlerProfiler:
+    """
+    Times socket event handlers into a histogram labelled by event. With profiling
+    enabled it also keeps the `keep` slowest calls (event, sid, duration) so the
+    worst offenders can be inspected; it can be switched on and off at runtime.
+    """
+
+    def __init__(self, histogram, keep=50):
+        self.histogram = histogram
+        self.keep = keep
+        self.enabled = False
+        self._slowest = []  # min-heap of (duration, seq, record)
+        self._seq = itertools.count()
+
+    def set_enabled(self, enabled, keep=None):
+        if keep is not None:
+            self.keep = keep
+        if enabled and not self.enabled:
+            self._slowest = []
+        self.enabled = enabled
+
+    def record(self, event, duration, sid=None):
+        self.histogram.labels(event).observe(duration)
+        if not self.enabled: return
+        entry = (duration, next(self._seq), {'event': event, 'sid': sid, 'duration_ms': duration * 1000, 'at': time.time()})
+        if len(self._slowest) < self.keep:
+            heapq.heappush(self._slowest, entry)
+        elif duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        return [record for _, _, record in sorted(self._slowest, reverse=True)]
+
+    def wrap(self, event, sid_fn=None):
+        """Decorator timing a handler under `event`; sid_fn() names the caller when profiling."""
+        def decorator(f):
+            @wraps(f)
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.record(event, time.perf_counter() - started, sid_fn() if self.enabled and sid_fn else None)
+            return timed
+        return decorator
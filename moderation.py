@@ -0,0 +1,193 @@
+# moderation.py - Censor-word matching compiled once into an Aho-Corasick automaton
+
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Batches are screened on eventlet's native thread pool when it is available
+try:
+    from eventlet import tpool
+except ImportError:
+    tpool = None
+
+# better_profanity ships the default word list
+try:
+    from better_profanity.utils import get_complete_path_of_file
+    DEFAULT_WORDLIST = get_complete_path_of_file('profanity_wordlist.txt')
+except ImportError:
+    DEFAULT_WORDLIST = None
+
+# Look-alike characters folded to one canonical letter, in both the word list and the
+# text (the variants better_profanity generates). i/l and u/v fold together.
+_FOLD = {
+    '@': 'a', '4': 'a',
+    '1': 'i', 'l': 'i', '!': 'i', '|': 'i',
+    '0': 'o',
+    'v': 'u',
+    '3': 'e',
+    '$': 's', '5': 's',
+    '7': 't', '+': 't',
+}
+
+
+# Look-alikes that are usually just punctuation when they end a word ("wow!")
+_TRAILING = frozenset('!|+')
+
+
+def normalize(text, word=False):
+    """
+    Lowercases, folds look-alikes and turns every run of other characters into one
+    space, so "$h1t!!" and "S H I T" line up with the word list the same way. In
+    text (not word list entries) a run of !, | or + that ends a word counts as punctuation.
+    """
+    text = text.lower()
+    # punctuation[i]: text[i] starts a run of !, | or + that ends the word ("fuck!!")
+    punctuation = [False] * (len(text) + 1)
+    if not word:
+        ends_word = True
+        for index in range(len(text) - 1, -1, -1):
+            char = text[index]
+            if char in _TRAILING:
+                punctuation[index] = ends_word
+            else:
+                ends_word = not (char.isalnum() or char in _FOLD)
+    out = []
+    gap = True  # start as if after a separator, so leading junk is dropped
+    for index, char in enumerate(text):
+        folded = ' ' if punctuation[index] else _FOLD.get(char, char)
+        if folded.isalnum():
+            out.append(folded)
+            gap = False
+        elif not gap:
+            out.append(' ')
+            gap = True
+    if out and gap:
+        out.pop()
+    return ''.join(out)
+
+
+class CensorAutomaton:
+    """
+    Aho-Corasick automaton over normalized censor words. contains() scans the
+    normalized text once, whatever the size of the word list, and only counts
+    matches that start and end on word boundaries (so "class" doesn't hit "ass").
+    """
+
+    def __init__(self, words):
+        self._goto = [{}]       # state -> {char: state}
+        self._fail = [0]
+        self._out = [()]        # state -> lengths of the words ending here (incl. via fail links)
+        self.word_count = 0
+        for word in words:
+            word = normalize(word, word=True)
+            if word:
+                self._add(word)
+                self.word_count += 1
+        self._link()
+
+    def _add(self, word):
+        state = 0
+        for char in word:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (len(word),)
+
+    def _link(self):
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def contains(self, text):
+        text = normalize(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        last = len(text) - 1
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not out[state]: continue
+            if end < last and text[end + 1] != ' ': continue
+            for length in out[state]:
+                start = end - length + 1
+                if start == 0 or text[start - 1] == ' ':
+                    return True
+        return False
+
+
+class ProfanityFilter:
+    """
+    Holds the compiled automaton for a word list file (plus extra words) and
+    rebuilds it when the file changes; the swap is a single assignment, so checks
+    never see a half-built automaton. check_messages() screens a batch, off the
+    event loop when it is large.
+    """
+
+    def __init__(self, path=DEFAULT_WORDLIST, extra_words=(), workers=2, inline_batch=32):
+        self.path = path
+        self.extra_words = tuple(extra_words)
+        self.inline_batch = inline_batch
+        self._slots = threading.BoundedSemaphore(workers)
+        self._signature = None
+        self._automaton = CensorAutomaton(self.extra_words)
+        self.reloads = 0
+        self.reload_if_changed()
+
+    def _file_signature(self):
+        if not self.path: return None
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload_if_changed(self):
+        """Recompiles when the word list file's mtime or size moved. Returns True if it did."""
+        try:
+            signature = self._file_signature()
+            if signature == self._signature: return False
+            with open(self.path, encoding='utf-8') as f:
+                words = [line.strip() for line in f if line.strip()]
+        except OSError as e:
+            logger.error(f"Could not load censor word list {self.path}: {e}")
+            return False
+        self._automaton = CensorAutomaton(words + list(self.extra_words))
+        self._signature = signature
+        self.reloads += 1
+        logger.info(f"Compiled {self._automaton.word_count} censor words from {self.path}")
+        return True
+
+    def word_count(self):
+        return self._automaton.word_count
+
+    def check_message(self, message):
+        """True if the message contains a censored word."""
+        return self._automaton.contains(message if isinstance(message, str) else str(message))
+
+    def _check_all(self, messages):
+        automaton = self._automaton
+        return [automaton.contains(m if isinstance(m, str) else str(m)) for m in messages]
+
+    def check_messages(self, messages):
+        """
+        A list of booleans, one per message. Batches over inline_batch run on the
+        native thread pool (at most `workers` at once), which keeps the hub serving
+        sockets while they are screened.
+        """
+        messages = list(messages)
+        if tpool is None or len(messages) <= self.inline_batch:
+            return self._check_all(messages)
+        with self._slots:
+            return tpool.execute(self._check_all, messages)
@@ -0,0 +1,148 @@
+# photo_store.py - Content-addressed storage for verification photos
+
+import hashlib
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from io import BytesIO
+
+# Keys are the sha256 of the stored bytes, so a key's content never changes
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+def is_valid_key(key):
+    return bool(KEY_PATTERN.match(key))
+
+# S3 error codes for a missing object (head_object has no body, so it only reports the status)
+NOT_FOUND_CODES = frozenset(('404', 'NoSuchKey', 'NotFound'))
+
+def _is_not_found(error):
+    # botocore's ClientError carries the service error in .response; duck-typed so botocore stays optional
+    response = getattr(error, 'response', None)
+    if not isinstance(response, dict): return False
+    return str(response.get('Error', {}).get('Code')) in NOT_FOUND_CODES
+
+
+class PhotoStore(ABC):
+    """
+    Interface shared by the storage backends. Objects are immutable and named by
+    content hash: put() of bytes that are already stored is a no-op returning the
+    same key, which is what deduplicates repeated uploads.
+    """
+
+    content_type = 'image/jpeg'
+
+    @abstractmethod
+    def put(self, data):
+        """Stores data (if new) and returns its key."""
+
+    @abstractmethod
+    def exists(self, key):
+        """True if key is stored."""
+
+    @abstractmethod
+    def open(self, key):
+        """Readable, seekable file object for key; raises KeyError if missing."""
+
+    def local_path(self, key):
+        """Filesystem path for backends that have one, so the server can send the file directly."""
+        return None
+
+    def public_url(self, key):
+        """Direct URL (e.g. a CDN in front of a bucket), or None to serve through the app."""
+        return None
+
+
+class LocalPhotoStore(PhotoStore):
+    """Files on disk under root/ab/cd/<key>.jpg, written atomically."""
+
+    def __init__(self, root, shard_depth=2, shard_width=2):
+        self.root = root
+        self.shard_depth = shard_depth
+        self.shard_width = shard_width
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        shards = [key[i * self.shard_width:(i + 1) * self.shard_width] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, f"{key}.jpg")
+
+    def put(self, data):
+        key = content_key(data)
+        path = self._path(key)
+        if os.path.exists(path): return key
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial photo
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+        return key
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def open(self, key):
+        try:
+            return open(self._path(key), 'rb')
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def local_path(self, key):
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+
+class ObjectStorePhotoStore(PhotoStore):
+    """
+    S3-style bucket backend. `client` is anything with the boto3 S3 client's
+    put_object/head_object/get_object methods. With public_base_url set, photos
+    are served straight from the bucket/CDN instead of through the app.
+    """
+
+    def __init__(self, client, bucket, prefix='photos/', public_base_url=None):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_base_url = public_base_url.rstrip('/') if public_base_url else None
+
+    def _object_key(self, key):
+        return f"{self.prefix}{key[:2]}/{key}.jpg"
+
+    def put(self, data):
+        key = content_key(data)
+        if self.exists(key): return key
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data,
+                               ContentType=self.content_type,
+                               CacheControl='public, max-age=31536000, immutable')
+        return key
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception as e:
+            # Anything but "no such object" (auth, throttling, network) must not read as missing
+            if _is_not_found(e): return False
+            raise
+
+    def open(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception as e:
+            if _is_not_found(e): raise KeyError(key)
+            raise
+        return BytesIO(response['Body'].read())
+
+    def public_url(self, key):
+        if self.public_base_url is None: return None
+        return f"{self.public_base_url}/{self._object_key(key)}"
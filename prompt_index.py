@@ -0,0 +1,95 @@
+# prompt_index.py - In-memory index of match_prompts for room creation
+
+import logging
+import random
+import threading
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MATCH_PROMPT = "What's your biggest guilty pleasure?"
+
+
+class PromptIndex:
+    """
+    Prompts grouped by region and category. Picking a prompt for a new room is
+    O(1) and never touches the database; the index is swapped out wholesale on
+    reload, so readers never see a half-built index.
+    """
+
+    def __init__(self):
+        self._by_region = {}            # region -> [prompt, ...]
+        self._by_region_category = {}   # (region, category) -> [prompt, ...]
+        self._signature = None          # (COUNT(*), MAX(id)) of the table at last load
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(prompts) for prompts in self._by_region.values())
+
+    def categories(self, region='global'):
+        return sorted(category for (r, category) in self._by_region_category if r == region)
+
+    def load(self, prompts_data, signature=None):
+        """Rebuilds the index from dicts with 'prompt', 'category' and optional 'region'."""
+        by_region = {}
+        by_region_category = {}
+        for p in prompts_data:
+            region = p.get('region') or 'global'
+            by_region.setdefault(region, []).append(p['prompt'])
+            by_region_category.setdefault((region, p['category']), []).append(p['prompt'])
+
+        with self._lock:
+            self._by_region = by_region
+            self._by_region_category = by_region_category
+            self._signature = signature
+        logger.info(f"Prompt index loaded {len(self)} prompts across {len(by_region)} regions")
+
+    def random_prompt(self, user_region=None, category=None):
+        """Uniform pick over global prompts plus the user's region, like the old ORDER BY RAND() query."""
+        if category is None:
+            index = self._by_region
+            keys = ['global']
+            if user_region and user_region != 'global':
+                keys.append(user_region)
+        else:
+            index = self._by_region_category
+            keys = [('global', category)]
+            if user_region and user_region != 'global':
+                keys.append((user_region, category))
+
+        pools = [index.get(key, ()) for key in keys]
+        total = sum(len(pool) for pool in pools)
+        if total == 0: return DEFAULT_MATCH_PROMPT
+
+        pick = random.randrange(total)
+        for pool in pools:
+            if pick < len(pool): return pool[pick]
+            pick -= len(pool)
+
+    def reload_from_db(self, connection_factory, force=False):
+        """Reloads from match_prompts when the table's row count or max id has moved (or when forced)."""
+        conn = connection_factory()
+        if not conn: return False
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT COUNT(*) AS total, MAX(id) AS max_id FROM match_prompts")
+            row = cursor.fetchone()
+            signature = (row['total'], row['max_id'])
+            if not force and signature == self._signature:
+                return True
+            cursor.execute("SELECT prompt, category, region FROM match_prompts")
+            rows = cursor.fetchall()
+        except (mysql.connector.OperationalError, mysql.connector.InterfaceError) as err:
+            conn.discard()  # lost connection: don't hand it to the next caller
+            logger.error(f"Error loading match prompts: {err}")
+            return False
+        except mysql.connector.Error as err:
+            logger.error(f"Error loading match prompts: {err}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+        self.load(rows, signature)
+        return True
@@ -0,0 +1,124 @@
+# records.py - Compact records for connected users, waiting entries and rooms
+
+import sys
+from enum import IntEnum
+
+
+class Gender(IntEnum):
+    OTHER = 0
+    MALE = 1
+    FEMALE = 2
+
+
+class Preference(IntEnum):
+    OTHER = 0
+    STRAIGHT = 1
+    GAY = 2
+    LESBIAN = 3
+    BISEXUAL = 4
+
+
+class Scope(IntEnum):
+    GLOBAL = 0
+    LOCAL = 1
+
+
+_GENDERS = {'male': Gender.MALE, 'female': Gender.FEMALE}
+_PREFERENCES = {'straight': Preference.STRAIGHT, 'gay': Preference.GAY,
+                'lesbian': Preference.LESBIAN, 'bisexual': Preference.BISEXUAL}
+
+
+def _lower(value):
+    return value.lower() if isinstance(value, str) else ''
+
+def parse_gender(value):
+    return _GENDERS.get(_lower(value), Gender.OTHER)
+
+def parse_preference(value):
+    return _PREFERENCES.get(_lower(value), Preference.OTHER)
+
+def parse_scope(value):
+    return Scope.LOCAL if value == 'local' else Scope.GLOBAL
+
+def parse_region(value):
+    # Regions are open-ended, so they are interned strings rather than an enum
+    return sys.intern(value) if isinstance(value, str) else 'global'
+
+
+class MatchProfile:
+    """
+    What matching reads from a client profile, parsed once at connect. `profile`
+    is the client's dict itself, kept by reference for the display fields (name,
+    photo, interests) that are only read when a room opens.
+    """
+
+    __slots__ = ('gender', 'preference', 'scope', 'region', 'interest_ids', 'profile')
+
+    def __init__(self, profile, interest_ids):
+        self.gender = parse_gender(profile.get('gender'))
+        self.preference = parse_preference(profile.get('datingPreference'))
+        self.scope = parse_scope(profile.get('dateScope', 'global'))
+        self.region = parse_region(profile.get('region', 'global'))
+        self.interest_ids = interest_ids
+        self.profile = profile
+
+    @property
+    def bucket_key(self):
+        return (self.gender, self.preference, self.scope, self.region)
+
+
+class UserSession:
+    """A socket connected to this worker."""
+
+    __slots__ = ('uid', 'ip', 'fingerprint', 'last_activity', 'match')
+
+    def __init__(self, uid, ip, fingerprint, last_activity, match):
+        self.uid = uid
+        self.ip = ip
+        self.fingerprint = fingerprint
+        self.last_activity = last_activity
+        self.match = match
+
+
+class WaitingEntry:
+    """A find-video-match request; shares the user's MatchProfile rather than copying the profile."""
+
+    __slots__ = ('sid', 'uid', 'ip', 'fingerprint', 'joined', 'match')
+
+    def __init__(self, sid, uid, ip, fingerprint, joined, match):
+        self.sid = sid
+        self.uid = uid
+        self.ip = ip
+        self.fingerprint = fingerprint
+        self.joined = joined
+        self.match = match
+
+    def to_dict(self):
+        """JSON-safe form for sharing across workers; interest ids are process-local and left out."""
+        return {'sid': self.sid, 'uid': self.uid, 'ip': self.ip, 'fingerprint': self.fingerprint,
+                'joined': self.joined, 'profile': self.match.profile}
+
+    @classmethod
+    def from_dict(cls, data, interest_registry):
+        profile = data['profile']
+        match = MatchProfile(profile, interest_registry.intern(profile.get('interests', [])))
+        return cls(data['sid'], data['uid'], data['ip'], data.get('fingerprint'), data.get('joined'), match)
+
+
+class Room:
+    """An open video room. Only the two sids are kept; profiles are not needed once it is announced."""
+
+    __slots__ = ('sids', 'created', 'status', 'prompt', 'decisions')
+
+    def __init__(self, sids, created, status, prompt, decisions=None):
+        self.sids = tuple(sids)
+        self.created = created
+        self.status = status
+        self.prompt = prompt
+        self.decisions = decisions if decisions is not None else {}
+
+    def partner_of(self, sid):
+        for other in self.sids:
+            if other != sid:
+                return other
+        return None
@@ -0,0 +1,79 @@
+# sessions.py - Per-connection auth sessions for Socket.IO events
+
+import threading
+import time
+
+
+class AuthSession:
+    """Verified identity and parsed profile bound to one Socket.IO sid."""
+
+    __slots__ = ('sid', 'uid', 'profile')
+
+    def __init__(self, sid, uid, profile):
+        self.sid = sid
+        self.uid = uid
+        self.profile = profile
+
+
+class AuthSessionStore:
+    """
+    Maps sid -> AuthSession so only the connect event pays for auth.get_user.
+    With a ttl > 0 a uid is re-verified against Firebase once its last check
+    is older than ttl seconds, so revoked accounts are cut off within ttl.
+    """
+
+    def __init__(self, ttl=0, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._sessions = {}     # sid -> AuthSession
+        self._sids_of = {}      # uid -> set of sids
+        self._verified_at = {}  # uid -> clock time of last Firebase check
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, sid):
+        return self._sessions.get(sid)
+
+    def bind(self, sid, uid, profile):
+        auth_session = AuthSession(sid, uid, profile)
+        with self._lock:
+            self._drop_locked(sid)
+            self._sessions[sid] = auth_session
+            self._sids_of.setdefault(uid, set()).add(sid)
+            self._verified_at[uid] = self._clock()
+        return auth_session
+
+    def drop(self, sid):
+        with self._lock:
+            return self._drop_locked(sid)
+
+    def _drop_locked(self, sid):
+        auth_session = self._sessions.pop(sid, None)
+        if auth_session is None: return None
+        sids = self._sids_of.get(auth_session.uid)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self._sids_of[auth_session.uid]
+                self._verified_at.pop(auth_session.uid, None)
+        return auth_session
+
+    def is_stale(self, auth_session):
+        if not self.ttl: return False
+        verified_at = self._verified_at.get(auth_session.uid, 0)
+        return self._clock() - verified_at > self.ttl
+
+    def mark_verified(self, uid):
+        with self._lock:
+            if uid in self._sids_of:
+                self._verified_at[uid] = self._clock()
+
+    def revoke(self, uid):
+        """Drops every session for a uid and returns the affected sids."""
+        with self._lock:
+            sids = list(self._sids_of.get(uid, ()))
+            for sid in sids:
+                self._drop_locked(sid)
+        return sids
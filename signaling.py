@@ -0,0 +1,58 @@
+# signaling.py - WebRTC signaling relay with ICE candidate batching
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IceCandidateBatcher:
+    """
+    Coalesces trickle-ICE candidates per (room, sender) over a short window and
+    delivers them as one 'ice-candidates' message. Recipients that did not
+    advertise batch support on connect (and every recipient when window is 0)
+    get the original per-candidate 'ice-candidate' event immediately.
+    """
+
+    def __init__(self, socketio, window=0.025, namespace='/'):
+        self.socketio = socketio
+        self.window = window
+        self.namespace = namespace
+        self.batch_capable = set()  # sids that understand 'ice-candidates'
+        self._pending = {}          # (room_id, sender_sid) -> (recipient_sid, [candidate, ...])
+        self.candidates_in = 0
+        self.messages_out = 0
+
+    def register(self, sid, batch_capable):
+        if batch_capable:
+            self.batch_capable.add(sid)
+
+    def forget(self, sid):
+        self.batch_capable.discard(sid)
+
+    def relay(self, room_id, sender_sid, recipient_sid, candidate):
+        self.candidates_in += 1
+
+        if not self.window or recipient_sid not in self.batch_capable:
+            self.socketio.emit('ice-candidate', {'candidate': candidate}, to=recipient_sid, namespace=self.namespace)
+            self.messages_out += 1
+            return
+
+        key = (room_id, sender_sid)
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = (recipient_sid, [candidate])
+            self.socketio.start_background_task(self._flush_later, key)
+        else:
+            pending[1].append(candidate)
+
+    def _flush_later(self, key):
+        self.socketio.sleep(self.window)
+        self.flush(key)
+
+    def flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None: return
+        recipient_sid, candidates = pending
+        self.socketio.emit('ice-candidates', {'candidates': candidates}, to=recipient_sid, namespace=self.namespace)
+        self.messages_out += 1
+        logger.info("Relayed %d ICE candidates in room %s", len(candidates), key[0], extra={'event': 'signaling', 'sid': key[1], 'room': key[0]})
@@ -0,0 +1,97 @@
+# startup.py - Startup steps run concurrently in the background, with readiness tracking
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupStep:
+    __slots__ = ('name', 'fn', 'requires', 'done', 'state', 'attempts', 'error', 'seconds')
+
+    def __init__(self, name, fn, requires):
+        self.name = name
+        self.fn = fn
+        self.requires = tuple(requires)
+        self.done = threading.Event()
+        self.state = 'pending'
+        self.attempts = 0
+        self.error = None
+        self.seconds = None  # from start() until the step succeeded
+
+
+class StartupOrchestrator:
+    """
+    Runs named startup steps in background tasks, each as soon as the steps it
+    requires have succeeded, so independent ones (Firebase, the database) come up
+    concurrently while the worker is already serving. A step succeeds by returning
+    anything but False; otherwise, or if it raises, it is retried after
+    retry_seconds, backing off to max_retry_seconds. ready(names) tells whether
+    the given steps have succeeded.
+
+    Uses threading.Event, so under eventlet monkey patching a step waiting on
+    another blocks only its own green thread.
+    """
+
+    def __init__(self, socketio, retry_seconds=1.0, max_retry_seconds=30.0, clock=time.monotonic):
+        self.socketio = socketio
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self._clock = clock
+        self._steps = {}
+        self.started = None
+
+    def step(self, name, fn, requires=()):
+        for required in requires:
+            if required not in self._steps:
+                raise ValueError(f"Startup step {name} requires unknown step {required}")
+        self._steps[name] = StartupStep(name, fn, requires)
+
+    def start(self):
+        self.started = self._clock()
+        for step in self._steps.values():
+            self.socketio.start_background_task(self._run, step)
+
+    def _run(self, step):
+        for required in step.requires:
+            self._steps[required].done.wait()
+        step.state = 'running'
+        delay = self.retry_seconds
+        while True:
+            step.attempts += 1
+            try:
+                ok = step.fn() is not False
+                step.error = None if ok else 'returned False'
+            except Exception as e:
+                ok = False
+                step.error = str(e)
+            if ok: break
+            logger.warning(f"Startup step {step.name} failed (attempt {step.attempts}), retrying in {delay:.0f}s: {step.error}")
+            self.socketio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_seconds)
+
+        step.seconds = self._clock() - self.started
+        step.state = 'ready'
+        step.done.set()
+        logger.info(f"Startup step {step.name} ready after {step.seconds:.3f}s ({step.attempts} attempts)")
+        if all(s.done.is_set() for s in self._steps.values()):
+            logger.info(f"Startup complete in {step.seconds:.3f}s")
+
+    def ready(self, names=None):
+        steps = self._steps.values() if names is None else (self._steps[name] for name in names)
+        return all(step.done.is_set() for step in steps)
+
+    def wait(self, names=None, timeout=None):
+        """Blocks (the calling green thread) until the steps are ready; False on timeout."""
+        deadline = None if timeout is None else self._clock() + timeout
+        for name in (self._steps if names is None else names):
+            remaining = None if deadline is None else max(0, deadline - self._clock())
+            if not self._steps[name].done.wait(remaining):
+                return False
+        return True
+
+    def status(self):
+        return {name: {'state': step.state, 'attempts': step.attempts, 'error': step.error,
+                       'seconds': step.seconds, 'requires': list(step.requires)}
+                for name, step in self._steps.items()}
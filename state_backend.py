@@ -0,0 +1,355 @@
+# state_backend.py - Where the user registry, waiting pool and rooms live: this process or shared Redis
+
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# redis is only needed for the shared backend
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from records import Room, WaitingEntry
+
+
+class LocalStateBackend:
+    """
+    Single-process state: the user registry is a dict here and matchmaking runs on
+    the in-process actor. The default; needs no external services.
+    """
+
+    def __init__(self, matchmaker):
+        self.matchmaker = matchmaker
+        self.users = {}  # sid -> UserSession, for sockets connected to this process
+        self._users_lock = threading.Lock()
+        self.reclaimed_users = 0
+
+    def start(self, socketio):
+        socketio.start_background_task(self.matchmaker.run)
+
+    def is_leader(self):
+        return True
+
+    def register_user(self, sid, record):
+        with self._users_lock:
+            self.users[sid] = record
+
+    def unregister_user(self, sid):
+        with self._users_lock:
+            self.users.pop(sid, None)
+
+    def get_user(self, sid):
+        return self.users.get(sid)
+
+    def user_count(self):
+        return len(self.users)
+
+    def is_connected(self, sid):
+        return sid in self.users
+
+    def sweep_users(self, is_live, idle_seconds):
+        """
+        Unregisters this process's users idle for idle_seconds whose socket is_live()
+        says is gone (a disconnect that never reached the handler). Returns their sids.
+        """
+        cutoff = time.time() - idle_seconds
+        gone = [sid for sid, user in list(self.users.items()) if user.last_activity < cutoff and not is_live(sid)]
+        for sid in gone:
+            self.unregister_user(sid)
+        self.reclaimed_users += len(gone)
+        return gone
+
+    def submit(self, command, *args):
+        self.matchmaker.submit(command, *args)
+
+    def command_backlog(self):
+        """Matchmaking commands submitted but not yet applied."""
+        return self.matchmaker.queue_depth()
+
+    def partner_in_room(self, sid, room_id):
+        """sid's partner if sid really is in room_id, else None."""
+        core = self.matchmaker.core
+        if not room_id or core.room_of.get(sid) != room_id: return None
+        return core.partner_of(sid)
+
+    def stats(self):
+        stats = self.matchmaker.stats()
+        stats['reclaimed_users'] = self.reclaimed_users
+        return stats
+
+
+class RedisStateBackend(LocalStateBackend):
+    """
+    State shared by several workers (one per core behind a sticky load balancer).
+
+    Each worker keeps its own sockets' records locally and lists their sids in Redis
+    for the global count. Matchmaking commands from every worker go onto one Redis
+    list, and the worker holding the leader lease feeds them to its actor, so matching
+    stays single-writer and global. The leader mirrors the waiting pool and rooms into
+    Redis: other workers check signaling against the mirror, and a worker that takes
+    over the lease restores its actor from it. Emits and room joins for sockets on
+    other workers go through Socket.IO's message queue.
+    """
+
+    def __init__(self, client, matchmaker, prefix='hushh:', lease_seconds=10, worker_id=None):
+        super().__init__(matchmaker)
+        self.redis = client
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or uuid.uuid4().hex[:12]
+        self.leader = False
+        self.takeovers = 0
+        self.reaped_workers = 0
+        self._socketio = None
+
+        core = matchmaker.core
+        core.pool = _MirroredPool(core.pool, self)
+        core.rooms = _MirroredRooms(self)
+
+    @classmethod
+    def from_url(cls, url, matchmaker, **kwargs):
+        if redis is None:
+            raise RuntimeError("The redis package is required for the redis state backend")
+        return cls(redis.Redis.from_url(url, decode_responses=True), matchmaker, **kwargs)
+
+    def _key(self, *parts):
+        return self.prefix + ':'.join(parts)
+
+    def start(self, socketio):
+        self._socketio = socketio
+        super().start(socketio)
+        socketio.start_background_task(self.run)
+
+    def is_leader(self):
+        return self.leader
+
+    # User registry
+
+    def register_user(self, sid, record):
+        super().register_user(sid, record)
+        self.redis.hset(self._key('users', self.worker_id), sid, record.uid)
+
+    def unregister_user(self, sid):
+        super().unregister_user(sid)
+        self.redis.hdel(self._key('users', self.worker_id), sid)
+
+    def user_count(self):
+        workers = self.redis.smembers(self._key('workers'))
+        pipe = self.redis.pipeline()
+        for worker_id in workers:
+            pipe.hlen(self._key('users', worker_id))
+        return sum(pipe.execute())
+
+    def is_connected(self, sid):
+        if sid in self.users: return True
+        workers = self.redis.smembers(self._key('workers'))
+        pipe = self.redis.pipeline()
+        for worker_id in workers:
+            pipe.hexists(self._key('users', worker_id), sid)
+        return any(pipe.execute())
+
+    # Matchmaking
+
+    def submit(self, command, *args):
+        if command not in self.matchmaker.COMMANDS:
+            raise ValueError(f"Unknown matchmaking command: {command}")
+        if command == 'join':
+            args = (args[0].to_dict(),) + args[1:]
+        self.redis.rpush(self._key('commands'), json.dumps([command, args]))
+
+    def command_backlog(self):
+        # Commands from every worker wait on the shared list, then briefly in the leader's actor queue
+        return self.redis.llen(self._key('commands')) + super().command_backlog()
+
+    def partner_in_room(self, sid, room_id):
+        if not room_id: return None
+        if self.leader:
+            return super().partner_in_room(sid, room_id)
+        raw = self.redis.hget(self._key('rooms'), room_id)
+        if raw is None: return None
+        users = json.loads(raw)['users']
+        if sid not in users: return None
+        return next((other for other in users if other != sid), None)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            'worker_id': self.worker_id,
+            'leader': self.leader,
+            'workers': self.redis.scard(self._key('workers')),
+            'shared_queue_depth': self.redis.llen(self._key('commands')),
+            'takeovers': self.takeovers,
+            'reaped_workers': self.reaped_workers,
+        })
+        return stats
+
+    # Leader lease and command pump
+
+    def run(self):
+        """Heartbeat/lease loop; every worker runs it, only the leader consumes commands."""
+        while True:
+            try:
+                self._heartbeat()
+                if self.leader:
+                    self._reap_dead_workers()
+                    self._pump(time.monotonic() + self.lease_seconds / 3)
+                else:
+                    self._socketio.sleep(1)
+            except Exception as e:
+                self.leader = False
+                logger.error(f"State backend loop error on worker {self.worker_id}: {e}", exc_info=True)
+                self._socketio.sleep(1)
+
+    def _heartbeat(self):
+        lease_ms = int(self.lease_seconds * 1000)
+        self.redis.set(self._key('worker', self.worker_id), 1, px=lease_ms)
+        self.redis.sadd(self._key('workers'), self.worker_id)
+
+        leader_key = self._key('leader')
+        if self.leader:
+            if self.redis.get(leader_key) == self.worker_id:
+                self.redis.pexpire(leader_key, lease_ms)
+            else:
+                self.leader = False
+                logger.warning(f"Worker {self.worker_id} lost the matchmaking lease")
+        elif self.redis.set(leader_key, self.worker_id, nx=True, px=lease_ms):
+            self._take_over()
+
+    def _take_over(self):
+        """Restores the previous leader's pool and rooms, then starts consuming commands."""
+        registry = self.matchmaker.core.pool.interest_registry
+        waiting = [WaitingEntry.from_dict(json.loads(raw), registry) for raw in self.redis.hvals(self._key('waiting'))]
+        rooms = {}
+        for room_id, raw in self.redis.hgetall(self._key('rooms')).items():
+            mirrored = json.loads(raw)
+            rooms[room_id] = Room(mirrored['users'], mirrored['created'], mirrored['status'], mirrored['prompt'])
+        self.leader = True
+        self.takeovers += 1
+        self.matchmaker.submit('restore', waiting, rooms)
+        logger.info(f"Worker {self.worker_id} is now the matchmaking leader ({len(waiting)} waiting, {len(rooms)} rooms restored)")
+
+    def _pump(self, until):
+        commands_key = self._key('commands')
+        while self.leader and time.monotonic() < until:
+            item = self.redis.blpop(commands_key, timeout=1)
+            if item is None: continue
+            command, args = json.loads(item[1])
+            if command == 'join':
+                args[0] = WaitingEntry.from_dict(args[0], self.matchmaker.core.pool.interest_registry)
+            self.matchmaker.submit(command, *args)
+
+    def _reap_dead_workers(self):
+        """Workers whose heartbeat expired: drop their users and take them out of matchmaking."""
+        for worker_id in self.redis.smembers(self._key('workers')):
+            if worker_id == self.worker_id or self.redis.exists(self._key('worker', worker_id)):
+                continue
+            users_key = self._key('users', worker_id)
+            sids = self.redis.hkeys(users_key)
+            for sid in sids:
+                self.matchmaker.submit('leave', sid)
+            self.redis.delete(users_key)
+            self.redis.srem(self._key('workers'), worker_id)
+            self.reaped_workers += 1
+            logger.warning(f"Worker {worker_id} stopped heartbeating; released {len(sids)} users")
+
+    # Mirror writes, made by the actor while this worker is leader
+
+    def _mirror_waiting(self, entry):
+        if self.leader:
+            self.redis.hset(self._key('waiting'), entry.sid, json.dumps(entry.to_dict()))
+
+    def _unmirror_waiting(self, sid):
+        if self.leader:
+            self.redis.hdel(self._key('waiting'), sid)
+
+    def _mirror_room(self, room_id, room_data):
+        if self.leader:
+            self.redis.hset(self._key('rooms'), room_id, json.dumps({
+                'users': list(room_data.sids),
+                'created': room_data.created,
+                'status': room_data.status,
+                'prompt': room_data.prompt,
+            }))
+
+    def _unmirror_room(self, room_id):
+        if self.leader:
+            self.redis.hdel(self._key('rooms'), room_id)
+
+
+class _MirroredPool:
+    """WaitingPool wrapper that mirrors membership into Redis."""
+
+    def __init__(self, pool, backend):
+        self._pool = pool
+        self._backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def __len__(self):
+        return len(self._pool)
+
+    def __contains__(self, sid):
+        return sid in self._pool
+
+    def __iter__(self):
+        return iter(self._pool)
+
+    def add(self, entry):
+        self._pool.add(entry)
+        self._backend._mirror_waiting(entry)
+
+    def remove(self, sid):
+        entry = self._pool.remove(sid)
+        if entry is not None:
+            self._backend._unmirror_waiting(sid)
+        return entry
+
+    def take(self, sid):
+        entry = self._pool.take(sid)
+        if entry is not None:
+            self._backend._unmirror_waiting(sid)
+        return entry
+
+    def pop_best(self, seeker):
+        entry = self._pool.pop_best(seeker)
+        if entry is not None:
+            self._backend._unmirror_waiting(entry.sid)
+        return entry
+
+
+class _MirroredRooms(dict):
+    """Active rooms dict that mirrors creation and removal into Redis."""
+
+    def __init__(self, backend):
+        super().__init__()
+        self._backend = backend
+
+    def __setitem__(self, room_id, room_data):
+        super().__setitem__(room_id, room_data)
+        self._backend._mirror_room(room_id, room_data)
+
+    def pop(self, room_id, *default):
+        room_data = super().pop(room_id, *default)
+        if room_data is not None:
+            self._backend._unmirror_room(room_id)
+        return room_data
+
+
+def run_standin(host='127.0.0.1', port=6379):
+    """Serves an in-memory Redis stand-in (fakeredis) for running several workers locally."""
+    from fakeredis import TcpFakeServer
+    server = TcpFakeServer((host, port), server_type='redis')
+    logger.info(f"Redis stand-in listening on {host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    run_standin(port=int(sys.argv[1]) if len(sys.argv) > 1 else 6379)
@@ -0,0 +1,110 @@
+# static_assets.py - Fingerprinted, precompressed in-memory assets
+
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response
+
+# brotli is optional; without it only gzip variants are built
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/manifest+json', 'image/svg+xml')
+IMMUTABLE_MAX_AGE = 31536000  # one year
+
+
+class StaticAsset:
+    def __init__(self, name, mimetype, fingerprint, variants):
+        self.name = name
+        self.mimetype = mimetype
+        self.fingerprint = fingerprint
+        self.variants = variants  # encoding ('identity', 'gzip', 'br') -> bytes
+
+
+class AssetPipeline:
+    """
+    Holds assets in memory, each fingerprinted by content hash and precompressed
+    once with gzip (and brotli when installed). respond() picks the variant the
+    client accepts and answers conditional requests with 304.
+    """
+
+    def __init__(self, min_compress_size=256):
+        self.min_compress_size = min_compress_size
+        self.assets = {}        # name -> StaticAsset
+        self.fingerprinted = {} # 'name.<fingerprint>.ext' -> StaticAsset
+
+    def build(self, root, names):
+        """Loads and compresses the named files from root; call once at startup."""
+        for name in names:
+            with open(os.path.join(root, name), 'rb') as f:
+                self.add(name, f.read())
+        return self
+
+    def add(self, name, data, mimetype=None):
+        mimetype = mimetype or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        fingerprint = hashlib.sha256(data).hexdigest()[:12]
+
+        variants = {'identity': data}
+        if len(data) >= self.min_compress_size and mimetype.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    variants['br'] = compressed
+
+        old = self.assets.get(name)
+        if old is not None:
+            self.fingerprinted.pop(self.fingerprinted_name(old), None)
+        asset = StaticAsset(name, mimetype, fingerprint, variants)
+        self.assets[name] = asset
+        self.fingerprinted[self.fingerprinted_name(asset)] = asset
+        return asset
+
+    @staticmethod
+    def fingerprinted_name(asset):
+        stem, ext = os.path.splitext(asset.name)
+        return f"{stem}.{asset.fingerprint}{ext}"
+
+    def get(self, name):
+        return self.assets.get(name)
+
+    def url(self, name):
+        """Versioned URL for name (falls back to the plain path for unknown files)."""
+        asset = self.assets.get(name)
+        if asset is None: return f"/{name}"
+        return f"/{self.fingerprinted_name(asset)}"
+
+    def lookup(self, filename):
+        """(asset, is_fingerprinted) for a requested filename, or (None, False)."""
+        asset = self.fingerprinted.get(filename)
+        if asset is not None: return asset, True
+        return self.assets.get(filename), False
+
+    def respond(self, asset, request, immutable=False):
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+
+        response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        # Each encoding is a different byte sequence, so each gets its own strong ETag
+        response.set_etag(asset.fingerprint if encoding == 'identity' else f"{asset.fingerprint}-{encoding}")
+
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+
+        return response.make_conditional(request)
@@ -0,0 +1,136 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_controller(clock, limits=None, **kwargs):
+    limits = limits or {'find-video-match': {'sid': (0.5, 3), 'ip': (5, 30)}}
+    return AdmissionController(limits, clock=clock, **kwargs)
+
+
+def test_burst_then_rejected_with_retry_after():
+    clock = FakeClock()
+    admission = make_controller(clock)
+    for _ in range(3):
+        assert admission.check('find-video-match', 'a', '10.0.0.1') is None
+    rejection = admission.check('find-video-match', 'a', '10.0.0.1')
+    assert (rejection.reason, rejection.notify) == ('sid', True)
+    assert rejection.retry_after == 2.0
+
+    clock.now += 2
+    assert admission.check('find-video-match', 'a', '10.0.0.1') is None
+
+
+def test_unlimited_events_pass():
+    admission = make_controller(FakeClock())
+    for _ in range(100):
+        assert admission.check('video-offer', 'a', '10.0.0.1') is None
+
+
+def test_repeats_are_silent_until_retry_time():
+    clock = FakeClock()
+    admission = make_controller(clock)
+    for _ in range(3):
+        admission.check('find-video-match', 'a')
+    assert admission.check('find-video-match', 'a').notify
+    assert not admission.check('find-video-match', 'a').notify
+    clock.now += 1
+    assert not admission.check('find-video-match', 'a').notify
+
+
+def test_every_sid_behind_one_ip_is_told_to_retry():
+    clock = FakeClock()
+    admission = make_controller(clock, {'find-video-match': {'sid': (0.5, 3), 'ip': (1, 4)}})
+    sids = [f'sid-{n}' for n in range(33)]
+    for sid in sids:
+        admission.register(sid, '203.0.113.7')
+
+    results = [admission.check('find-video-match', sid) for sid in sids]
+    assert results[:4] == [None] * 4
+    rejected = results[4:]
+    assert all(r.reason == 'ip' for r in rejected)
+    assert all(r.notify for r in rejected)
+
+
+def test_retry_into_a_drained_ip_bucket_is_notified_again():
+    clock = FakeClock()
+    admission = make_controller(clock, {'find-video-match': {'ip': (1, 1)}})
+    admission.register('a', '203.0.113.7')
+    admission.register('b', '203.0.113.7')
+
+    assert admission.check('find-video-match', 'a') is None
+    first = admission.check('find-video-match', 'b')
+    assert first.notify
+
+    # a takes the token that refilled just before b retries as told
+    clock.now += first.retry_after
+    assert admission.check('find-video-match', 'a') is None
+    retry = admission.check('find-video-match', 'b')
+    assert retry.reason == 'ip' and retry.notify
+
+
+def test_admission_resets_the_notice():
+    clock = FakeClock()
+    admission = make_controller(clock)
+    for _ in range(3):
+        admission.check('find-video-match', 'a')
+    assert admission.check('find-video-match', 'a').notify
+    clock.now += 2
+    assert admission.check('find-video-match', 'a') is None
+    assert admission.check('find-video-match', 'a').notify
+
+
+def test_forget_drops_sid_state_but_not_ip_buckets():
+    clock = FakeClock()
+    admission = make_controller(clock, {'find-video-match': {'sid': (0.5, 1), 'ip': (1, 2)}})
+    admission.register('a', '203.0.113.7')
+    assert admission.check('find-video-match', 'a') is None
+    assert admission.check('find-video-match', 'a').reason == 'sid'
+
+    admission.forget('a')
+    admission.register('a2', '203.0.113.7')
+    assert admission.check('find-video-match', 'a2') is None
+    assert admission.check('find-video-match', 'a3', '203.0.113.7').reason == 'ip'
+    assert admission.stats()['sid_buckets'] == 2
+
+
+def test_sweep_drops_refilled_ip_buckets():
+    clock = FakeClock()
+    admission = make_controller(clock)
+    admission.check('find-video-match', 'a', '10.0.0.1')
+    assert admission.sweep() == 0
+    clock.now += 1
+    assert admission.sweep() == 1
+    assert admission.stats()['ip_buckets'] == 0
+
+
+def test_shed_follows_the_backlog():
+    backlog = [0]
+    rejections = []
+    admission = make_controller(FakeClock(), backlog=lambda: backlog[0], max_backlog=10,
+                                shed_retry_seconds=1.5, on_reject=rejections.append)
+    assert admission.shed('find-video-match') is None
+    backlog[0] = 10
+    rejection = admission.shed('find-video-match')
+    assert (rejection.reason, rejection.retry_after, rejection.notify) == ('overload', 1.5, True)
+    assert admission.shed('find-video-match').notify
+    assert len(rejections) == 2
+    backlog[0] = 9
+    assert admission.shed('find-video-match') is None
+
+
+def test_no_backlog_limit_never_sheds():
+    admission = make_controller(FakeClock())
+    assert admission.shed('find-video-match') is None
+    assert admission.stats()['max_backlog'] is None
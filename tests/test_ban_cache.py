@@ -0,0 +1,172 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ban_cache
+from ban_cache import BanCache
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)  # naive UTC, as the driver returns DATETIME columns
+
+
+class FakeDatabase:
+    """banned_ips rows as (ip, fingerprint, ban_expires, reason, ads_watched, updated_at)."""
+
+    def __init__(self):
+        self.rows = []
+        self.now = NOW
+        self.queries = []
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, query, params=None):
+        db = self.db
+        db.queries.append((query, params))
+        if query == "SELECT NOW()":
+            self.result = [(db.now,)]
+        elif 'updated_at >=' in query:
+            self.result = [row[:5] for row in db.rows if row[5] >= params[0]]
+        elif 'FROM banned_ips WHERE ban_expires IS NULL' in query:
+            self.result = [row[:5] for row in db.rows if row[2] is None or row[2] > db.now]
+        else:
+            self.result = []
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FrozenDatetime(datetime):
+    frozen = NOW.replace(tzinfo=timezone.utc)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.frozen
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(ban_cache, 'datetime', FrozenDatetime)
+    FrozenDatetime.frozen = NOW.replace(tzinfo=timezone.utc)
+    return FrozenDatetime
+
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+
+def test_full_load_answers_from_memory(db, clock):
+    db.rows = [
+        ('1.1.1.1', 'fp', None, 'spam', 2, NOW),
+        ('2.2.2.2', 'fp', NOW + timedelta(minutes=30), 'abuse', 0, NOW),
+        ('3.3.3.3', 'fp', NOW - timedelta(minutes=1), 'old', 0, NOW),
+    ]
+    cache = BanCache(db.connect)
+    assert cache.refresh()
+    assert len(cache) == 2
+    assert cache.check('1.1.1.1', 'fp') == (True, 999999, 'spam', 2)
+    assert cache.check('2.2.2.2', 'fp') == (True, 30, 'abuse', 0)
+    assert cache.check('3.3.3.3', 'fp') == (False, 0, None, 0)
+    assert cache.check('1.1.1.1', 'other') == (False, 0, None, 0)
+
+
+def test_incremental_refresh_reads_from_the_watermark(db, clock):
+    cache = BanCache(db.connect)
+    cache.refresh()
+    db.now = NOW + timedelta(seconds=15)
+    db.rows.append(('4.4.4.4', 'fp', None, 'new', 0, db.now))
+    assert cache.refresh()
+
+    query, params = db.queries[-1]
+    assert 'updated_at >=' in query
+    assert params == (NOW - timedelta(seconds=1),)
+    assert cache.check('4.4.4.4', 'fp')[0]
+
+
+def test_expired_bans_are_pruned(db, clock):
+    db.rows = [('2.2.2.2', 'fp', NOW + timedelta(minutes=5), 'abuse', 0, NOW)]
+    cache = BanCache(db.connect)
+    cache.refresh()
+    assert len(cache) == 1
+
+    clock.frozen += timedelta(minutes=6)
+    assert cache.check('2.2.2.2', 'fp') == (False, 0, None, 0)
+    cache.refresh()
+    assert len(cache) == 0
+
+
+def test_extended_ban_survives_its_old_expiry(db, clock):
+    db.rows = [('2.2.2.2', 'fp', NOW + timedelta(minutes=5), 'abuse', 0, NOW)]
+    cache = BanCache(db.connect)
+    cache.refresh()
+    db.rows = [('2.2.2.2', 'fp', NOW + timedelta(minutes=60), 'abuse', 0, NOW)]
+    cache.refresh()
+
+    clock.frozen += timedelta(minutes=6)
+    cache.refresh()
+    assert cache.check('2.2.2.2', 'fp')[0]
+
+
+def test_full_reload_drops_deleted_rows(db, clock):
+    db.rows = [('1.1.1.1', 'fp', None, 'spam', 0, NOW)]
+    cache = BanCache(db.connect)
+    cache.refresh()
+    db.rows = []
+    cache.refresh(full=True)
+    assert len(cache) == 0
+
+
+def test_full_reload_never_shows_a_partial_set(db, clock, monkeypatch):
+    db.rows = [(f'10.0.0.{n}', 'fp', None, 'spam', 0, NOW) for n in range(20)]
+    cache = BanCache(db.connect)
+    cache.refresh()
+
+    # A lookup between every row of the next full reload still sees every ban
+    seen = []
+    store = cache._store_locked
+    def store_and_check(*args):
+        seen.append(all(cache.check(f'10.0.0.{n}', 'fp')[0] for n in range(20)))
+        store(*args)
+    monkeypatch.setattr(cache, '_store_locked', store_and_check)
+    cache.refresh(full=True)
+    assert seen and all(seen)
+    assert len(cache) == 20
+
+
+def test_ban_and_unban_write_through(db, clock):
+    cache = BanCache(db.connect)
+    cache.refresh()
+    assert cache.ban('5.5.5.5', 'fp', 'manual', duration_minutes=10)
+    assert cache.check('5.5.5.5', 'fp')[:3] == (True, 10, 'manual')
+    assert cache.unban('5.5.5.5', 'fp')
+    assert not cache.check('5.5.5.5', 'fp')[0]
@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from count_publisher import CountPublisher
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data=None, to=None):
+        self.emitted.append((event, data, to))
+
+
+def test_flushes_only_when_dirty():
+    socketio = FakeSocketIO()
+    count = [3]
+    publisher = CountPublisher(socketio, 'updateUserCount', lambda: count[0])
+    assert not publisher.flush()
+    publisher.mark_dirty()
+    assert publisher.flush()
+    assert socketio.emitted == [('updateUserCount', 3, None)]
+    assert not publisher.flush()
+
+
+def test_coalesces_changes_between_flushes():
+    socketio = FakeSocketIO()
+    count = [0]
+    publisher = CountPublisher(socketio, 'updateUserCount', lambda: count[0], room='user-count')
+    for _ in range(50):
+        count[0] += 1
+        publisher.mark_dirty()
+    publisher.flush()
+    assert socketio.emitted == [('updateUserCount', 50, 'user-count')]
+
+
+def test_skips_unchanged_values():
+    socketio = FakeSocketIO()
+    publisher = CountPublisher(socketio, 'updateUserCount', lambda: 7)
+    publisher.mark_dirty()
+    publisher.flush()
+    publisher.mark_dirty()
+    assert not publisher.flush()
+    assert publisher.flushes == 1
+
+
+def test_active_fn_polls_every_flush():
+    socketio = FakeSocketIO()
+    count = [1]
+    leader = [False]
+    publisher = CountPublisher(socketio, 'updateUserCount', lambda: count[0], active_fn=lambda: leader[0])
+    publisher.mark_dirty()
+    assert not publisher.flush()
+
+    # A change made on another worker is published without mark_dirty()
+    leader[0] = True
+    assert publisher.flush()
+    count[0] = 2
+    assert publisher.flush()
+    assert [data for _, data, _ in socketio.emitted] == [1, 2]
@@ -0,0 +1,185 @@
+import os
+import sys
+import threading
+import time
+
+import mysql.connector
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ban_cache import BanCache
+from db_pool import ConnectionPool, PoolTimeout
+from prompt_index import PromptIndex
+
+
+class FakeCursor:
+    def __init__(self, conn, dictionary=False):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        if self.conn.error is not None:
+            raise self.conn.error
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.alive = True
+        self.in_transaction = False
+        self.rolled_back = 0
+        self.error = None
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self, dictionary)
+
+    def rollback(self):
+        self.rolled_back += 1
+        self.in_transaction = False
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise mysql.connector.InterfaceError("gone")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def make_pool(opened):
+    def make_pool(**kwargs):
+        def connect():
+            conn = FakeConnection(len(opened))
+            opened.append(conn)
+            return conn
+        return ConnectionPool(connect, **kwargs)
+    return make_pool
+
+
+def test_connections_are_reused(make_pool, opened):
+    pool = make_pool(size=2)
+    conn = pool.connection()
+    conn.close()
+    with pool.connection() as again:
+        assert again.number == 0
+    assert len(opened) == 1
+    assert pool.stats()['idle'] == 1
+
+
+def test_discarded_connection_is_replaced(make_pool, opened):
+    pool = make_pool(size=1, timeout=0.05)
+    conn = pool.connection()
+    conn.discard()
+    assert opened[0].closed
+
+    # The slot was given back: the next checkout opens a fresh connection instead of timing out
+    with pool.connection() as fresh:
+        assert fresh.number == 1
+    assert pool.stats()['dropped'] == 1
+    assert pool.stats()['open'] == 1
+
+
+def test_discard_hands_the_slot_to_a_waiter(make_pool, opened):
+    pool = make_pool(size=1, timeout=5)
+    conn = pool.connection()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.connection()))
+    waiter.start()
+    while not pool.stats()['waiters']:
+        time.sleep(0.001)
+    conn.discard()
+    waiter.join(5)
+    assert got and got[0].number == 1
+
+
+def test_exhausted_pool_times_out(make_pool):
+    pool = make_pool(size=1, timeout=0.01)
+    pool.connection()
+    with pytest.raises(PoolTimeout):
+        pool.connection()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_checkin_rolls_back_open_transaction(make_pool, opened):
+    pool = make_pool(size=1)
+    conn = pool.connection()
+    opened[0].in_transaction = True
+    conn.close()
+    assert opened[0].rolled_back == 1
+    assert pool.stats()['rollbacks'] == 1
+
+
+def test_stale_idle_connection_is_validated(make_pool, opened):
+    clock = FakeClock()
+    pool = make_pool(size=1, validate_idle_seconds=30, clock=clock)
+    pool.connection().close()
+    opened[0].alive = False
+    clock.now += 31
+    with pool.connection() as conn:
+        assert conn.number == 1
+
+
+def test_check_idle_closes_dead_and_surplus(make_pool, opened):
+    clock = FakeClock()
+    pool = make_pool(size=4, min_idle=2, max_idle_seconds=60, clock=clock)
+    assert pool.warm(3) == 3
+    opened[2].alive = False
+    clock.now += 61
+    # The oldest is past max_idle beyond min_idle, the newest is dead
+    assert pool.check_idle() == 2
+    assert pool.stats()['open'] == 1
+    with pool.connection() as conn:
+        assert conn.number == 1
+
+
+@pytest.mark.parametrize('error', [mysql.connector.OperationalError("lost"), mysql.connector.InterfaceError("gone")])
+def test_ban_cache_discards_lost_connection(make_pool, opened, error):
+    pool = make_pool(size=1, timeout=0.05)
+    pool.warm(1)
+    opened[0].error = error
+    assert BanCache(pool.connection).refresh() is False
+    assert opened[0].closed
+    with pool.connection() as conn:
+        assert conn.number == 1
+
+
+def test_ban_cache_keeps_connection_on_query_error(make_pool, opened):
+    pool = make_pool(size=1, timeout=0.05)
+    pool.warm(1)
+    opened[0].error = mysql.connector.ProgrammingError("bad query")
+    assert BanCache(pool.connection).refresh() is False
+    assert not opened[0].closed
+    assert pool.stats()['idle'] == 1
+
+
+def test_prompt_reload_discards_lost_connection(make_pool, opened):
+    pool = make_pool(size=1, timeout=0.05)
+    pool.warm(1)
+    opened[0].error = mysql.connector.OperationalError("lost")
+    assert PromptIndex().reload_from_db(pool.connection) is False
+    assert opened[0].closed
+    with pool.connection() as conn:
+        assert conn.number == 1
@@ -0,0 +1,118 @@
+import os
+import sys
+from io import BytesIO
+
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_pipeline import ImagePipeline, process_photo, read_capped
+
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+
+
+def encode(image, format='JPEG', **params):
+    out = BytesIO()
+    image.save(out, format, **params)
+    return out.getvalue()
+
+
+def decode(data):
+    image = Image.open(BytesIO(data))
+    image.load()
+    return image
+
+
+def split_image(width, height):
+    """Red left half, blue right half."""
+    image = Image.new('RGB', (width, height), BLUE)
+    image.paste(RED, (0, 0, width // 2, height))
+    return image
+
+
+def close_to(pixel, color, tolerance=40):
+    return all(abs(a - b) <= tolerance for a, b in zip(pixel, color))
+
+
+class CountingStream:
+    def __init__(self, data):
+        self.stream = BytesIO(data)
+        self.reads = 0
+
+    def read(self, size):
+        self.reads += 1
+        return self.stream.read(size)
+
+
+def test_read_capped_returns_body_within_cap():
+    assert read_capped(BytesIO(b'x' * 100), 100, chunk_size=16) == b'x' * 100
+    assert read_capped(BytesIO(b''), 100) == b''
+
+
+def test_read_capped_stops_at_the_cap():
+    stream = CountingStream(b'x' * 10000)
+    assert read_capped(stream, 100, chunk_size=64) is None
+    assert stream.reads == 2
+
+
+def test_decompression_bombs_are_rejected(monkeypatch):
+    data = encode(split_image(400, 300), 'PNG')
+    # Pillow refuses images over twice MAX_IMAGE_PIXELS before decoding them
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 400 * 300 // 3)
+    with pytest.raises(Image.DecompressionBombError):
+        process_photo(data)
+
+
+def test_large_photo_is_downscaled_with_thumbnail():
+    photo, thumbnail = process_photo(encode(split_image(4000, 3000)), max_side=1280, thumb_side=256)
+    photo, thumbnail = decode(photo), decode(thumbnail)
+    assert photo.format == 'JPEG' and photo.size == (1280, 960)
+    assert thumbnail.size == (256, 192)
+
+
+def test_small_photo_is_not_upscaled():
+    photo, thumbnail = process_photo(encode(split_image(300, 200)), max_side=1280, thumb_side=256)
+    assert decode(photo).size == (300, 200)
+    assert decode(thumbnail).size == (256, 171)
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # stored sideways: display rotated 90 degrees clockwise
+    photo, _ = process_photo(encode(split_image(400, 200), exif=exif.tobytes()))
+    photo = decode(photo)
+    assert photo.size == (200, 400)
+    # The red left half ends up on top
+    assert close_to(photo.getpixel((100, 50)), RED)
+    assert close_to(photo.getpixel((100, 350)), BLUE)
+    assert 0x0112 not in photo.getexif()
+
+
+def test_transparent_png_becomes_rgb_jpeg():
+    image = Image.new('RGBA', (64, 64), (0, 255, 0, 128))
+    photo, _ = process_photo(encode(image, 'PNG'))
+    photo = decode(photo)
+    assert photo.format == 'JPEG' and photo.mode == 'RGB'
+
+
+@pytest.mark.parametrize('data', [b'', b'not an image', b'<svg xmlns="http://www.w3.org/2000/svg"/>'])
+def test_non_images_are_rejected(data):
+    with pytest.raises(UnidentifiedImageError):
+        process_photo(data)
+
+
+def test_truncated_jpeg_is_rejected():
+    data = encode(split_image(400, 300))
+    with pytest.raises(ValueError):
+        process_photo(data[:len(data) // 2])
+
+
+def test_pipeline_matches_process_photo():
+    pipeline = ImagePipeline(workers=1, max_side=100, thumb_side=50)
+    photo, thumbnail = pipeline.process(encode(split_image(400, 200)))
+    assert decode(photo).size == (100, 50)
+    assert decode(thumbnail).size == (50, 25)
+    with pytest.raises(UnidentifiedImageError):
+        pipeline.process(b'not an image')
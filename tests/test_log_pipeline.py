@@ -0,0 +1,116 @@
+import io
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_pipeline
+from log_pipeline import SamplingFilter, setup_logging
+
+
+@pytest.fixture
+def pipeline():
+    """setup_logging() on the root logger, undone afterwards; yields (start, records)."""
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    stream = io.StringIO()
+    handlers = []
+
+    def start(**kwargs):
+        queue_handler, listener = setup_logging(stream=stream, **kwargs)
+        handlers.append(listener)
+        return queue_handler
+
+    def records():
+        for listener in handlers:
+            listener.stop()
+        handlers.clear()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield start, records
+    for listener in handlers:
+        listener.stop()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in saved_handlers:
+        root.addHandler(handler)
+    root.setLevel(saved_level)
+
+
+def record(event=None, level=logging.INFO):
+    rec = logging.LogRecord('test', level, __file__, 1, 'message', None, None)
+    if event is not None:
+        rec.event = event
+    return rec
+
+
+def test_json_lines_with_structured_fields(pipeline):
+    start, records = pipeline
+    start()
+    logging.getLogger('app').info("User %s joined", 'sid-1', extra={'event': 'waiting', 'sid': 'sid-1', 'uid': 'u1'})
+    [line] = records()
+    assert line['msg'] == 'User sid-1 joined'
+    assert (line['level'], line['logger'], line['event'], line['sid'], line['uid']) == ('INFO', 'app', 'waiting', 'sid-1', 'u1')
+    assert 'room' not in line and 'exc' not in line
+
+
+def test_traceback_is_its_own_field(pipeline):
+    start, records = pipeline
+    start()
+    try:
+        raise ZeroDivisionError('nope')
+    except ZeroDivisionError:
+        logging.getLogger('app').exception("Failed for %s", 'sid-1', extra={'event': 'db'})
+    [line] = records()
+    assert line['msg'] == 'Failed for sid-1'
+    assert line['exc'].startswith('Traceback') and 'ZeroDivisionError: nope' in line['exc']
+
+
+def test_sampling_filter_applies_through_the_pipeline(pipeline):
+    start, records = pipeline
+    start(sample_rates={'signaling': 0.0}, rate_limits={'waiting': 2})
+    log = logging.getLogger('app')
+    for n in range(5):
+        log.info("relay %d", n, extra={'event': 'signaling'})
+        log.info("wait %d", n, extra={'event': 'waiting'})
+    log.warning("relay failed", extra={'event': 'signaling'})
+    log.info("untagged")
+    assert [line['msg'] for line in records()] == ['wait 0', 'wait 1', 'relay failed', 'untagged']
+
+
+def test_sample_rates():
+    keep_all = SamplingFilter({'signaling': 1.0})
+    keep_none = SamplingFilter({'signaling': 0.0})
+    assert all(keep_all.filter(record('signaling')) for _ in range(100))
+    assert not any(keep_none.filter(record('signaling')) for _ in range(100))
+    assert keep_none.dropped == 100
+
+
+def test_rate_limit_resets_each_second(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(log_pipeline.time, 'monotonic', lambda: now[0])
+    limited = SamplingFilter(rate_limits={'db': 3})
+    assert [limited.filter(record('db')) for _ in range(5)] == [True, True, True, False, False]
+    now[0] += 1
+    assert limited.filter(record('db'))
+    assert limited.dropped == 2
+
+
+def test_warnings_and_untagged_records_always_pass():
+    keep_none = SamplingFilter({'signaling': 0.0}, {'db': 0})
+    assert keep_none.filter(record('signaling', logging.WARNING))
+    assert keep_none.filter(record('db', logging.ERROR))
+    assert keep_none.filter(record())
+
+
+def test_full_queue_drops_instead_of_blocking(pipeline):
+    start, records = pipeline
+    queue_handler = start(max_queue=1)
+    records()  # stop the writer so nothing drains the queue
+    for _ in range(3):
+        queue_handler.enqueue(record())
+    assert queue_handler.overflowed == 2
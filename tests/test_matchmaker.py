@@ -0,0 +1,305 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matchmaker
+from matchmaker import MatchmakingActor, MatchmakingCore
+from matchmaking import InterestRegistry, WaitingPool
+from records import MatchProfile, Room, WaitingEntry
+from timer_wheel import TimerWheel
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeOutbox:
+    """Records what the core sends instead of talking to Socket.IO."""
+
+    def __init__(self):
+        self.emitted = []
+        self.rooms = {}
+
+    def emit(self, event, data=None, to=None):
+        self.emitted.append((event, data, to))
+
+    def join_room(self, room_id, sid):
+        self.rooms.setdefault(room_id, set()).add(sid)
+
+    def leave_room(self, room_id, sid):
+        self.rooms.get(room_id, set()).discard(sid)
+
+    def events(self, to=None):
+        return [event for event, _, recipient in self.emitted if to is None or recipient == to]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Both the timer wheel and the core's wall-clock reads follow one fake clock
+    clock = FakeClock()
+    monkeypatch.setattr(matchmaker.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def registry():
+    return InterestRegistry()
+
+
+def make_core(clock, connected=None, **kwargs):
+    outbox = FakeOutbox()
+    room_ids = iter(f'room-{n}' for n in range(1000))
+    core = MatchmakingCore(
+        WaitingPool(clock=clock), {}, outbox,
+        prompt_picker=lambda region: 'Favourite city?', room_id_factory=lambda: next(room_ids),
+        timers=TimerWheel(tick=0.5, clock=clock),
+        is_connected=(lambda sid: sid in connected) if connected is not None else None,
+        timed_date_delay=3, timed_date_deadline=180, wait_check_interval=30, max_wait=600,
+        **kwargs)
+    return core, outbox
+
+
+def make_entry(registry, sid, gender, clock, interests=('music',), uid=None, ip=None):
+    profile = {'name': sid, 'gender': gender, 'datingPreference': 'straight', 'interests': list(interests)}
+    match = MatchProfile(profile, registry.intern(profile['interests']))
+    return WaitingEntry(sid, uid or f'uid-{sid}', ip or f'ip-{sid}', None, clock(), match)
+
+
+def advance(core, clock, seconds):
+    clock.now += seconds
+    core.tick()
+
+
+def test_join_queues_then_pairs(clock, registry):
+    core, outbox = make_core(clock)
+
+    assert core.join(make_entry(registry, 'a', 'male', clock)) is None
+    assert 'a' in core.pool
+    assert outbox.events(to='a') == ['video-waiting']
+
+    room_id = core.join(make_entry(registry, 'b', 'female', clock))
+    assert room_id == 'room-0'
+    assert len(core.pool) == 0
+    assert core.rooms[room_id].sids == ('b', 'a')
+    assert core.partner_of('a') == 'b'
+    assert outbox.rooms[room_id] == {'a', 'b'}
+
+    matched = {to: data for event, data, to in outbox.emitted if event == 'video-matched'}
+    assert matched['b']['initiator'] is True and matched['b']['remote_name'] == 'a'
+    assert matched['a']['initiator'] is False and matched['a']['remote_name'] == 'b'
+    assert matched['a']['shared_interests'] == 'music'
+
+
+def test_incompatible_users_both_wait(clock, registry):
+    core, outbox = make_core(clock)
+    core.join(make_entry(registry, 'a', 'male', clock))
+    core.join(make_entry(registry, 'b', 'male', clock))
+    assert len(core.pool) == 2
+    assert not core.rooms
+
+
+def test_same_ip_is_not_paired(clock, registry):
+    core, outbox = make_core(clock)
+    core.join(make_entry(registry, 'a', 'male', clock, ip='10.0.0.1'))
+    assert core.join(make_entry(registry, 'b', 'female', clock, ip='10.0.0.1')) is None
+    assert len(core.pool) == 2
+
+
+def test_timed_date_starts_after_delay(clock, registry):
+    core, outbox = make_core(clock)
+    core.join(make_entry(registry, 'a', 'male', clock))
+    room_id = core.join(make_entry(registry, 'b', 'female', clock))
+
+    advance(core, clock, 1)
+    assert 'start_timed_date' not in outbox.events()
+    advance(core, clock, 3)
+    assert ('start_timed_date', {'prompt': 'Favourite city?'}, room_id) in outbox.emitted
+
+
+def test_both_continue_keeps_the_room(clock, registry):
+    core, outbox = make_core(clock)
+    core.join(make_entry(registry, 'a', 'male', clock))
+    room_id = core.join(make_entry(registry, 'b', 'female', clock))
+
+    core.decision('a', room_id, 'continue')
+    assert outbox.events(to='b')[-1] == 'match_decision_received'
+    core.decision('b', room_id, 'continue')
+    assert core.rooms[room_id].status == 'matched'
+    assert outbox.events(to=room_id)[-1] == 'paired_match'
+
+    # A matched room outlives the timed-date deadline
+    advance(core, clock, 200)
+    assert room_id in core.rooms
+
+
+def test_decline_ends_date_and_both_can_requeue(clock, registry):
+    core, outbox = make_core(clock)
+    a, b = make_entry(registry, 'a', 'male', clock), make_entry(registry, 'b', 'female', clock)
+    core.join(a)
+    room_id = core.join(b)
+
+    core.decision('a', room_id, 'end')
+    assert room_id not in core.rooms
+    assert core.room_of == {}
+    assert outbox.events(to='a')[-1] == 'video-user-disconnected'
+    assert outbox.events(to='b')[-1] == 'video-user-disconnected'
+    assert outbox.rooms[room_id] == set()
+
+    core.join(a)
+    assert core.join(b) == 'room-1'
+
+
+def test_decision_for_another_room_is_ignored(clock, registry):
+    core, outbox = make_core(clock)
+    core.join(make_entry(registry, 'a', 'male', clock))
+    room_id = core.join(make_entry(registry, 'b', 'female', clock))
+    core.decision('c', room_id, 'end')
+    core.decision('a', 'room-99', 'end')
+    assert room_id in core.rooms
+
+
+def test_timed_date_deadline_ends_the_date(clock, registry):
+    core, outbox = make_core(clock)
+    core.join(make_entry(registry, 'a', 'male', clock))
+    room_id = core.join(make_entry(registry, 'b', 'female', clock))
+    core.decision('a', room_id, 'continue')
+
+    advance(core, clock, 179)
+    assert room_id in core.rooms
+    advance(core, clock, 2)
+    assert room_id not in core.rooms
+    assert core.reclaimed['timed_dates'] == 1
+    assert outbox.events(to='a')[-1] == 'video-user-disconnected'
+    assert outbox.events(to='b')[-1] == 'video-user-disconnected'
+
+
+def test_wait_expires_after_max_wait(clock, registry):
+    core, outbox = make_core(clock)
+    core.join(make_entry(registry, 'a', 'male', clock))
+
+    for _ in range(19):
+        advance(core, clock, 30)
+    assert 'a' in core.pool
+    advance(core, clock, 30)
+    assert 'a' not in core.pool
+    assert outbox.events(to='a')[-1] == 'video-wait-expired'
+    assert core.reclaimed['expired_waits'] == 1
+
+
+def test_ghost_waiting_entry_is_dropped(clock, registry):
+    connected = {'a'}
+    core, outbox = make_core(clock, connected=connected)
+    core.join(make_entry(registry, 'a', 'male', clock))
+    connected.clear()
+
+    advance(core, clock, 31)
+    assert 'a' not in core.pool
+    assert core.reclaimed['waiting'] == 1
+
+
+def test_leave_during_date_notifies_partner(clock, registry):
+    core, outbox = make_core(clock)
+    core.join(make_entry(registry, 'a', 'male', clock))
+    room_id = core.join(make_entry(registry, 'b', 'female', clock))
+
+    core.leave('a')
+    assert room_id not in core.rooms
+    assert core.room_of == {}
+    assert outbox.events(to='b')[-1] == 'video-user-disconnected'
+    assert 'b' not in outbox.rooms[room_id]
+    # The room's timers went with it
+    advance(core, clock, 200)
+    assert 'start_timed_date' not in outbox.events()
+    assert core.reclaimed['timed_dates'] == 0
+
+
+def test_leave_while_waiting(clock, registry):
+    core, outbox = make_core(clock)
+    core.join(make_entry(registry, 'a', 'male', clock))
+    core.leave('a')
+    assert len(core.pool) == 0
+    assert core.join(make_entry(registry, 'b', 'female', clock)) is None
+
+
+def test_skip_out_of_a_call_requeues(clock, registry):
+    core, outbox = make_core(clock)
+    a = make_entry(registry, 'a', 'male', clock)
+    core.join(a)
+    room_id = core.join(make_entry(registry, 'b', 'female', clock))
+
+    core.join(a)
+    assert room_id not in core.rooms
+    assert 'a' in core.pool
+    assert outbox.events(to='b')[-1] == 'video-user-disconnected'
+
+
+def test_restore_replaces_state(clock, registry):
+    core, outbox = make_core(clock)
+    core.join(make_entry(registry, 'x', 'male', clock))
+    core.join(make_entry(registry, 'y', 'female', clock))
+
+    waiting = [make_entry(registry, 'a', 'male', clock)]
+    rooms = {'room-old': Room(('c', 'd'), clock() - 170, 'timed_date', 'Favourite city?')}
+    core.restore(waiting, rooms)
+
+    assert [entry.sid for entry in core.pool] == ['a']
+    assert list(core.rooms) == ['room-old']
+    assert core.partner_of('c') == 'd'
+    assert 'x' not in core.room_of and 'y' not in core.room_of
+
+    # Restored waiting users can be matched
+    assert core.join(make_entry(registry, 'b', 'female', clock)) is not None
+
+    # The restored room keeps its original deadline, 10s away
+    advance(core, clock, 11)
+    assert 'room-old' not in core.rooms
+    assert outbox.events(to='c')[-1] == 'video-user-disconnected'
+
+
+def test_restore_keeps_leave_working(clock, registry):
+    core, outbox = make_core(clock)
+    core.restore([], {'room-old': Room(('c', 'd'), clock(), 'matched', None)})
+    core.leave('c')
+    assert 'room-old' not in core.rooms
+    assert outbox.events(to='d')[-1] == 'video-user-disconnected'
+
+
+def test_batch_mode_pairs_on_round(clock, registry):
+    core, outbox = make_core(clock, batch_mode=True, batch_size=100)
+    for sid, gender in (('a', 'male'), ('b', 'female'), ('c', 'male'), ('d', 'female')):
+        assert core.join(make_entry(registry, sid, gender, clock)) is None
+    assert len(core.pool) == 4
+
+    assert core.round() == 2
+    assert len(core.pool) == 0
+    assert len(core.rooms) == 2
+
+
+def test_actor_applies_commands_in_order(clock, registry):
+    core, outbox = make_core(clock)
+    observed = []
+    actor = MatchmakingActor(core, observe=lambda command, queued, ran: observed.append(command))
+
+    actor.submit('join', make_entry(registry, 'a', 'male', clock))
+    actor.submit('join', make_entry(registry, 'b', 'female', clock))
+    actor.submit('leave', 'a')
+    assert actor.queue_depth() == 3
+    actor.drain()
+
+    assert observed == ['join', 'join', 'leave']
+    assert actor.processed == 3 and actor.failed == 0
+    assert not core.rooms
+    assert outbox.events(to='b')[-1] == 'video-user-disconnected'
+
+
+def test_actor_rejects_unknown_commands(clock):
+    core, outbox = make_core(clock)
+    with pytest.raises(ValueError):
+        MatchmakingActor(core).submit('explode')
@@ -0,0 +1,123 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matchmaking import InterestRegistry, WaitingPool, check_dating_compatibility
+from records import MatchProfile, WaitingEntry
+
+NOW = 1000.0
+INTERESTS = [f'interest-{n}' for n in range(30)]
+
+
+def make_entry(registry, sid, gender='male', preference='straight', interests=('music',), uid=None, ip=None, joined=NOW):
+    profile = {'gender': gender, 'datingPreference': preference, 'dateScope': 'global', 'interests': list(interests)}
+    return WaitingEntry(sid, uid or f'uid-{sid}', ip or f'ip-{sid}', None, joined,
+                        MatchProfile(profile, registry.intern(profile['interests'])))
+
+
+def make_pool(**kwargs):
+    registry = InterestRegistry()
+    return WaitingPool(registry, clock=lambda: NOW, **kwargs), registry
+
+
+def random_pool(seed, size):
+    rnd = random.Random(seed)
+    pool, registry = make_pool(aging_per_second=0.01)
+    for n in range(size):
+        pool.add(make_entry(registry, f's{n}', rnd.choice(['male', 'female', 'other']),
+                            rnd.choice(['straight', 'gay', 'lesbian', 'bisexual']),
+                            rnd.sample(INTERESTS, rnd.randint(0, 5)),
+                            uid=f'uid-{rnd.randint(0, size)}', ip=f'ip-{rnd.randint(0, size // 3 + 1)}',
+                            joined=NOW - rnd.random() * 200))
+    return pool
+
+
+def test_find_best_prefers_shared_interests():
+    pool, registry = make_pool()
+    pool.add(make_entry(registry, 'a', 'female', interests=('chess',)))
+    pool.add(make_entry(registry, 'b', 'female', interests=('music', 'travel')))
+    seeker = make_entry(registry, 's', 'male', interests=('music', 'travel'))
+    assert pool.find_best(seeker).sid == 'b'
+
+
+def test_find_best_ties_go_to_newest():
+    pool, registry = make_pool()
+    pool.add(make_entry(registry, 'old', 'female'))
+    pool.add(make_entry(registry, 'new', 'female'))
+    assert pool.find_best(make_entry(registry, 's', 'male')).sid == 'new'
+
+
+def test_find_best_skips_same_ip_and_uid_before_top_k():
+    pool, registry = make_pool(search_top_k=2)
+    # A crowd behind the seeker's own NAT outscores the only valid partner
+    for n in range(5):
+        pool.add(make_entry(registry, f'nat-{n}', 'female', interests=('music', 'travel'), ip='203.0.113.7'))
+    pool.add(make_entry(registry, 'tab', 'female', interests=('music', 'travel'), uid='uid-s'))
+    pool.add(make_entry(registry, 'valid', 'female', interests=('chess',)))
+    seeker = make_entry(registry, 's', 'male', interests=('music', 'travel'), ip='203.0.113.7')
+    assert pool.find_best(seeker).sid == 'valid'
+
+
+def test_incompatible_buckets_are_never_returned():
+    pool, registry = make_pool()
+    pool.add(make_entry(registry, 'a', 'male'))
+    assert pool.find_best(make_entry(registry, 's', 'male')) is None
+
+
+def test_top_candidates_are_ranked():
+    pool, registry = make_pool()
+    pool.add(make_entry(registry, 'one', 'female', interests=('music',)))
+    pool.add(make_entry(registry, 'two', 'female', interests=('music', 'travel')))
+    pool.add(make_entry(registry, 'none', 'female', interests=('chess',)))
+    seeker = make_entry(registry, 's', 'male', interests=('music', 'travel'))
+    assert [entry.sid for entry, _ in pool.top_candidates(seeker, 2)] == ['two', 'one']
+    assert pool.top_candidates(seeker, 0) == []
+
+
+def test_take_records_wait():
+    pool, registry = make_pool()
+    pool.add(make_entry(registry, 'a', joined=NOW - 30))
+    assert pool.take('a').sid == 'a'
+    assert len(pool) == 0
+    assert pool.stats()['wait_p50_s'] == 30
+
+
+def test_pairing_prefers_best_pairs():
+    pool, registry = make_pool()
+    pool.add(make_entry(registry, 'm1', 'male', interests=('music',)))
+    pool.add(make_entry(registry, 'm2', 'male', interests=('chess',)))
+    pool.add(make_entry(registry, 'f1', 'female', interests=('chess',)))
+    pool.add(make_entry(registry, 'f2', 'female', interests=('music',)))
+    pairs = {frozenset((a.sid, b.sid)) for a, b in pool.pairing(k=2)}
+    assert pairs == {frozenset(('m1', 'f2')), frozenset(('m2', 'f1'))}
+
+
+def test_pairing_skips_same_ip():
+    pool, registry = make_pool()
+    pool.add(make_entry(registry, 'm', 'male', ip='203.0.113.7'))
+    pool.add(make_entry(registry, 'f', 'female', ip='203.0.113.7'))
+    assert pool.pairing() == []
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_pairing_is_the_same_for_any_chunk_size(seed):
+    pool = random_pool(seed, 400)
+    expected = [(a.sid, b.sid) for a, b in pool.pairing(k=4, chunk_rows=10000)]
+    assert expected
+    for chunk_rows in (1, 7, 64):
+        assert [(a.sid, b.sid) for a, b in pool.pairing(k=4, chunk_rows=chunk_rows)] == expected
+
+
+def test_pairing_pairs_each_user_once_and_compatibly():
+    pool = random_pool(7, 300)
+    seen = set()
+    for initiator, receiver in pool.pairing(k=8, chunk_rows=32):
+        assert initiator.sid not in seen and receiver.sid not in seen
+        seen.update((initiator.sid, receiver.sid))
+        assert initiator.ip != receiver.ip and initiator.uid != receiver.uid
+        assert check_dating_compatibility(initiator.match.profile, receiver.match.profile)
+        assert pool.seq(initiator.sid) > pool.seq(receiver.sid)
@@ -0,0 +1,109 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import HandlerProfiler, MetricsRegistry
+
+
+def test_counter_and_labels():
+    registry = MetricsRegistry(prefix='app_')
+    plain = registry.counter('events', 'Events')
+    labelled = registry.counter('rejected', 'Rejected', ['reason'])
+    plain.inc()
+    plain.inc(2)
+    labelled.labels('sid').inc()
+    labelled.labels('ip').inc(3)
+    text = registry.render()
+    assert '# HELP app_events Events\n# TYPE app_events counter\napp_events_total 3.0\n' in text
+    assert 'app_rejected_total{reason="sid"} 1.0' in text
+    assert 'app_rejected_total{reason="ip"} 3.0' in text
+
+
+def test_wrong_label_count():
+    registry = MetricsRegistry()
+    counter = registry.counter('c', 'C', ['a', 'b'])
+    with pytest.raises(ValueError):
+        counter.labels('only-one')
+
+
+def test_duplicate_names_are_rejected():
+    registry = MetricsRegistry()
+    registry.counter('c', 'C')
+    with pytest.raises(ValueError):
+        registry.gauge('c', 'C again')
+
+
+def test_gauges():
+    registry = MetricsRegistry()
+    set_gauge = registry.gauge('queue', 'Queue')
+    set_gauge.set(5)
+    set_gauge.dec()
+    registry.gauge('users', 'Users', fn=lambda: 42)
+    text = registry.render()
+    assert 'queue 4.0' in text
+    assert 'users 42.0' in text
+
+
+def test_failing_gauge_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.gauge('broken', 'Broken', fn=lambda: 1 / 0)
+    registry.counter('fine', 'Fine').inc()
+    text = registry.render()
+    assert '# broken unavailable: division by zero' in text
+    assert 'fine_total 1.0' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency', 'Latency', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    assert 'latency_bucket{le="0.1"} 2.0' in lines
+    assert 'latency_bucket{le="1.0"} 3.0' in lines
+    assert 'latency_bucket{le="+Inf"} 4.0' in lines
+    assert 'latency_sum 3.65' in lines
+    assert 'latency_count 4.0' in lines
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter('c', 'C', ['path']).labels('a"b\\c\nd').inc()
+    assert 'c_total{path="a\\"b\\\\c\\nd"} 1.0' in registry.render()
+
+
+def test_profiler_keeps_the_slowest_calls_only_when_enabled():
+    registry = MetricsRegistry()
+    profiler = HandlerProfiler(registry.histogram('handler', 'Handler', ['event']), keep=2)
+    profiler.record('join', 0.5, 'sid-0')
+    assert profiler.slowest() == []
+
+    profiler.set_enabled(True)
+    for n, duration in enumerate((0.1, 0.3, 0.2)):
+        profiler.record('join', duration, f'sid-{n}')
+    assert [(r['sid'], r['duration_ms']) for r in profiler.slowest()] == [('sid-1', 300.0), ('sid-2', 200.0)]
+    assert 'handler_count{event="join"} 4.0' in registry.render()
+
+    profiler.set_enabled(False)
+    profiler.set_enabled(True, keep=5)
+    assert profiler.slowest() == [] and profiler.keep == 5
+
+
+def test_profiler_wrap_times_and_names_the_caller():
+    registry = MetricsRegistry()
+    profiler = HandlerProfiler(registry.histogram('handler', 'Handler', ['event']))
+    profiler.set_enabled(True)
+
+    @profiler.wrap('offer', sid_fn=lambda: 'sid-9')
+    def handler(x):
+        if x is None: raise RuntimeError('boom')
+        return x * 2
+
+    assert handler(4) == 8
+    with pytest.raises(RuntimeError):
+        handler(None)
+    assert [record['sid'] for record in profiler.slowest()] == ['sid-9', 'sid-9']
+    assert 'handler_count{event="offer"} 2.0' in registry.render()
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moderation import CensorAutomaton, ProfanityFilter, normalize
+
+better_profanity = pytest.importorskip('better_profanity')
+
+# Leetspeak and trailing punctuation better_profanity flags; the automaton must flag them too
+FLAGGED = [
+    'fuck', 'FUCK', 'fuck!', 'fuck!!', 'FUCK!!!', 'fuck||', 'fuck++', 'fuck!|+', 'what the fuck!?',
+    'shit!!!', 'sh1t!!', 'sh!t!!', '$h!t||', '$h1t', '5hit', 'shitty',
+    'you bitch!!', 'b1tch', 'bitch!|+', 'ass!!', 'a$$', '@ss', 'a55', 'fvck',
+]
+
+# Punctuation and look-alikes in clean text
+CLEAN = [
+    'hi', 'wow!', 'yes!!!', 'hello!!', 'hello|world', 'pass!!', 'grass', 'class', 'cl@ss!!',
+    'nice +1', 'ok++ fine', 'c++ rocks', 'l0l', 'fuuck',
+]
+
+
+@pytest.fixture(scope='module')
+def censor():
+    return ProfanityFilter()
+
+
+@pytest.fixture(scope='module')
+def reference():
+    from better_profanity import profanity
+    profanity.load_censor_words()
+    return profanity
+
+
+@pytest.mark.parametrize('text', FLAGGED)
+def test_flags_what_better_profanity_flags(censor, reference, text):
+    assert reference.contains_profanity(text)
+    assert censor.check_message(text)
+
+
+@pytest.mark.parametrize('text', CLEAN)
+def test_clean_text_passes_like_better_profanity(censor, reference, text):
+    assert not reference.contains_profanity(text)
+    assert not censor.check_message(text)
+
+
+def test_trailing_run_is_punctuation():
+    assert normalize('fuck!!') == 'fuck'
+    assert normalize('fuck|+!') == 'fuck'
+    assert normalize('wow!! ok') == 'wow ok'
+
+
+def test_look_alikes_inside_a_word_are_folded():
+    assert normalize('sh!t') == 'shit'
+    assert normalize('$h1t!!') == 'shit'
+    assert normalize('!!!') == ''
+
+
+def test_word_list_entries_keep_their_look_alikes():
+    assert normalize('fuck!', word=True) == 'fucki'
+
+
+def test_matches_only_whole_words():
+    automaton = CensorAutomaton(['ass'])
+    assert automaton.contains('you ass!!')
+    assert not automaton.contains('class')
+    assert not automaton.contains('assume')
+
+
+def test_check_messages_matches_check_message(censor):
+    messages = FLAGGED + CLEAN
+    assert censor.check_messages(messages) == [censor.check_message(m) for m in messages]
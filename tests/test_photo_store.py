@@ -0,0 +1,136 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from photo_store import LocalPhotoStore, ObjectStorePhotoStore, PhotoStore, content_key, is_valid_key
+
+PHOTO = b'\xff\xd8\xff\xe0 not really a jpeg'
+
+
+class ClientError(Exception):
+    """Shaped like botocore's ClientError."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.puts = 0
+        self.error = None
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.puts += 1
+        self.objects[(Bucket, Key)] = (Body, kwargs)
+
+    def head_object(self, Bucket, Key):
+        if self.error is not None: raise self.error
+        if (Bucket, Key) not in self.objects: raise ClientError('404')
+        return {}
+
+    def get_object(self, Bucket, Key):
+        if self.error is not None: raise self.error
+        if (Bucket, Key) not in self.objects: raise ClientError('NoSuchKey')
+        return {'Body': FakeBody(self.objects[(Bucket, Key)][0])}
+
+
+def test_keys_are_content_hashes():
+    key = content_key(PHOTO)
+    assert is_valid_key(key)
+    assert not is_valid_key('../etc/passwd')
+    assert not is_valid_key(key.upper())
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        PhotoStore()
+
+    class Incomplete(PhotoStore):
+        def put(self, data):
+            return content_key(data)
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_local_store_round_trip(tmp_path):
+    store = LocalPhotoStore(str(tmp_path))
+    key = store.put(PHOTO)
+    assert key == content_key(PHOTO)
+    assert store.exists(key)
+    with store.open(key) as f:
+        assert f.read() == PHOTO
+    assert store.local_path(key) == str(tmp_path / key[:2] / key[2:4] / f'{key}.jpg')
+    assert store.public_url(key) is None
+
+
+def test_local_store_deduplicates(tmp_path):
+    store = LocalPhotoStore(str(tmp_path))
+    assert store.put(PHOTO) == store.put(PHOTO)
+    files = [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert len(files) == 1
+
+
+def test_local_store_missing_key(tmp_path):
+    store = LocalPhotoStore(str(tmp_path))
+    key = content_key(b'other')
+    assert not store.exists(key)
+    assert store.local_path(key) is None
+    with pytest.raises(KeyError):
+        store.open(key)
+
+
+def test_object_store_round_trip():
+    s3 = FakeS3()
+    store = ObjectStorePhotoStore(s3, 'bucket')
+    key = store.put(PHOTO)
+    assert store.put(PHOTO) == key
+    assert s3.puts == 1
+    body, params = s3.objects[('bucket', f'photos/{key[:2]}/{key}.jpg')]
+    assert params['ContentType'] == 'image/jpeg'
+    assert 'immutable' in params['CacheControl']
+    assert store.exists(key)
+    assert store.open(key).read() == PHOTO
+
+
+def test_object_store_missing_key():
+    store = ObjectStorePhotoStore(FakeS3(), 'bucket')
+    key = content_key(PHOTO)
+    assert not store.exists(key)
+    with pytest.raises(KeyError):
+        store.open(key)
+
+
+@pytest.mark.parametrize('error', [ClientError('403'), ClientError('SlowDown'), ConnectionError('timed out')])
+def test_object_store_raises_errors_other_than_missing(error):
+    s3 = FakeS3()
+    store = ObjectStorePhotoStore(s3, 'bucket')
+    key = store.put(PHOTO)
+    s3.error = error
+    with pytest.raises(type(error)):
+        store.exists(key)
+    with pytest.raises(type(error)):
+        store.open(key)
+    # put() must not treat a failed existence check as "missing" and upload again
+    with pytest.raises(type(error)):
+        store.put(PHOTO)
+    assert s3.puts == 1
+
+
+def test_object_store_public_url():
+    store = ObjectStorePhotoStore(FakeS3(), 'bucket', public_base_url='https://cdn.example.com/')
+    key = content_key(PHOTO)
+    assert store.public_url(key) == f'https://cdn.example.com/photos/{key[:2]}/{key}.jpg'
@@ -0,0 +1,119 @@
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_index import DEFAULT_MATCH_PROMPT, PromptIndex
+
+PROMPTS = [
+    {'prompt': 'g-fun-1', 'category': 'fun'},
+    {'prompt': 'g-fun-2', 'category': 'fun', 'region': 'global'},
+    {'prompt': 'g-deep-1', 'category': 'deep'},
+    {'prompt': 'in-fun-1', 'category': 'fun', 'region': 'India-Bengaluru'},
+    {'prompt': 'us-deep-1', 'category': 'deep', 'region': 'US-NYC'},
+]
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = None
+
+    def execute(self, query, params=None):
+        self.db.queries.append(query)
+        if query.startswith('SELECT COUNT(*)'):
+            self.result = [{'total': len(self.db.rows), 'max_id': len(self.db.rows)}]
+        else:
+            self.result = list(self.db.rows)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def connect(self):
+        return self
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+def loaded():
+    index = PromptIndex()
+    index.load(PROMPTS)
+    return index
+
+
+def test_load_groups_by_region_and_category():
+    index = loaded()
+    assert len(index) == 5
+    assert index.categories() == ['deep', 'fun']
+    assert index.categories('US-NYC') == ['deep']
+
+
+def test_global_users_only_get_global_prompts():
+    index = loaded()
+    picks = {index.random_prompt() for _ in range(200)}
+    assert picks == {'g-fun-1', 'g-fun-2', 'g-deep-1'}
+    assert {index.random_prompt('global') for _ in range(200)} == picks
+
+
+def test_regional_users_also_get_their_regions_prompts():
+    index = loaded()
+    picks = {index.random_prompt('India-Bengaluru') for _ in range(300)}
+    assert picks == {'g-fun-1', 'g-fun-2', 'g-deep-1', 'in-fun-1'}
+
+
+def test_category_filter():
+    index = loaded()
+    assert {index.random_prompt('US-NYC', 'deep') for _ in range(200)} == {'g-deep-1', 'us-deep-1'}
+    assert index.random_prompt('global', 'missing') == DEFAULT_MATCH_PROMPT
+
+
+def test_picks_are_uniform_across_pools():
+    index = loaded()
+    random.seed(5)
+    counts = Counter(index.random_prompt('India-Bengaluru') for _ in range(8000))
+    assert all(1700 < count < 2300 for count in counts.values())
+
+
+def test_empty_index_falls_back_to_default():
+    assert PromptIndex().random_prompt('India-Bengaluru') == DEFAULT_MATCH_PROMPT
+
+
+def test_reload_only_when_the_table_changed():
+    db = FakeDatabase(list(PROMPTS))
+    index = PromptIndex()
+    assert index.reload_from_db(db.connect)
+    assert len(index) == 5 and len(db.queries) == 2
+
+    assert index.reload_from_db(db.connect)
+    assert len(db.queries) == 3  # signature only
+
+    db.rows.append({'prompt': 'g-new', 'category': 'fun', 'region': 'global'})
+    assert index.reload_from_db(db.connect)
+    assert len(index) == 6
+
+    assert index.reload_from_db(db.connect, force=True)
+    assert db.queries[-1].startswith('SELECT prompt')
+
+
+def test_reload_without_a_connection_keeps_the_index():
+    index = loaded()
+    assert not index.reload_from_db(lambda: None)
+    assert len(index) == 5
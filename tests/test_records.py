@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matchmaking import InterestRegistry
+from records import (Gender, MatchProfile, Preference, Room, Scope, UserSession, WaitingEntry, parse_gender,
+                     parse_preference, parse_region, parse_scope)
+
+PROFILE = {'name': 'A', 'gender': 'Female', 'datingPreference': 'bisexual', 'dateScope': 'local',
+           'region': 'India-Bengaluru', 'interests': ['music', 'hiking', 'music']}
+
+
+def test_parsing_is_lenient():
+    assert parse_gender('MALE') is Gender.MALE
+    assert parse_gender('nonbinary') is Gender.OTHER
+    assert parse_gender(None) is Gender.OTHER
+    assert parse_preference('Gay') is Preference.GAY
+    assert parse_preference(3) is Preference.OTHER
+    assert parse_scope('local') is Scope.LOCAL
+    assert parse_scope('anything else') is Scope.GLOBAL
+    assert parse_region(None) == 'global'
+
+
+def test_regions_are_interned():
+    assert parse_region(''.join(['India-', 'Bengaluru'])) is parse_region('India-Bengaluru')
+
+
+def test_match_profile():
+    registry = InterestRegistry()
+    match = MatchProfile(PROFILE, registry.intern(PROFILE['interests']))
+    assert match.bucket_key == (Gender.FEMALE, Preference.BISEXUAL, Scope.LOCAL, 'India-Bengaluru')
+    assert match.profile is PROFILE
+    assert list(match.interest_ids) == sorted(registry.intern(['music', 'hiking']))
+
+
+def test_defaults_for_a_sparse_profile():
+    match = MatchProfile({}, np.array([], dtype=np.int32))
+    assert match.bucket_key == (Gender.OTHER, Preference.OTHER, Scope.GLOBAL, 'global')
+
+
+def test_records_are_slotted():
+    match = MatchProfile(PROFILE, np.array([], dtype=np.int32))
+    records = [match, UserSession('uid', '1.2.3.4', None, 0.0, match),
+               WaitingEntry('sid', 'uid', '1.2.3.4', None, 0.0, match), Room(['a', 'b'], 0.0, 'active', 'hi')]
+    for record in records:
+        assert not hasattr(record, '__dict__')
+
+
+def test_waiting_entry_round_trip():
+    registry = InterestRegistry()
+    entry = WaitingEntry('sid-1', 'uid-1', '1.2.3.4', 'fp', 12.5, MatchProfile(PROFILE, registry.intern(PROFILE['interests'])))
+    data = json.loads(json.dumps(entry.to_dict()))
+    copy = WaitingEntry.from_dict(data, registry)
+    assert (copy.sid, copy.uid, copy.ip, copy.fingerprint, copy.joined) == ('sid-1', 'uid-1', '1.2.3.4', 'fp', 12.5)
+    assert copy.match.bucket_key == entry.match.bucket_key
+    assert list(copy.match.interest_ids) == list(entry.match.interest_ids)
+
+
+def test_room():
+    room = Room(['a', 'b'], 0.0, 'active', 'hi')
+    assert room.sids == ('a', 'b')
+    assert room.partner_of('a') == 'b' and room.partner_of('b') == 'a'
+    assert room.decisions == {}
+    assert Room(['a', 'b'], 0.0, 'active', 'hi').decisions is not room.decisions
@@ -0,0 +1,88 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import AuthSessionStore
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_bind_and_get():
+    store = AuthSessionStore()
+    session = store.bind('sid-1', 'uid-1', {'name': 'A'})
+    assert store.get('sid-1') is session
+    assert (session.uid, session.profile) == ('uid-1', {'name': 'A'})
+    assert len(store) == 1
+    assert store.get('sid-2') is None
+
+
+def test_rebinding_a_sid_replaces_its_session():
+    store = AuthSessionStore()
+    store.bind('sid-1', 'uid-1', {})
+    store.bind('sid-1', 'uid-2', {})
+    assert store.get('sid-1').uid == 'uid-2'
+    assert store.revoke('uid-1') == []
+    assert len(store) == 1
+
+
+def test_drop():
+    store = AuthSessionStore()
+    store.bind('sid-1', 'uid-1', {})
+    assert store.drop('sid-1').sid == 'sid-1'
+    assert store.drop('sid-1') is None
+    assert len(store) == 0
+
+
+def test_no_ttl_never_goes_stale():
+    clock = FakeClock()
+    store = AuthSessionStore(ttl=0, clock=clock)
+    session = store.bind('sid-1', 'uid-1', {})
+    clock.now += 10 ** 6
+    assert not store.is_stale(session)
+
+
+def test_goes_stale_after_ttl_until_reverified():
+    clock = FakeClock()
+    store = AuthSessionStore(ttl=300, clock=clock)
+    session = store.bind('sid-1', 'uid-1', {})
+    clock.now += 300
+    assert not store.is_stale(session)
+    clock.now += 1
+    assert store.is_stale(session)
+    store.mark_verified('uid-1')
+    assert not store.is_stale(session)
+
+
+def test_verification_is_shared_by_a_uids_sessions():
+    clock = FakeClock()
+    store = AuthSessionStore(ttl=300, clock=clock)
+    first = store.bind('sid-1', 'uid-1', {})
+    clock.now += 200
+    second = store.bind('sid-2', 'uid-1', {})
+    assert not store.is_stale(first)
+    clock.now += 301
+    assert store.is_stale(first) and store.is_stale(second)
+
+
+def test_mark_verified_ignores_unknown_uids():
+    store = AuthSessionStore(ttl=300)
+    store.mark_verified('uid-gone')
+    assert store.revoke('uid-gone') == []
+
+
+def test_revoke_drops_every_session_of_a_uid():
+    store = AuthSessionStore()
+    store.bind('sid-1', 'uid-1', {})
+    store.bind('sid-2', 'uid-1', {})
+    store.bind('sid-3', 'uid-2', {})
+    assert sorted(store.revoke('uid-1')) == ['sid-1', 'sid-2']
+    assert store.get('sid-1') is None and store.get('sid-2') is None
+    assert store.get('sid-3') is not None
+    assert store.revoke('uid-1') == []
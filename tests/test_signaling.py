@@ -0,0 +1,81 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from signaling import IceCandidateBatcher
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+        self.tasks = []
+
+    def emit(self, event, data=None, to=None, namespace=None):
+        self.emitted.append((event, data, to))
+
+    def start_background_task(self, fn, *args):
+        self.tasks.append((fn, args))
+
+    def sleep(self, seconds):
+        pass
+
+    def run_tasks(self):
+        tasks, self.tasks = self.tasks, []
+        for fn, args in tasks:
+            fn(*args)
+
+
+def test_legacy_recipients_get_each_candidate_at_once():
+    socketio = FakeSocketIO()
+    batcher = IceCandidateBatcher(socketio)
+    batcher.relay('room', 'a', 'b', {'candidate': 1})
+    batcher.relay('room', 'a', 'b', {'candidate': 2})
+    assert socketio.emitted == [('ice-candidate', {'candidate': {'candidate': 1}}, 'b'),
+                                ('ice-candidate', {'candidate': {'candidate': 2}}, 'b')]
+    assert not socketio.tasks
+
+
+def test_batches_candidates_per_sender():
+    socketio = FakeSocketIO()
+    batcher = IceCandidateBatcher(socketio)
+    batcher.register('b', True)
+    batcher.register('a', True)
+    for n in range(3):
+        batcher.relay('room', 'a', 'b', n)
+    batcher.relay('room', 'b', 'a', 'x')
+    assert socketio.emitted == []
+    assert len(socketio.tasks) == 2
+
+    socketio.run_tasks()
+    assert ('ice-candidates', {'candidates': [0, 1, 2]}, 'b') in socketio.emitted
+    assert ('ice-candidates', {'candidates': ['x']}, 'a') in socketio.emitted
+    assert (batcher.candidates_in, batcher.messages_out) == (4, 2)
+
+
+def test_a_new_batch_starts_after_a_flush():
+    socketio = FakeSocketIO()
+    batcher = IceCandidateBatcher(socketio)
+    batcher.register('b', True)
+    batcher.relay('room', 'a', 'b', 1)
+    socketio.run_tasks()
+    batcher.relay('room', 'a', 'b', 2)
+    socketio.run_tasks()
+    assert [data['candidates'] for _, data, _ in socketio.emitted] == [[1], [2]]
+
+
+def test_zero_window_disables_batching():
+    socketio = FakeSocketIO()
+    batcher = IceCandidateBatcher(socketio, window=0)
+    batcher.register('b', True)
+    batcher.relay('room', 'a', 'b', 1)
+    assert socketio.emitted[0][0] == 'ice-candidate'
+
+
+def test_forgotten_sids_stop_getting_batches():
+    socketio = FakeSocketIO()
+    batcher = IceCandidateBatcher(socketio)
+    batcher.register('b', True)
+    batcher.forget('b')
+    batcher.relay('room', 'a', 'b', 1)
+    assert socketio.emitted[0][0] == 'ice-candidate'
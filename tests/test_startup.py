@@ -0,0 +1,101 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from startup import StartupOrchestrator
+
+
+class FakeSocketIO:
+    """Runs background tasks on threads and records sleeps instead of sleeping."""
+
+    def __init__(self):
+        self.threads = []
+        self.sleeps = []
+
+    def start_background_task(self, fn, *args):
+        thread = threading.Thread(target=fn, args=args, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join(5)
+
+
+def test_unknown_requirement_is_rejected():
+    startup = StartupOrchestrator(FakeSocketIO())
+    with pytest.raises(ValueError):
+        startup.step('db', lambda: True, requires=['config'])
+
+
+def test_steps_wait_for_their_requirements():
+    socketio = FakeSocketIO()
+    startup = StartupOrchestrator(socketio)
+    gate = threading.Event()
+    order = []
+    startup.step('db', lambda: gate.wait(5) and order.append('db'))
+    startup.step('prompts', lambda: order.append('prompts'), requires=['db'])
+    startup.step('firebase', lambda: order.append('firebase'))
+    startup.start()
+
+    assert startup.wait(['firebase'], timeout=5)
+    assert not startup.ready(['prompts'])
+    assert not startup.wait(['prompts'], timeout=0.05)
+    gate.set()
+    assert startup.wait(timeout=5)
+    socketio.join()
+    assert order.index('db') < order.index('prompts')
+    assert startup.ready()
+
+
+def test_failed_steps_retry_with_backoff():
+    socketio = FakeSocketIO()
+    startup = StartupOrchestrator(socketio, retry_seconds=1, max_retry_seconds=4)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError('database down')
+        return len(attempts) == 5
+
+    startup.step('db', flaky)
+    startup.start()
+    assert startup.wait(timeout=5)
+    socketio.join()
+    assert socketio.sleeps == [1, 2, 4, 4]
+    status = startup.status()['db']
+    assert status['state'] == 'ready' and status['attempts'] == 5 and status['error'] is None
+
+
+def test_status_while_failing():
+    socketio = FakeSocketIO()
+    startup = StartupOrchestrator(socketio)
+    stop = threading.Event()
+
+    def failing():
+        if stop.is_set(): return True
+        raise RuntimeError('no credentials')
+
+    socketio.sleep = lambda seconds: stop.wait(0.01)
+    startup.step('firebase', failing)
+    startup.step('auth', lambda: True, requires=['firebase'])
+    startup.start()
+    while startup.status()['firebase']['attempts'] < 2:
+        stop.wait(0.01)
+
+    status = startup.status()
+    assert status['firebase']['state'] == 'running'
+    assert status['firebase']['error'] == 'no credentials'
+    assert status['auth'] == {'state': 'pending', 'attempts': 0, 'error': None, 'seconds': None, 'requires': ['firebase']}
+    assert not startup.ready()
+    stop.set()
+    assert startup.wait(timeout=5)
+    socketio.join()
@@ -0,0 +1,189 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matchmaker import MatchmakingActor, MatchmakingCore
+from matchmaking import InterestRegistry, WaitingPool
+from records import MatchProfile, UserSession, WaitingEntry
+from state_backend import LocalStateBackend, RedisStateBackend
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+needs_fakeredis = pytest.mark.skipif(fakeredis is None, reason='fakeredis not installed')
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data=None, to=None):
+        self.emitted.append((event, data, to))
+
+    def join_room(self, room_id, sid):
+        pass
+
+    def leave_room(self, room_id, sid):
+        pass
+
+
+def make_actor():
+    room_ids = iter(f'room-{n}' for n in range(1000))
+    core = MatchmakingCore(WaitingPool(), {}, FakeOutbox(), prompt_picker=lambda region: 'Favourite city?',
+                           room_id_factory=lambda: next(room_ids), room_sweep_interval=0)
+    return MatchmakingActor(core)
+
+
+def make_entry(actor, sid, gender):
+    profile = {'name': sid, 'gender': gender, 'datingPreference': 'straight', 'interests': ['music']}
+    match = MatchProfile(profile, actor.core.pool.interest_registry.intern(profile['interests']))
+    return WaitingEntry(sid, f'uid-{sid}', f'ip-{sid}', None, time.time(), match)
+
+
+def make_user(uid, last_activity=None):
+    return UserSession(uid, '1.2.3.4', None, time.time() if last_activity is None else last_activity, None)
+
+
+def test_local_user_registry():
+    state = LocalStateBackend(make_actor())
+    state.register_user('sid-1', make_user('uid-1'))
+    assert state.is_connected('sid-1') and state.get_user('sid-1').uid == 'uid-1'
+    assert state.user_count() == 1
+    state.unregister_user('sid-1')
+    state.unregister_user('sid-1')
+    assert not state.is_connected('sid-1') and state.user_count() == 0
+
+
+def test_local_sweep_only_drops_idle_dead_sockets():
+    state = LocalStateBackend(make_actor())
+    state.register_user('idle-dead', make_user('a', time.time() - 120))
+    state.register_user('idle-live', make_user('b', time.time() - 120))
+    state.register_user('fresh', make_user('c'))
+    assert state.sweep_users(lambda sid: sid == 'idle-live', idle_seconds=60) == ['idle-dead']
+    assert sorted(state.users) == ['fresh', 'idle-live']
+    assert state.stats()['reclaimed_users'] == 1
+
+
+def test_local_commands_and_rooms():
+    actor = make_actor()
+    state = LocalStateBackend(actor)
+    state.submit('join', make_entry(actor, 'a', 'male'))
+    state.submit('join', make_entry(actor, 'b', 'female'))
+    assert state.command_backlog() == 2
+    actor.drain()
+    assert state.command_backlog() == 0
+    assert state.partner_in_room('a', 'room-0') == 'b'
+    assert state.partner_in_room('a', 'room-1') is None
+    assert state.partner_in_room('a', None) is None
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def make_worker(server, worker_id):
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    return RedisStateBackend(client, make_actor(), worker_id=worker_id), client
+
+
+def pump(state):
+    # Feeds the shared command list to the leader's actor; returns after one empty (1s) blpop
+    state._pump(time.monotonic() + 0.5)
+    state.matchmaker.drain()
+
+
+@needs_fakeredis
+def test_users_are_counted_across_workers(server):
+    first, client = make_worker(server, 'w1')
+    second, _ = make_worker(server, 'w2')
+    first._heartbeat()
+    second._heartbeat()
+    first.register_user('sid-1', make_user('uid-1'))
+    second.register_user('sid-2', make_user('uid-2'))
+    assert first.user_count() == second.user_count() == 2
+    assert first.is_connected('sid-2') and not first.is_connected('sid-3')
+    second.unregister_user('sid-2')
+    assert first.user_count() == 1
+
+
+@needs_fakeredis
+def test_one_leader_consumes_every_workers_commands(server):
+    leader, client = make_worker(server, 'w1')
+    follower, _ = make_worker(server, 'w2')
+    leader._heartbeat()
+    follower._heartbeat()
+    assert leader.is_leader() and not follower.is_leader()
+
+    with pytest.raises(ValueError):
+        follower.submit('explode')
+    follower.submit('join', make_entry(follower.matchmaker, 'a', 'male'))
+    leader.submit('join', make_entry(leader.matchmaker, 'b', 'female'))
+    assert follower.command_backlog() == 2
+
+    pump(leader)
+    assert follower.command_backlog() == 0
+    assert leader.partner_in_room('b', 'room-0') == 'a'
+    # The follower answers from the leader's mirror
+    assert json.loads(client.hget('hushh:rooms', 'room-0'))['users'] == ['b', 'a']
+    assert follower.partner_in_room('a', 'room-0') == 'b'
+    assert follower.partner_in_room('c', 'room-0') is None
+    assert follower.partner_in_room('a', 'room-9') is None
+
+
+@needs_fakeredis
+def test_waiting_pool_is_mirrored_and_restored_on_takeover(server):
+    leader, client = make_worker(server, 'w1')
+    leader._heartbeat()
+    leader.submit('join', make_entry(leader.matchmaker, 'a', 'male'))
+    pump(leader)
+    assert client.hkeys('hushh:waiting') == ['a']
+
+    # The leader dies; its lease expires and another worker takes over
+    client.delete('hushh:leader')
+    successor, _ = make_worker(server, 'w2')
+    successor._heartbeat()
+    assert successor.is_leader() and successor.takeovers == 1
+    successor.matchmaker.drain()
+    assert 'a' in successor.matchmaker.core.pool
+
+    successor.submit('join', make_entry(successor.matchmaker, 'b', 'female'))
+    pump(successor)
+    assert successor.partner_in_room('b', 'room-0') == 'a'
+    assert client.hkeys('hushh:waiting') == []
+
+
+@needs_fakeredis
+def test_leader_notices_a_lost_lease(server):
+    leader, client = make_worker(server, 'w1')
+    leader._heartbeat()
+    client.set('hushh:leader', 'w2')
+    leader._heartbeat()
+    assert not leader.is_leader()
+
+
+@needs_fakeredis
+def test_dead_workers_are_reaped(server):
+    leader, client = make_worker(server, 'w1')
+    dead, _ = make_worker(server, 'w2')
+    leader._heartbeat()
+    dead._heartbeat()
+    dead.register_user('sid-2', make_user('uid-2'))
+    dead.submit('join', make_entry(dead.matchmaker, 'sid-2', 'male'))
+    pump(leader)
+    assert 'sid-2' in leader.matchmaker.core.pool
+
+    client.delete('hushh:worker:w2')
+    leader._reap_dead_workers()
+    leader.matchmaker.drain()
+    assert leader.reaped_workers == 1
+    assert 'sid-2' not in leader.matchmaker.core.pool
+    assert leader.user_count() == 0
+    assert client.smembers('hushh:workers') == {'w1'}
@@ -0,0 +1,103 @@
+import gzip
+import os
+import sys
+
+import pytest
+from flask import Flask, abort, request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import static_assets
+from static_assets import AssetPipeline
+
+SCRIPT = b'function hello() { return "hello"; }\n' * 50
+
+
+@pytest.fixture
+def assets():
+    assets = AssetPipeline()
+    assets.add('app.js', SCRIPT)
+    assets.add('tiny.js', b'let x = 1;')
+    assets.add('index', b'<!doctype html><title>hi</title>' * 20, 'text/html')
+    return assets
+
+
+@pytest.fixture
+def client(assets):
+    app = Flask(__name__)
+
+    @app.route('/<path:filename>')
+    def serve(filename):
+        asset, fingerprinted = assets.lookup(filename)
+        if asset is None: abort(404)
+        return assets.respond(asset, request, immutable=fingerprinted)
+
+    return app.test_client()
+
+
+def test_fingerprinted_url(assets):
+    asset = assets.get('app.js')
+    assert assets.url('app.js') == f'/app.{asset.fingerprint}.js'
+    assert assets.lookup(f'app.{asset.fingerprint}.js') == (asset, True)
+    assert assets.lookup('app.js') == (asset, False)
+    assert assets.url('missing.js') == '/missing.js'
+
+
+def test_only_worthwhile_files_are_compressed(assets):
+    assert 'gzip' in assets.get('app.js').variants
+    assert set(assets.get('tiny.js').variants) == {'identity'}
+    assert gzip.decompress(assets.get('app.js').variants['gzip']) == SCRIPT
+
+
+def test_replacing_an_asset_retires_its_old_url(assets):
+    old_url = assets.url('app.js')
+    assets.add('app.js', SCRIPT + b'// v2\n')
+    assert assets.url('app.js') != old_url
+    assert assets.lookup(old_url[1:]) == (None, False)
+
+
+def test_negotiates_encoding(client, assets):
+    plain = client.get('/app.js')
+    assert plain.data == SCRIPT
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    gzipped = client.get('/app.js', headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gzipped.data) == SCRIPT
+
+
+@pytest.mark.skipif(static_assets.brotli is None, reason='brotli not installed')
+def test_prefers_brotli(client):
+    response = client.get('/app.js', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+
+
+def test_each_encoding_has_its_own_etag(client, assets):
+    fingerprint = assets.get('app.js').fingerprint
+    assert client.get('/app.js').headers['ETag'] == f'"{fingerprint}"'
+    assert client.get('/app.js', headers={'Accept-Encoding': 'gzip'}).headers['ETag'] == f'"{fingerprint}-gzip"'
+
+
+def test_conditional_requests(client, assets):
+    fingerprint = assets.get('app.js').fingerprint
+    assert client.get('/app.js', headers={'If-None-Match': f'"{fingerprint}"'}).status_code == 304
+    assert client.get('/app.js', headers={'If-None-Match': '"stale"'}).status_code == 200
+    # A gzip ETag doesn't validate the identity bytes
+    assert client.get('/app.js', headers={'If-None-Match': f'"{fingerprint}-gzip"'}).status_code == 200
+    assert client.get('/app.js', headers={'If-None-Match': f'"{fingerprint}-gzip"', 'Accept-Encoding': 'gzip'}).status_code == 304
+
+
+def test_cache_headers(client, assets):
+    revalidated = client.get('/app.js')
+    assert revalidated.cache_control.no_cache
+
+    immutable = client.get(assets.url('app.js'))
+    assert immutable.cache_control.public
+    assert immutable.cache_control.max_age == static_assets.IMMUTABLE_MAX_AGE
+    assert immutable.cache_control.immutable
+
+
+def test_content_types(client):
+    assert client.get('/app.js').headers['Content-Type'].startswith(('application/javascript', 'text/javascript'))
+    assert client.get('/index').headers['Content-Type'] == 'text/html; charset=utf-8'
@@ -0,0 +1,101 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timer_wheel import TimerWheel
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_wheel(**kwargs):
+    clock = FakeClock()
+    return TimerWheel(clock=clock, **kwargs), clock
+
+
+def test_fires_once_delay_has_passed():
+    wheel, clock = make_wheel(tick=0.5)
+    wheel.schedule('a', 2, 'payload')
+    assert wheel.advance(1.5) == []
+    assert wheel.advance(2.0) == [('a', 'payload')]
+    assert wheel.advance(10) == []
+    assert len(wheel) == 0 and wheel.fired == 1
+
+
+def test_delay_rounds_up_to_a_tick():
+    wheel, clock = make_wheel(tick=0.5)
+    wheel.schedule('a', 0.1)
+    wheel.schedule('b', 0.6)
+    assert [key for key, _ in wheel.advance(0.5)] == ['a']
+    assert [key for key, _ in wheel.advance(1.0)] == ['b']
+
+
+def test_cancel():
+    wheel, clock = make_wheel()
+    wheel.schedule('a', 1)
+    assert 'a' in wheel
+    assert wheel.cancel('a')
+    assert not wheel.cancel('a')
+    assert 'a' not in wheel
+    assert wheel.advance(5) == []
+
+
+def test_rescheduling_a_key_replaces_it():
+    wheel, clock = make_wheel(tick=1)
+    wheel.schedule('a', 2, 'first')
+    wheel.schedule('a', 5, 'second')
+    assert len(wheel) == 1
+    assert wheel.advance(3) == []
+    assert wheel.advance(5) == [('a', 'second')]
+
+
+def test_advance_uses_the_clock():
+    wheel, clock = make_wheel(tick=1)
+    wheel.schedule('a', 3)
+    clock.now = 3
+    assert wheel.advance() == [('a', None)]
+
+
+def test_long_delays_cascade_through_levels():
+    # 4 slots per level: level 0 spans 4s, level 1 16s, level 2 64s
+    wheel, clock = make_wheel(tick=1, slots=4, levels=3)
+    for delay in (3, 5, 17, 63, 200):
+        wheel.schedule(delay, delay)
+    fired = {}
+    for now in range(1, 260):
+        for key, _ in wheel.advance(now):
+            fired[key] = now
+    assert fired == {3: 3, 5: 5, 17: 17, 63: 63, 200: 200}
+
+
+def test_matches_a_sorted_schedule():
+    rnd = random.Random(3)
+    wheel, clock = make_wheel(tick=0.5, slots=8, levels=3)
+    expected = {}
+    cancelled = set()
+    for n in range(500):
+        delay = rnd.uniform(0, 400)
+        wheel.schedule(n, delay)
+        expected[n] = delay
+        if rnd.random() < 0.2:
+            wheel.cancel(n)
+            cancelled.add(n)
+
+    fired = {}
+    now = 0.0
+    while now < 410:
+        now += rnd.uniform(0.1, 7)
+        for key, _ in wheel.advance(now):
+            fired[key] = now
+    assert set(fired) == set(expected) - cancelled
+    for key, at in fired.items():
+        # Never early, and late by no more than the gap between advances (plus a tick)
+        assert expected[key] <= at + 1e-9
+        assert at - expected[key] < 7.5
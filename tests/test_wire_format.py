@@ -0,0 +1,128 @@
+import os
+import sys
+
+import pytest
+from socketio import packet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_format
+from wire_format import NegotiatedPacket, NegotiatingManager, encode_msgpack, socketio_options, wants_msgpack
+
+msgpack = pytest.importorskip('msgpack')
+
+
+class FakeEngineIO:
+    def __init__(self):
+        self.sent = []
+        self.ids = iter(range(1000))
+
+    def send(self, eio_sid, data):
+        self.sent.append((eio_sid, data))
+
+    def generate_id(self):
+        return f'sid-{next(self.ids)}'
+
+
+class FakeServer:
+    """The parts of socketio.Server a client manager touches."""
+    packet_class = NegotiatedPacket
+
+    def __init__(self):
+        self.eio = FakeEngineIO()
+        self.environ = {}
+        self.frames = []
+
+    def _send_packet(self, eio_sid, pkt):
+        self.eio.send(eio_sid, pkt.encode())
+
+    def _send_eio_packet(self, eio_sid, eio_pkt):
+        self.frames.append((eio_sid, eio_pkt))
+
+
+def make_manager(clients):
+    """clients: eio sid -> query string. Returns the manager, server and eio sid -> sio sid."""
+    server = FakeServer()
+    manager = NegotiatingManager()
+    manager.set_server(server)
+    sids = {}
+    for eio_sid, query in clients.items():
+        server.environ[eio_sid] = {'QUERY_STRING': query}
+        sids[eio_sid] = manager.connect(eio_sid, '/')
+    return manager, server, sids
+
+
+def test_wants_msgpack():
+    assert wants_msgpack({'QUERY_STRING': 'EIO=4&transport=websocket&serializer=msgpack'})
+    assert not wants_msgpack({'QUERY_STRING': 'EIO=4&transport=websocket'})
+    assert not wants_msgpack({'QUERY_STRING': 'serializer=json'})
+    assert not wants_msgpack({})
+
+
+def test_encode_msgpack_layout():
+    pkt = packet.Packet(packet.EVENT, data=['offer', {'sdp': 'v=0'}], namespace='/')
+    assert msgpack.loads(encode_msgpack(pkt)) == {'type': packet.EVENT, 'data': ['offer', {'sdp': 'v=0'}], 'nsp': '/'}
+
+    ack = packet.Packet(packet.ACK, data=[True], namespace='/chat', id=7)
+    assert msgpack.loads(encode_msgpack(ack)) == {'type': packet.ACK, 'data': [True], 'nsp': '/chat', 'id': 7}
+
+
+def test_binary_packets_are_sent_inline():
+    pkt = packet.Packet(packet.EVENT, data=['photo', b'\xff\xd8'], namespace='/')
+    assert pkt.packet_type == packet.BINARY_EVENT
+    decoded = msgpack.loads(encode_msgpack(pkt))
+    assert decoded['type'] == packet.EVENT and decoded['data'] == ['photo', b'\xff\xd8']
+
+
+def test_negotiated_packet_decodes_both_formats():
+    text = NegotiatedPacket(encoded_packet='2["join",{"room":"r1"}]')
+    assert (text.packet_type, text.data) == (packet.EVENT, ['join', {'room': 'r1'}])
+
+    frame = msgpack.dumps({'type': packet.EVENT, 'data': ['join', {'room': 'r1'}], 'nsp': '/', 'id': 3})
+    binary = NegotiatedPacket(encoded_packet=frame)
+    assert (binary.packet_type, binary.data, binary.id, binary.namespace) == (packet.EVENT, ['join', {'room': 'r1'}], 3, '/')
+
+
+def test_emit_encodes_once_per_format():
+    manager, server, sids = make_manager({'a': 'serializer=msgpack', 'b': '', 'c': 'serializer=msgpack', 'd': ''})
+    manager.emit('user_count', 42, '/')
+
+    frames = dict(server.frames)
+    assert set(frames) == {'a', 'b', 'c', 'd'}
+    assert frames['a'] is frames['c'] and frames['b'] is frames['d']
+    assert msgpack.loads(frames['a'].data) == {'type': packet.EVENT, 'data': ['user_count', 42], 'nsp': '/'}
+    assert frames['b'].data == '2["user_count",42]'
+
+
+def test_emit_to_a_room_skips_sids():
+    manager, server, sids = make_manager({'a': 'serializer=msgpack', 'b': '', 'c': ''})
+    for eio_sid in ('a', 'b', 'c'):
+        manager.enter_room(sids[eio_sid], '/', 'room-1')
+    manager.emit('ice', ['candidate'], '/', room='room-1', skip_sid=sids['c'])
+    assert sorted(eio_sid for eio_sid, _ in server.frames) == ['a', 'b']
+
+
+def test_server_packets_follow_the_clients_format():
+    manager, server, sids = make_manager({'a': 'serializer=msgpack', 'b': ''})
+    connect = packet.Packet(packet.CONNECT, data={'sid': 'x'}, namespace='/')
+    server._send_packet('a', connect)
+    server._send_packet('b', connect)
+    (_, binary), (_, text) = server.eio.sent
+    assert msgpack.loads(binary)['type'] == packet.CONNECT
+    assert text == '0{"sid":"x"}'
+    assert server.environ['a'][wire_format._ENVIRON_KEY] is True
+
+
+def test_unknown_clients_get_json():
+    manager, server, sids = make_manager({})
+    assert not manager.uses_msgpack('gone')
+
+
+def test_socketio_options(monkeypatch):
+    assert socketio_options(False) == {}
+    options = socketio_options(True)
+    assert isinstance(options['client_manager'], NegotiatingManager)
+    assert options['serializer'] is NegotiatedPacket
+
+    monkeypatch.setattr(wire_format, 'msgpack', None)
+    assert socketio_options(True) == {}
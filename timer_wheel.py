@@ -0,0 +1,103 @@
+# timer_wheel.py - Hierarchical timing wheel for matchmaking timeouts
+
+import math
+import time
+
+
+class _Timer:
+    __slots__ = ('expires', 'key', 'payload', 'cancelled')
+
+    def __init__(self, expires, key, payload):
+        self.expires = expires
+        self.key = key
+        self.payload = payload
+        self.cancelled = False
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel. Level 0 has `slots` buckets of `tick` seconds; each
+    bucket of level n spans the whole of level n-1, so four levels of 64 half-second
+    buckets reach about 97 days. schedule() and cancel() are O(1) and advance() only
+    visits the buckets that came due, pulling timers down a level as the wheel below
+    wraps. Timers are keyed: scheduling a key that is already pending replaces it.
+
+    Not thread-safe; it is owned by whatever single thread calls advance().
+    """
+
+    def __init__(self, tick=0.5, slots=64, levels=4, clock=time.monotonic):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self._wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._current = int(clock() / tick)  # last tick processed
+        self._timers = {}  # key -> _Timer
+        self.fired = 0
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def schedule(self, key, delay, payload=None):
+        """Fires (key, payload) from advance() once `delay` seconds have passed."""
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        timer = _Timer(self._current + ticks, key, payload)
+        self._timers[key] = timer
+        self._place(timer)
+
+    def cancel(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is None: return False
+        timer.cancelled = True  # dropped lazily when its bucket is visited
+        return True
+
+    def _place(self, timer):
+        delta = timer.expires - self._current
+        span = self.slots
+        for level in range(self.levels):
+            if delta < span or level == self.levels - 1:
+                # Beyond the top level's span the timer is parked and re-placed when its bucket comes round
+                slot = (timer.expires // (span // self.slots)) % self.slots
+                self._wheels[level][slot].append(timer)
+                return
+            span *= self.slots
+
+    def advance(self, now=None):
+        """Moves the wheel to `now` and returns [(key, payload), ...] for every timer that expired."""
+        target = int((self.clock() if now is None else now) / self.tick)
+        fired = []
+        while self._current < target:
+            self._current += 1
+            tick = self._current
+
+            # Cascade from the highest level that wrapped down to level 1
+            wrapped = 0
+            span = self.slots
+            while wrapped + 1 < self.levels and tick % span == 0:
+                wrapped += 1
+                span *= self.slots
+            for level in range(wrapped, 0, -1):
+                slot = (tick // self.slots ** level) % self.slots
+                bucket = self._wheels[level][slot]
+                self._wheels[level][slot] = []
+                for timer in bucket:
+                    if not timer.cancelled:
+                        self._place(timer)
+
+            slot = tick % self.slots
+            bucket = self._wheels[0][slot]
+            self._wheels[0][slot] = []
+            for timer in bucket:
+                if timer.cancelled: continue
+                if timer.expires > tick:
+                    self._place(timer)
+                    continue
+                del self._timers[timer.key]
+                fired.append((timer.key, timer.payload))
+
+        self.fired += len(fired)
+        return fired
@@ -129,15 +129,22 @@ async function initializeMedia(facingMode = 'user') {
 // SOCKET.IO SETUP
 // ============================================
 function initializeSocket(uid, profile) {
-    socket = io({
+    const options = {
         query: { 
             firebase_uid: uid,
-            profile: JSON.stringify(profile)
+            profile: JSON.stringify(profile),
+            ice_batch: 1
         },
         reconnection: true,
         reconnectionDelay: 1000,
         reconnectionAttempts: 5
-    });
+    };
+    // Binary MessagePack frames when the page loaded the parser (the server enables it)
+    if (window.msgpackParser) {
+        options.parser = window.msgpackParser;
+        options.query.serializer = 'msgpack';
+    }
+    socket = io(options);
 
     socket.on('connect', () => {
         console.log('Socket connected:', socket.id);
@@ -153,11 +160,13 @@ function initializeSocket(uid, profile) {
 
     socket.on('video-matched', handleVideoMatched);
     socket.on('video-waiting', handleVideoWaiting);
+    socket.on('video-wait-expired', handleWaitExpired);
     socket.on('video-user-disconnected', handleUserDisconnected);
     
     socket.on('video-offer', handleVideoOffer);
     socket.on('video-answer', handleVideoAnswer);
     socket.on('ice-candidate', handleIceCandidate);
+    socket.on('ice-candidates', handleIceCandidates);
     
     socket.on('start_timed_date', handleStartTimedDate);
     socket.on('match_decision_received', handleMatchDecisionReceived);
@@ -167,6 +176,8 @@ function initializeSocket(uid, profile) {
         alert(`You have been banned: ${data.message}`);
         window.location.href = '/';
     });
+
+    socket.on('retry-after', handleRetryAfter);
 }
 
 // ============================================
@@ -364,6 +375,12 @@ async function handleIceCandidate(data) {
     }
 }
 
+async function handleIceCandidates(data) {
+    for (const candidate of data.candidates || []) {
+        await handleIceCandidate({ candidate: candidate });
+    }
+}
+
 async function processPendingIceCandidates() {
     if (pendingIceCandidates.length === 0) return;
     
@@ -391,6 +408,27 @@ function handleVideoWaiting() {
     verifiedBadgeEl.style.display = 'none'; 
 }
 
+let matchRetryTimer = null;
+
+function handleRetryAfter(data) {
+    // The server dropped an event (rate limited or overloaded); only a search is worth repeating
+    console.warn(`Server asked to retry ${data.event} in ${data.retry_after}s (${data.reason})`);
+    if (data.event !== 'find-video-match' || matchRetryTimer) return;
+    matchRetryTimer = setTimeout(() => {
+        matchRetryTimer = null;
+        if (!currentRoom && autoReconnect && socket && socket.connected) {
+            socket.emit('find-video-match');
+        }
+    }, data.retry_after * 1000);
+}
+
+function handleWaitExpired() {
+    // The server drops long waits; ask again if we're still searching
+    if (!currentRoom && socket && socket.connected) {
+        socket.emit('find-video-match');
+    }
+}
+
 function handleUserDisconnected() {
     console.log('User disconnected');
     
@@ -0,0 +1,143 @@
+# wire_format.py - Per-client Socket.IO serialization: JSON text by default, MessagePack for clients that ask
+
+import logging
+from urllib.parse import parse_qs
+
+from engineio import packet as eio_packet
+from socketio import packet
+from socketio.manager import Manager
+from socketio.redis_manager import RedisManager
+
+logger = logging.getLogger(__name__)
+
+# MessagePack is optional; without it every client gets JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK = 'msgpack'
+_ENVIRON_KEY = 'hushh.serializer'
+
+
+def wants_msgpack(environ):
+    """True if the client asked for MessagePack in its handshake (?serializer=msgpack)."""
+    return parse_qs(environ.get('QUERY_STRING', '')).get('serializer') == [MSGPACK]
+
+
+def encode_msgpack(pkt):
+    """A Socket.IO packet as one MessagePack frame (socket.io-msgpack-parser's layout)."""
+    packet_type = pkt.packet_type
+    # MessagePack carries bytes natively, so there are no attachment packets
+    if packet_type == packet.BINARY_EVENT:
+        packet_type = packet.EVENT
+    elif packet_type == packet.BINARY_ACK:
+        packet_type = packet.ACK
+    frame = {'type': packet_type, 'data': pkt.data, 'nsp': pkt.namespace or '/'}
+    if pkt.id is not None:
+        frame['id'] = pkt.id
+    return msgpack.dumps(frame)
+
+
+class NegotiatedPacket(packet.Packet):
+    """
+    The server's packet class when MessagePack is enabled. Text frames decode as
+    JSON, binary frames as MessagePack: a MessagePack client only sends binary
+    frames, and a JSON client's binary attachments are collected by the server
+    before a packet is built, so the frame type tells the two apart.
+    """
+
+    def decode(self, encoded_packet):
+        if not isinstance(encoded_packet, (bytes, bytearray)):
+            return super().decode(encoded_packet)
+        decoded = msgpack.loads(encoded_packet)
+        self.packet_type = decoded['type']
+        self.data = decoded.get('data')
+        self.id = decoded.get('id')
+        self.namespace = decoded['nsp']
+        return 0
+
+
+class NegotiatingManager(Manager):
+    """
+    Client manager that writes each client's packets in the format it negotiated.
+    An emit is encoded at most once per format, however many recipients it has.
+    The server's own packets (connect replies, acks) go through _send_packet,
+    which is routed here in set_server().
+    """
+
+    def set_server(self, server):
+        super().set_server(server)
+        self._send_json_packet = server._send_packet
+        server._send_packet = self._send_packet
+
+    def uses_msgpack(self, eio_sid):
+        # Decided once per connection and kept in its WSGI environ, which the server drops on disconnect
+        environ = self.server.environ.get(eio_sid)
+        if environ is None:
+            return False
+        flag = environ.get(_ENVIRON_KEY)
+        if flag is None:
+            flag = environ[_ENVIRON_KEY] = wants_msgpack(environ)
+        return flag
+
+    def _send_packet(self, eio_sid, pkt):
+        if self.uses_msgpack(eio_sid):
+            self.server.eio.send(eio_sid, encode_msgpack(pkt))
+        else:
+            self._send_json_packet(eio_sid, pkt)
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        if callback:
+            # Each recipient gets its own packet (unique ack id), sent through _send_packet
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid, callback=callback, to=to, **kwargs)
+        room = to or room
+        if namespace not in self.rooms:
+            return
+        if isinstance(data, tuple):
+            data = list(data)
+        elif data is not None:
+            data = [data]
+        else:
+            data = []
+        if not isinstance(skip_sid, list):
+            skip_sid = [skip_sid]
+        pkt = self.server.packet_class(packet.EVENT, namespace=namespace, data=[event] + data)
+        json_frames = msgpack_frame = None
+        for sid, eio_sid in self.get_participants(namespace, room):
+            if sid in skip_sid:
+                continue
+            if self.uses_msgpack(eio_sid):
+                if msgpack_frame is None:
+                    msgpack_frame = eio_packet.Packet(eio_packet.MESSAGE, encode_msgpack(pkt))
+                self.server._send_eio_packet(eio_sid, msgpack_frame)
+            else:
+                if json_frames is None:
+                    encoded = pkt.encode()
+                    if not isinstance(encoded, list):
+                        encoded = [encoded]
+                    json_frames = [eio_packet.Packet(eio_packet.MESSAGE, p) for p in encoded]
+                for frame in json_frames:
+                    self.server._send_eio_packet(eio_sid, frame)
+
+
+class NegotiatingRedisManager(RedisManager, NegotiatingManager):
+    """RedisManager whose local delivery (after the pub/sub hop) negotiates formats like NegotiatingManager."""
+
+
+def socketio_options(enabled, message_queue=None, channel='flask-socketio'):
+    """
+    SocketIO() keyword arguments for the wire format: with `enabled` (and msgpack
+    installed) a negotiating client manager and packet class, otherwise nothing,
+    leaving Flask-SocketIO's JSON defaults and its own message queue setup.
+    """
+    if not enabled:
+        return {}
+    if msgpack is None:
+        logger.warning("MessagePack serialization requested but msgpack is not installed; all clients get JSON")
+        return {}
+    if message_queue:
+        manager = NegotiatingRedisManager(message_queue, channel=channel)
+    else:
+        manager = NegotiatingManager()
+    return {'client_manager': manager, 'serializer': NegotiatedPacket}